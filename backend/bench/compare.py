@@ -0,0 +1,70 @@
+# Compares two reports from `python -m bench`, scenario by scenario:
+#
+#   python -m bench.compare before.json after.json [--fail-above 10]
+#
+# With --fail-above, exits 1 when any latency percentile or peak RSS grows, or throughput drops,
+# by more than that many percent.
+import sys, json, argparse
+
+# (label, path into the scenario report, True when higher is better)
+METRICS = [
+    ("throughput rps", ("throughput_rps",), True),
+    ("p50 ms", ("latency_seconds", "p50"), False),
+    ("p95 ms", ("latency_seconds", "p95"), False),
+    ("p99 ms", ("latency_seconds", "p99"), False),
+    ("processing p95 ms", ("processing_seconds", "p95"), False),
+    ("completion p95 ms", ("completion_seconds", "p95"), False),
+    ("peak RSS MB", ("peak_rss_bytes",), False),
+]
+
+def lookup(report: dict, path: tuple):
+    for key in path:
+        if not isinstance(report, dict) or report.get(key) is None:
+            return None
+        report = report[key]
+    return report
+
+def display(label: str, value: float) -> float:
+    if label.endswith(" ms"):
+        return value * 1000
+    if label.endswith(" MB"):
+        return value / 1024 ** 2
+    return value
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.compare")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--fail-above", type=float, help="Regression threshold in percent.")
+    options = parser.parse_args(argv)
+    with open(options.before) as f:
+        before = json.load(f)
+    with open(options.after) as f:
+        after = json.load(f)
+
+    print(f"before: {before['git']['commit']}  after: {after['git']['commit']}")
+    regressions = []
+    for name, old in before["scenarios"].items():
+        new = after["scenarios"].get(name)
+        if new is None:
+            continue
+        print(f"\n{name}")
+        for label, path, higher_is_better in METRICS:
+            old_value, new_value = lookup(old, path), lookup(new, path)
+            if old_value is None or new_value is None:
+                continue
+            change = (new_value - old_value) / old_value * 100 if old_value else 0.0
+            print(f"  {label:<18} {display(label, old_value):>12.2f} {display(label, new_value):>12.2f} {change:>+8.1f}%")
+            worse = -change if higher_is_better else change
+            if options.fail_above is not None and worse > options.fail_above:
+                regressions.append(f"{name} {label} {change:+.1f}%")
+        if new.get("errors"):
+            regressions.append(f"{name} had {new['errors']} errors")
+
+    if regressions and options.fail_above is not None:
+        print("\nRegressions:\n  " + "\n  ".join(regressions))
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
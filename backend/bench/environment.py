@@ -0,0 +1,149 @@
+import os, sys, time, uuid, socket, threading, contextlib, subprocess
+from urllib.parse import urlsplit
+import boto3, httpx, psutil, psycopg2
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Must match fastapi_app.config.BUCKET_NAME. The app is not imported here, as its config is read at import.
+BUCKET_NAME = "fastapifiles-audio-987dbx"
+STARTUP_TIMEOUT_SECONDS = 120
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def wait_for(check, timeout: float, process: subprocess.Popen = None, what: str = "service"):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"{what} exited with code {process.returncode} during startup")
+        try:
+            if check():
+                return
+        except (OSError, httpx.HTTPError):
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{what} did not start within {timeout}s")
+
+def log(*args):
+    print(*args, file=sys.stderr, flush=True)
+
+# A throwaway database on the given server, so every run starts from the same empty schema.
+class BenchDatabase:
+    def __init__(self, server_url: str, keep: bool = False):
+        self.server_url = server_url
+        self.keep = keep
+        self.name = f"bench_{uuid.uuid4().hex[:12]}"
+        self.url = urlsplit(server_url)._replace(path=f"/{self.name}").geturl()
+
+    def _admin(self, statement: str):
+        connection = psycopg2.connect(self.server_url)
+        connection.autocommit = True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(statement)
+        finally:
+            connection.close()
+
+    def __enter__(self):
+        self._admin(f'CREATE DATABASE "{self.name}"')
+        return self
+
+    def __exit__(self, *exc):
+        if self.keep:
+            log(f"Keeping database {self.name}")
+        else:
+            self._admin(f'DROP DATABASE IF EXISTS "{self.name}" WITH (FORCE)')
+
+    # Commits on success and always closes the connection.
+    @contextlib.contextmanager
+    def connect(self):
+        connection = psycopg2.connect(self.url)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+# moto's S3 server as the S3 stand-in. It runs in its own process, so storing uploads does not
+# compete with the load generator for the GIL or show up in the app's memory.
+class S3Emulator:
+    def __enter__(self):
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "moto.server", "-H", "127.0.0.1", "-p", str(self.port)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        wait_for(lambda: httpx.get(self.url).status_code < 500, 30, self.process, "S3 emulator")
+        s3 = boto3.client(
+            "s3", endpoint_url=self.url, region_name="us-east-1",
+            aws_access_key_id="bench", aws_secret_access_key="bench"
+        )
+        s3.create_bucket(Bucket=BUCKET_NAME)
+        return self
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        self.process.wait(10)
+
+# The app under uvicorn, in a working directory of its own so UPLOAD_DIR is discarded afterwards.
+class AppServer:
+    def __init__(self, env: dict, workdir: str):
+        self.env = env
+        self.workdir = workdir
+
+    def __enter__(self):
+        port = free_port()
+        self.url = f"http://127.0.0.1:{port}"
+        env = {**os.environ, **self.env, "PYTHONPATH": BACKEND_DIR}
+        # Schema and seed users, as the one-shot deploy step does before the web workers start.
+        subprocess.run([sys.executable, "-m", "fastapi_app.manage", "setup"], cwd=self.workdir, env=env, check=True)
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "fastapi_app.main:app", "--host", "127.0.0.1", "--port", str(port),
+             "--log-level", "warning", "--no-access-log"],
+            cwd=self.workdir, env=env
+        )
+        wait_for(lambda: httpx.get(f"{self.url}/metrics").status_code == 200, STARTUP_TIMEOUT_SECONDS, self.process, "App")
+        return self
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        try:
+            self.process.wait(30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+# Samples the resident memory of the app together with its worker processes (password hashing,
+# audio analysis) and keeps the peak.
+class RssSampler:
+    def __init__(self, pid: int, interval: float = 0.05):
+        self.process = psutil.Process(pid)
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+
+    def sample(self) -> int:
+        total = 0
+        for process in [self.process, *self.process.children(recursive=True)]:
+            try:
+                total += process.memory_info().rss
+            except psutil.NoSuchProcess:
+                pass
+        return total
+
+    def _run(self):
+        while True:
+            self.peak = max(self.peak, self.sample())
+            if self._stop.wait(self.interval):
+                return
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
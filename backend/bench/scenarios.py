@@ -0,0 +1,298 @@
+import math, time, uuid, random, asyncio, contextlib
+import httpx
+import numpy as np
+from psycopg2.extras import execute_values
+from passlib.hash import bcrypt
+from bench.environment import BUCKET_NAME, RssSampler, log
+
+PASSWORD = "Bench-P@ssword1"
+# Seeded by `python -m fastapi_app.manage setup` (fastapi_app/seed.py), which AppServer runs first.
+ADMIN_USERNAME, ADMIN_PASSWORD = "admin", "P@ssword12345!"
+REQUEST_TIMEOUT = httpx.Timeout(300, connect=30)
+POLL_INTERVAL_SECONDS = 0.25
+PROCESSING_TIMEOUT_SECONDS = 1800
+BODY_CHUNK_SIZE = 1024 * 1024
+CATEGORIES = ["Music", "Podcast", "Voice Note", "Audiobook", "Others"]
+
+def percentiles(values: list):
+    if not values:
+        return None
+    values = sorted(values)
+    # Nearest-rank percentiles, so every reported value is one that was actually observed.
+    def rank(fraction):
+        return values[max(0, min(len(values) - 1, math.ceil(fraction * len(values)) - 1))]
+    return {
+        "p50": rank(0.50), "p95": rank(0.95), "p99": rank(0.99),
+        "max": values[-1], "mean": sum(values) / len(values)
+    }
+
+def expect(response: httpx.Response, *status_codes):
+    if response.status_code not in status_codes:
+        raise RuntimeError(f"{response.request.method} {response.request.url.path}: {response.status_code} {response.text[:200]}")
+    return response
+
+class LoadResult:
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self.latencies = []
+        self.errors = 0
+        self.error_samples = []
+        self.elapsed = 0.0
+        self.peak_rss = 0
+
+    def report(self, **extra) -> dict:
+        report = {
+            "requests": len(self.latencies) + self.errors,
+            "errors": self.errors,
+            "concurrency": self.concurrency,
+            "duration_seconds": self.elapsed,
+            "throughput_rps": len(self.latencies) / self.elapsed if self.elapsed else 0.0,
+            "latency_seconds": percentiles(self.latencies),
+            "peak_rss_bytes": self.peak_rss,
+            **extra
+        }
+        if self.error_samples:
+            report["error_samples"] = self.error_samples
+        return report
+
+# Runs operation(0..count-1) with at most `concurrency` in flight, timing each call.
+async def drive(count: int, concurrency: int, operation) -> LoadResult:
+    result = LoadResult(concurrency)
+    indexes = iter(range(count))
+
+    async def worker():
+        for index in indexes:
+            start = time.perf_counter()
+            try:
+                await operation(index)
+            except Exception as e:
+                result.errors += 1
+                if len(result.error_samples) < 5:
+                    result.error_samples.append(str(e) or repr(e))
+            else:
+                result.latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, count)))))
+    result.elapsed = time.perf_counter() - start
+    return result
+
+# Shared state for one run: the app, its database and the data seeded so far.
+class BenchContext:
+    def __init__(self, app, database, options):
+        self.app = app
+        self.database = database
+        self.options = options
+        self.rng = random.Random(options.seed)
+        self.password_hash = bcrypt.using(rounds=options.bcrypt_rounds).hash(PASSWORD)
+        self._library = None
+
+    def client(self, connections: int) -> httpx.AsyncClient:
+        limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+        return httpx.AsyncClient(base_url=self.app.url, timeout=REQUEST_TIMEOUT, limits=limits)
+
+    @contextlib.asynccontextmanager
+    async def login(self, username: str, password: str = PASSWORD, connections: int = 16):
+        async with self.client(connections) as client:
+            response = expect(await client.post("/auth/login", data={"username": username, "password": password}), 200)
+            # The session cookie is marked Secure, so it is not replayed over plain HTTP by default.
+            client.cookies.set("session_token", response.cookies["session_token"])
+            yield client
+
+    def measure_rss(self) -> RssSampler:
+        return RssSampler(self.app.process.pid)
+
+    # Users and files are seeded with SQL rather than through the API, so setup stays fast and
+    # is not part of any measurement.
+    def create_users(self, prefix: str, count: int) -> list:
+        users = [(str(uuid.uuid4()), f"{prefix}{index}") for index in range(count)]
+        with self.database.connect() as connection, connection.cursor() as cursor:
+            execute_values(
+                cursor,
+                "INSERT INTO users (user_id, username, email, password_hash, first_name, last_name, account_type) VALUES %s",
+                [(user_id, username, f"{username}@bench.local", self.password_hash, "Bench", "User", "regular") for user_id, username in users],
+                template="(%s::uuid, %s, %s, %s, %s, %s, %s)"
+            )
+        return users
+
+    def create_files(self, user_id: str, count: int) -> list:
+        with self.database.connect() as connection, connection.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO audio_files (file_id, user_id, description, category, file_path, upload_timestamp, checksum, upload_status, file_size)
+                SELECT id, %(user_id)s::uuid, 'Bench file ' || n, (%(categories)s::text[])[1 + n %% 5],
+                       'https://' || %(bucket)s || '.s3.amazonaws.com/' || %(user_id)s || '/' || id || '_bench.wav',
+                       localtimestamp - n * interval '1 second', md5(id::text), 'completed', 1048576
+                FROM (SELECT gen_random_uuid() AS id, n FROM generate_series(1, %(count)s) AS n) AS seeded
+                RETURNING file_id
+            """, {"user_id": user_id, "count": count, "bucket": BUCKET_NAME, "categories": CATEGORIES})
+            return [str(row[0]) for row in cursor.fetchall()]
+
+    # One user owning list_rows completed files, shared by the listing and playback scenarios.
+    def library(self):
+        if self._library is None:
+            log(f"Seeding {self.options.list_rows} files")
+            (user_id, username), = self.create_users("bench_library_", 1)
+            file_ids = self.create_files(user_id, self.options.list_rows)
+            self.rng.shuffle(file_ids)
+            self._library = username, file_ids
+        return self._library
+
+async def login_scenario(context: BenchContext) -> dict:
+    options = context.options
+    users = context.create_users("bench_login_", options.login_users)
+    async with context.client(options.concurrency) as client:
+        async def operation(index):
+            username = users[index % len(users)][1]
+            expect(await client.post("/auth/login", data={"username": username, "password": PASSWORD}), 200)
+
+        with context.measure_rss() as rss:
+            result = await drive(options.login_requests, options.concurrency, operation)
+    result.peak_rss = rss.peak
+    return result.report(users=len(users))
+
+async def list_files_scenario(context: BenchContext) -> dict:
+    options = context.options
+    username, file_ids = context.library()
+    async with context.login(username, connections=options.concurrency) as client:
+        async def operation(index):
+            expect(await client.get("/files/", params={"limit": options.list_page_size}), 200)
+
+        with context.measure_rss() as rss:
+            result = await drive(options.list_requests, options.concurrency, operation)
+    result.peak_rss = rss.peak
+    return result.report(rows=len(file_ids), page_size=options.list_page_size)
+
+# Each request presigns a different file, so the playback URL cache only helps once ids repeat.
+async def playback_scenario(context: BenchContext) -> dict:
+    options = context.options
+    username, file_ids = context.library()
+    async with context.login(username, connections=options.playback_concurrency) as client:
+        async def operation(index):
+            expect(await client.get(f"/files/{file_ids[index % len(file_ids)]}/playback"), 200)
+
+        with context.measure_rss() as rss:
+            result = await drive(options.playback_requests, options.playback_concurrency, operation)
+    result.peak_rss = rss.peak
+    return result.report(distinct_files=min(len(file_ids), options.playback_requests))
+
+def wav_header(data_size: int, sample_rate: int = 44100, channels: int = 2) -> bytes:
+    block_align = channels * 2
+    return (
+        b"RIFF" + (36 + data_size).to_bytes(4, "little") + b"WAVE"
+        + b"fmt " + (16).to_bytes(4, "little") + (1).to_bytes(2, "little") + channels.to_bytes(2, "little")
+        + sample_rate.to_bytes(4, "little") + (sample_rate * block_align).to_bytes(4, "little")
+        + block_align.to_bytes(2, "little") + (16).to_bytes(2, "little")
+        + b"data" + data_size.to_bytes(4, "little")
+    )
+
+# A multipart body holding a 16-bit stereo WAV of seeded noise, generated while it is sent so that
+# a 1GB upload needs neither a 1GB file nor 1GB of memory. Each seed gives a distinct checksum.
+def wav_upload_body(size: int, seed: int):
+    data_size = max(0, size - 44) // 4 * 4
+    boundary = uuid.uuid4().hex
+    preamble = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"bench-{seed}.wav\"\r\n"
+        "Content-Type: audio/wav\r\n\r\n"
+    ).encode() + wav_header(data_size)
+    epilogue = f"\r\n--{boundary}--\r\n".encode()
+    headers = {
+        "Content-Type": f"multipart/form-data; boundary={boundary}",
+        "Content-Length": str(len(preamble) + data_size + len(epilogue))
+    }
+
+    async def body():
+        rng = np.random.default_rng(seed)
+        yield preamble
+        remaining = data_size
+        while remaining:
+            chunk = rng.bytes(min(BODY_CHUNK_SIZE, remaining))
+            remaining -= len(chunk)
+            yield chunk
+        yield epilogue
+    return headers, body()
+
+# Polls until the upload leaves "processing"; returns the final status.
+async def wait_for_processing(client: httpx.AsyncClient, file_id: str) -> str:
+    deadline = time.monotonic() + PROCESSING_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        status = expect(await client.get(f"/files/upload-status/{file_id}"), 200).json()["upload_status"]
+        if status != "processing":
+            return status
+        await asyncio.sleep(POLL_INTERVAL_SECONDS)
+    return "timeout"
+
+# Latency covers the upload request alone; processing runs from request start until the background
+# job (analysis and the S3 upload) has finished with the file.
+async def upload_scenario(context: BenchContext, size: int, count: int, label: str) -> dict:
+    options = context.options
+    (_, username), = context.create_users(f"bench_upload_{label}_", 1)
+    seed_base = context.rng.randrange(2 ** 32)
+    uploads = []
+
+    async with context.login(username, connections=options.upload_concurrency * 2) as client:
+        async def operation(index):
+            start = time.perf_counter()
+            headers, body = wav_upload_body(size, seed_base + index)
+            response = expect(await client.post(
+                "/files/upload", params={"description": f"Bench upload {label} {index}", "category": "Music"},
+                headers=headers, content=body
+            ), 200)
+            uploads.append((start, response.json()["file_id"]))
+
+        async def finish(start, file_id):
+            status = await wait_for_processing(client, file_id)
+            return status, time.perf_counter() - start
+
+        with context.measure_rss() as rss:
+            result = await drive(count, options.upload_concurrency, operation)
+            finished = await asyncio.gather(*(finish(start, file_id) for start, file_id in uploads))
+    result.peak_rss = rss.peak
+    outcomes = {}
+    for status, _ in finished:
+        outcomes[status] = outcomes.get(status, 0) + 1
+    return result.report(
+        file_size_bytes=size,
+        bytes_per_second=len(result.latencies) * size / result.elapsed if result.elapsed else 0.0,
+        processing_seconds=percentiles([elapsed for status, elapsed in finished if status == "completed"]),
+        outcomes=outcomes
+    )
+
+# Polls a delete operation until it is done; returns its final status.
+async def wait_for_delete(client: httpx.AsyncClient, operation: dict, location: str) -> str:
+    deadline = time.monotonic() + PROCESSING_TIMEOUT_SECONDS
+    while operation["status"] in ("queued", "running") and time.monotonic() < deadline:
+        await asyncio.sleep(POLL_INTERVAL_SECONDS)
+        operation = expect(await client.get(location), 200).json()
+    return operation["status"] if operation["status"] not in ("queued", "running") else "timeout"
+
+# Latency covers the DELETE request; completion runs until its S3 delete operation has finished.
+async def admin_delete_scenario(context: BenchContext) -> dict:
+    options = context.options
+    log(f"Seeding {options.delete_users} users with {options.delete_files} files each")
+    users = context.create_users("bench_delete_", options.delete_users)
+    for user_id, _ in users:
+        context.create_files(user_id, options.delete_files)
+    deletes = []
+
+    async with context.login(ADMIN_USERNAME, ADMIN_PASSWORD, connections=options.delete_concurrency * 2) as client:
+        async def operation(index):
+            start = time.perf_counter()
+            response = expect(await client.delete(f"/admin/users/{users[index][0]}"), 200, 202)
+            deletes.append((start, response.json(), response.headers.get("Location")))
+
+        async def finish(start, operation, location):
+            status = await wait_for_delete(client, operation, location) if location else operation["status"]
+            return status, time.perf_counter() - start
+
+        with context.measure_rss() as rss:
+            result = await drive(len(users), options.delete_concurrency, operation)
+            finished = await asyncio.gather(*(finish(*delete) for delete in deletes))
+    result.peak_rss = rss.peak
+    outcomes = {}
+    for status, _ in finished:
+        outcomes[status] = outcomes.get(status, 0) + 1
+    return result.report(
+        files_per_user=options.delete_files,
+        completion_seconds=percentiles([elapsed for status, elapsed in finished if status == "completed"]),
+        outcomes=outcomes
+    )
@@ -0,0 +1,81 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Landmark fingerprinting: the loudest spectral peaks are paired up, and each pair is hashed from
+# (anchor frequency, target frequency, time between them). Re-encoding and trimming keep most of
+# these hashes, along with their relative timing.
+
+SAMPLE_RATE = 11025
+WINDOW_SIZE = 1024
+HOP_SIZE = 512
+# Frequency bands (FFT bins) searched for one peak per frame; lower bands are narrower, like hearing.
+BANDS = [(1, 10), (10, 20), (20, 40), (40, 80), (80, 160), (160, 512)]
+# A band peak is kept only if it is the loudest in its band within this many frames either side.
+PEAK_NEIGHBORHOOD = 5
+# Each anchor is paired with the next few peaks that start within TARGET_ZONE frames.
+PAIR_FAN_OUT = 5
+TARGET_ZONE = 63
+
+# Builds a fingerprint from mono samples fed in chunks. Only per-frame band peaks are kept between
+# chunks, so memory grows by a few bytes per frame rather than with the audio itself.
+class Fingerprinter:
+    def __init__(self, sample_rate: int):
+        self.step = sample_rate / SAMPLE_RATE
+        self.smoothing = np.ones(max(1, round(self.step))) / max(1, round(self.step))
+        self.window = np.hanning(WINDOW_SIZE)
+        self.pending = np.empty(0)
+        self.position = 0.0
+        self.buffer = np.empty(0)
+        self.bins = []
+        self.magnitudes = []
+
+    def feed(self, mono: np.ndarray):
+        # Resample to SAMPLE_RATE so peaks land in the same bins whatever the source rate; a moving
+        # average first keeps content above the new Nyquist frequency from folding back in.
+        samples = np.concatenate([self.pending, np.convolve(mono, self.smoothing, mode="same")])
+        count = int((len(samples) - 1 - self.position) // self.step) + 1 if len(samples) > self.position else 0
+        points = self.position + np.arange(count) * self.step
+        resampled = np.interp(points, np.arange(len(samples)), samples)
+        self.position += count * self.step
+        consumed = int(self.position)
+        self.pending = samples[consumed:]
+        self.position -= consumed
+        self.buffer = np.concatenate([self.buffer, resampled])
+        if len(self.buffer) < WINDOW_SIZE:
+            return
+
+        frames = sliding_window_view(self.buffer, WINDOW_SIZE)[::HOP_SIZE]
+        self.buffer = self.buffer[len(frames) * HOP_SIZE:]
+        spectrum = np.log1p(np.abs(np.fft.rfft(frames * self.window, axis=1)))
+        bins = np.empty((len(frames), len(BANDS)), dtype=np.int32)
+        magnitudes = np.empty((len(frames), len(BANDS)))
+        for band, (low, high) in enumerate(BANDS):
+            peak = spectrum[:, low:high].argmax(axis=1)
+            bins[:, band] = peak + low
+            magnitudes[:, band] = spectrum[np.arange(len(frames)), peak + low]
+        self.bins.append(bins)
+        self.magnitudes.append(magnitudes)
+
+    # Returns (hashes, offsets) as int32 arrays, offsets being the anchor's frame index.
+    def finish(self):
+        if not self.bins:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+        bins = np.concatenate(self.bins)
+        magnitudes = np.concatenate(self.magnitudes)
+
+        padded = np.pad(magnitudes, ((PEAK_NEIGHBORHOOD, PEAK_NEIGHBORHOOD), (0, 0)), constant_values=-np.inf)
+        local_max = sliding_window_view(padded, 2 * PEAK_NEIGHBORHOOD + 1, axis=0).max(axis=-1)
+        keep = (magnitudes >= local_max) & (magnitudes > magnitudes.mean())
+        times, bands = np.nonzero(keep)
+        frequencies = bins[times, bands]
+
+        hashes, offsets = [], []
+        for step in range(1, PAIR_FAN_OUT + 1):
+            anchors = np.arange(len(times) - step)
+            delta = times[anchors + step] - times[anchors]
+            valid = (delta > 0) & (delta <= TARGET_ZONE)
+            anchors = anchors[valid]
+            hashes.append((frequencies[anchors] << 16) | (frequencies[anchors + step] << 6) | delta[valid])
+            offsets.append(times[anchors])
+        pairs = np.unique(np.stack([np.concatenate(hashes), np.concatenate(offsets)]).astype(np.int32), axis=1)
+        return pairs[0], pairs[1]
@@ -0,0 +1,313 @@
+import os, math, struct
+import numpy as np
+from fastapi_app.audio_fingerprint import Fingerprinter
+
+# Pure functions that read audio metadata from a file on disk. They run in a worker process
+# (see services/audio_service.extract_metadata) and read the file in bounded chunks,
+# so memory does not grow with the size of the upload.
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# MPEG audio header tables, indexed by [version][layer] and [version] respectively.
+MPEG1, MPEG2, MPEG25 = 3, 2, 0
+MP3_BITRATES = {
+    (MPEG1, 3): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (MPEG1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (MPEG1, 1): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (MPEG2, 3): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (MPEG2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (MPEG2, 1): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+MP3_SAMPLE_RATES = {MPEG1: [44100, 48000, 32000], MPEG2: [22050, 24000, 16000], MPEG25: [11025, 12000, 8000]}
+HEADER_SCAN_BYTES = 64 * 1024
+OGG_TAIL_BYTES = 64 * 1024
+
+class UnsupportedAudioError(ValueError):
+    pass
+
+def detect_format(header: bytes):
+    if header[:4] == b"RIFF" and header[8:12] == b"WAVE":
+        return "wav"
+    if header[:4] == b"OggS":
+        return "ogg"
+    if header[:3] == b"ID3" or (len(header) > 1 and header[0] == 0xFF and header[1] & 0xE0 == 0xE0):
+        return "mp3"
+    return None
+
+def to_dbfs(value: float):
+    return round(20 * math.log10(value), 2) if value > 0 else None
+
+# Returns (metadata for processed_data, fingerprint). WAV files are decoded in full for loudness,
+# waveform peaks and the (hashes, offsets) fingerprint; MP3 and OGG only have their headers read,
+# as decoding them needs a codec, so their fingerprint is None.
+def analyze_audio(file_path: str, waveform_points: int, chunk_bytes: int, fingerprint: bool = False):
+    with open(file_path, "rb") as f:
+        header = f.read(12)
+        audio_format = detect_format(header)
+        f.seek(0)
+        if audio_format == "wav":
+            return analyze_wav(f, waveform_points, chunk_bytes, fingerprint)
+        if audio_format == "mp3":
+            return analyze_mp3(f), None
+        if audio_format == "ogg":
+            return analyze_ogg(f), None
+    raise UnsupportedAudioError("Unrecognised audio format")
+
+def read_wav_layout(f):
+    file_size = os.fstat(f.fileno()).st_size
+    f.seek(12)
+    fmt = None
+    while True:
+        chunk_header = f.read(8)
+        if len(chunk_header) < 8:
+            raise UnsupportedAudioError("WAV file has no data chunk")
+        chunk_id, chunk_size = struct.unpack("<4sI", chunk_header)
+        if chunk_id == b"fmt ":
+            fmt = f.read(chunk_size)
+            if chunk_size % 2:
+                f.seek(1, os.SEEK_CUR)
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise UnsupportedAudioError("WAV data chunk precedes fmt chunk")
+            data_offset = f.tell()
+            # Streamed writers leave the size at 0 or 0xFFFFFFFF; trust the file length instead.
+            data_size = min(chunk_size, file_size - data_offset) if chunk_size else file_size - data_offset
+            break
+        else:
+            f.seek(chunk_size + chunk_size % 2, os.SEEK_CUR)
+
+    format_tag, channels, sample_rate, byte_rate, block_align, bits_per_sample = struct.unpack("<HHIIHH", fmt[:16])
+    if format_tag == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+        format_tag = struct.unpack("<H", fmt[24:26])[0]
+    if format_tag not in (WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT) or not channels or not block_align:
+        raise UnsupportedAudioError(f"Unsupported WAV encoding {format_tag:#06x}")
+    sample_width = block_align // channels
+    return {
+        "format_tag": format_tag,
+        "channels": channels,
+        "sample_rate": sample_rate,
+        "byte_rate": byte_rate,
+        "sample_width": sample_width,
+        "bits_per_sample": bits_per_sample,
+        "data_offset": data_offset,
+        "frame_count": data_size // block_align,
+    }
+
+# Convert raw little-endian frames into float64 samples in [-1, 1], shaped (frames, channels).
+def decode_frames(raw: bytes, layout: dict) -> np.ndarray:
+    width = layout["sample_width"]
+    if layout["format_tag"] == WAVE_FORMAT_IEEE_FLOAT:
+        samples = np.frombuffer(raw, dtype="<f4" if width == 4 else "<f8").astype(np.float64)
+    elif width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float64) - 128) / 128
+    elif width == 2:
+        samples = np.frombuffer(raw, dtype="<i2").astype(np.float64) / 32768
+    elif width == 3:
+        triplets = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        values = triplets[:, 0] | (triplets[:, 1] << 8) | (triplets[:, 2] << 16)
+        values = np.where(values & 0x800000, values - 0x1000000, values)
+        samples = values.astype(np.float64) / 8388608
+    elif width == 4:
+        samples = np.frombuffer(raw, dtype="<i4").astype(np.float64) / 2147483648
+    else:
+        raise UnsupportedAudioError(f"Unsupported WAV sample width {width}")
+    return samples.reshape(-1, layout["channels"])
+
+def analyze_wav(f, waveform_points: int, chunk_bytes: int, fingerprint: bool = False):
+    layout = read_wav_layout(f)
+    channels, frame_count = layout["channels"], layout["frame_count"]
+    frame_bytes = layout["sample_width"] * channels
+    fingerprinter = Fingerprinter(layout["sample_rate"]) if fingerprint else None
+
+    # Each chunk covers whole waveform buckets, so a bucket never spans two reads.
+    bucket_frames = max(1, math.ceil(frame_count / waveform_points)) if frame_count else 1
+    chunk_frames = max(1, chunk_bytes // (frame_bytes * bucket_frames)) * bucket_frames
+
+    sum_squares = 0.0
+    peak = 0.0
+    waveform = []
+    f.seek(layout["data_offset"])
+    remaining = frame_count
+    while remaining > 0:
+        raw = f.read(min(chunk_frames, remaining) * frame_bytes)
+        frames = len(raw) // frame_bytes
+        if not frames:
+            break
+        remaining -= frames
+        samples = decode_frames(raw[:frames * frame_bytes], layout)
+        flat = samples.ravel()
+        sum_squares += float(np.dot(flat, flat))
+        # Reducing across a short channel axis is slow in NumPy, so fold the channels one at a time.
+        frame_peaks = np.abs(samples[:, 0])
+        for channel in range(1, channels):
+            np.maximum(frame_peaks, np.abs(samples[:, channel]), out=frame_peaks)
+        peak = max(peak, float(frame_peaks.max()))
+        waveform.extend(np.maximum.reduceat(frame_peaks, np.arange(0, frames, bucket_frames)).tolist())
+        if fingerprinter:
+            fingerprinter.feed(samples @ np.full(channels, 1 / channels))
+
+    decoded_frames = frame_count - remaining
+    rms = math.sqrt(sum_squares / (decoded_frames * channels)) if decoded_frames else 0.0
+    duration = decoded_frames / layout["sample_rate"] if layout["sample_rate"] else None
+    metadata = {
+        "format": "wav",
+        "duration_seconds": round(duration, 3) if duration is not None else None,
+        "sample_rate": layout["sample_rate"],
+        "channels": channels,
+        "bits_per_sample": layout["bits_per_sample"],
+        "bitrate": layout["byte_rate"] * 8,
+        "rms": round(rms, 6),
+        "rms_dbfs": to_dbfs(rms),
+        "peak": round(min(peak, 1.0), 6),
+        "peak_dbfs": to_dbfs(peak),
+        "waveform": {
+            "points": len(waveform),
+            "frames_per_point": bucket_frames,
+            "peaks": [round(min(value, 1.0), 4) for value in waveform],
+        },
+    }
+    return metadata, fingerprinter.finish() if fingerprinter else None
+
+def parse_mp3_header(data: bytes, offset: int):
+    if offset + 4 > len(data) or data[offset] != 0xFF or data[offset + 1] & 0xE0 != 0xE0:
+        return None
+    b1, b2, b3 = data[offset + 1], data[offset + 2], data[offset + 3]
+    version, layer = (b1 >> 3) & 3, (b1 >> 1) & 3
+    bitrate_index, sample_rate_index, padding = b2 >> 4, (b2 >> 2) & 3, (b2 >> 1) & 1
+    if version == 1 or layer == 0 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+    bitrate = MP3_BITRATES[(MPEG1 if version == MPEG1 else MPEG2, layer)][bitrate_index] * 1000
+    sample_rate = MP3_SAMPLE_RATES[version][sample_rate_index]
+    if layer == 3:  # Layer I
+        samples_per_frame = 384
+        frame_length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples_per_frame = 576 if layer == 1 and version != MPEG1 else 1152
+        frame_length = samples_per_frame // 8 * bitrate // sample_rate + padding
+    return {
+        "version": version,
+        "layer": 4 - layer,
+        "bitrate": bitrate,
+        "sample_rate": sample_rate,
+        "channels": 1 if b3 >> 6 == 3 else 2,
+        "samples_per_frame": samples_per_frame,
+        "frame_length": frame_length,
+    }
+
+# Frame count and byte count from a Xing/Info or VBRI header in the first frame, if present.
+def read_vbr_header(data: bytes, offset: int, frame: dict):
+    if frame["version"] == MPEG1:
+        side_info = 17 if frame["channels"] == 1 else 32
+    else:
+        side_info = 9 if frame["channels"] == 1 else 17
+    xing = offset + 4 + side_info
+    if data[xing:xing + 4] in (b"Xing", b"Info"):
+        flags = struct.unpack(">I", data[xing + 4:xing + 8])[0]
+        position = xing + 8
+        frames = byte_count = None
+        if flags & 1:
+            frames = struct.unpack(">I", data[position:position + 4])[0]
+            position += 4
+        if flags & 2:
+            byte_count = struct.unpack(">I", data[position:position + 4])[0]
+        return frames, byte_count
+    vbri = offset + 36
+    if data[vbri:vbri + 4] == b"VBRI":
+        byte_count, frames = struct.unpack(">II", data[vbri + 10:vbri + 18])
+        return frames, byte_count
+    return None, None
+
+def analyze_mp3(f) -> dict:
+    file_size = os.fstat(f.fileno()).st_size
+    audio_start = 0
+    tag = f.read(10)
+    if tag[:3] == b"ID3":
+        size = (tag[6] << 21) | (tag[7] << 14) | (tag[8] << 7) | tag[9]
+        audio_start = 10 + size + (10 if tag[5] & 0x10 else 0)
+    audio_end = file_size
+    f.seek(max(0, file_size - 128))
+    if f.read(3) == b"TAG":
+        audio_end -= 128
+
+    # Find the first frame whose successor is also a valid header, to skip false syncs.
+    f.seek(audio_start)
+    data = f.read(HEADER_SCAN_BYTES)
+    frame = offset = None
+    for position in range(len(data) - 4):
+        candidate = parse_mp3_header(data, position)
+        if not candidate:
+            continue
+        following = position + candidate["frame_length"]
+        if following + 4 > len(data) or parse_mp3_header(data, following):
+            frame, offset = candidate, position
+            break
+    if not frame:
+        raise UnsupportedAudioError("No MPEG audio frames found")
+
+    frames, byte_count = read_vbr_header(data, offset, frame)
+    audio_bytes = byte_count or audio_end - audio_start - offset
+    if frames:
+        duration = frames * frame["samples_per_frame"] / frame["sample_rate"]
+        bitrate = round(audio_bytes * 8 / duration) if duration else frame["bitrate"]
+        vbr = True
+    else:
+        # Constant bitrate: the duration follows from the size of the audio data.
+        duration = audio_bytes * 8 / frame["bitrate"]
+        bitrate = frame["bitrate"]
+        vbr = False
+    return {
+        "format": "mp3",
+        "duration_seconds": round(duration, 3),
+        "sample_rate": frame["sample_rate"],
+        "channels": frame["channels"],
+        "bitrate": bitrate,
+        "layer": frame["layer"],
+        "vbr": vbr,
+    }
+
+def read_ogg_page(data: bytes, offset: int):
+    if data[offset:offset + 4] != b"OggS" or offset + 27 > len(data):
+        return None
+    granule, serial = struct.unpack("<qI", data[offset + 6:offset + 18])
+    segment_count = data[offset + 26]
+    lacing = data[offset + 27:offset + 27 + segment_count]
+    body_start = offset + 27 + segment_count
+    return granule, serial, data[body_start:body_start + sum(lacing)]
+
+def analyze_ogg(f) -> dict:
+    file_size = os.fstat(f.fileno()).st_size
+    page = read_ogg_page(f.read(HEADER_SCAN_BYTES), 0)
+    if not page:
+        raise UnsupportedAudioError("Invalid OGG page")
+    _, serial, packet = page
+    if packet[:7] == b"\x01vorbis":
+        channels, sample_rate, _, nominal_bitrate = struct.unpack("<BIii", packet[11:24])
+        codec, granule_rate, pre_skip = "vorbis", sample_rate, 0
+    elif packet[:8] == b"OpusHead":
+        channels, pre_skip, sample_rate = struct.unpack("<BHI", packet[9:16])
+        codec, granule_rate, nominal_bitrate = "opus", 48000, 0
+    else:
+        raise UnsupportedAudioError("Unsupported OGG codec")
+
+    # The last page of the stream carries the total sample count as its granule position.
+    f.seek(max(0, file_size - OGG_TAIL_BYTES))
+    tail = f.read(OGG_TAIL_BYTES)
+    granule = None
+    position = tail.rfind(b"OggS")
+    while position >= 0 and granule is None:
+        last_page = read_ogg_page(tail, position)
+        if last_page and last_page[1] == serial and last_page[0] >= 0:
+            granule = last_page[0]
+        position = tail.rfind(b"OggS", 0, position)
+    duration = max(granule - pre_skip, 0) / granule_rate if granule is not None else None
+    bitrate = round(file_size * 8 / duration) if duration else (nominal_bitrate if nominal_bitrate > 0 else None)
+    return {
+        "format": "ogg",
+        "codec": codec,
+        "duration_seconds": round(duration, 3) if duration is not None else None,
+        "sample_rate": sample_rate,
+        "channels": channels,
+        "bitrate": bitrate,
+    }
@@ -1,21 +1,149 @@
-import os, secrets
+import os, secrets, socket
 from dotenv import load_dotenv
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+# The request path uses asyncpg; derive its URL from DATABASE_URL unless given explicitly.
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or (DATABASE_URL and DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1))
+# Optional streaming replica for read-only handlers (see fastapi_app/read_routing.py). Unset, all reads go to the primary.
+REPLICA_DATABASE_URL = os.getenv("REPLICA_DATABASE_URL") or None
+ASYNC_REPLICA_DATABASE_URL = os.getenv("ASYNC_REPLICA_DATABASE_URL") or (REPLICA_DATABASE_URL and REPLICA_DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1))
+# After a write, the client reads from the primary for this long so it sees its own changes. Keep it above the replica's usual lag.
+REPLICA_STICKY_SECONDS = int(os.getenv("REPLICA_STICKY_SECONDS", 5))
+# Connection pool of each worker process. With WEB_CONCURRENCY workers the primary sees up to
+# WEB_CONCURRENCY x (DB_POOL_SIZE + DB_MAX_OVERFLOW + 1) connections, the 1 being the upload event listener.
+# A replica gets a pool of the same size.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", 30))
+DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", 1800))
+# Worker processes for `python -m fastapi_app.main`; the uvicorn CLI reads the same variable.
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", 1))
 SECRET_KEY = os.getenv("SECRET_KEY", secrets.token_urlsafe(32))
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 10080))  # 7 days
+# Password hashing runs in a dedicated process pool. Changing BCRYPT_ROUNDS rehashes passwords on next login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", 32))
+PASSWORD_HASH_RETRY_AFTER_SECONDS = int(os.getenv("PASSWORD_HASH_RETRY_AFTER_SECONDS", 2))
+# "session" stores an opaque token in the sessions table; "token" issues a signed JWT checked without the DB.
+AUTH_MODE = os.getenv("AUTH_MODE", "session")
+REVOCATION_REFRESH_SECONDS = int(os.getenv("REVOCATION_REFRESH_SECONDS", 30))
+# In-process cache of session token -> user. Set the TTL to 0 to disable it.
+SESSION_CACHE_TTL_SECONDS = int(os.getenv("SESSION_CACHE_TTL_SECONDS", 60))
+SESSION_CACHE_MAX_SIZE = int(os.getenv("SESSION_CACHE_MAX_SIZE", 10000))
 ALLOWED_ORIGINS = [os.getenv("ALLOWED_ORIGINS", "http://localhost:3000")]
 ALLOWED_AUDIO_MIME_TYPES = {"audio/mpeg", "audio/wav", "audio/mp3", "audio/ogg", "application/ogg", "audio/x-wav"}
 MAX_FILE_SIZE = 1073741824  # 1GB
+# List endpoints are keyset paginated; clients may ask for up to PAGE_SIZE_MAX rows per page.
+PAGE_SIZE_DEFAULT = int(os.getenv("PAGE_SIZE_DEFAULT", 100))
+PAGE_SIZE_MAX = int(os.getenv("PAGE_SIZE_MAX", 500))
+# Minimum pg_trgm word similarity for a fuzzy search hit. Lower values tolerate more typos but match more noise.
+SEARCH_SIMILARITY_THRESHOLD = float(os.getenv("SEARCH_SIMILARITY_THRESHOLD", 0.4))
 
 AWS_ACCESS_KEY = os.getenv("AWS_ACCESS_KEY")
 AWS_SECRET_KEY = os.getenv("AWS_SECRET_KEY")
 BUCKET_NAME = "fastapifiles-audio-987dbx"
+# Send S3 calls to another S3-compatible endpoint, e.g. the local emulator used by backend/bench.
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None
 
-# Directory for temporarily storing uploaded files
+# Shared S3 client. The pool should cover UPLOAD_WORKERS x S3_MULTIPART_CONCURRENCY plus request traffic.
+S3_MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", 64))
+S3_CONNECT_TIMEOUT_SECONDS = float(os.getenv("S3_CONNECT_TIMEOUT_SECONDS", 5))
+S3_READ_TIMEOUT_SECONDS = float(os.getenv("S3_READ_TIMEOUT_SECONDS", 60))
+S3_MAX_ATTEMPTS = int(os.getenv("S3_MAX_ATTEMPTS", 3))
+S3_RETRY_MODE = os.getenv("S3_RETRY_MODE", "standard")  # legacy, standard or adaptive
+
+# Multipart upload tuning. Uploads at or above the threshold are sent in fixed-size parts,
+# so memory per upload is bounded by part size x parts in flight.
+S3_MULTIPART_THRESHOLD = int(os.getenv("S3_MULTIPART_THRESHOLD", 64 * 1024 * 1024))  # 64MB
+S3_MULTIPART_PART_SIZE = max(int(os.getenv("S3_MULTIPART_PART_SIZE", 8 * 1024 * 1024)), 5 * 1024 * 1024)  # S3 minimum is 5MB
+S3_MULTIPART_CONCURRENCY = int(os.getenv("S3_MULTIPART_CONCURRENCY", 4))
+S3_MULTIPART_MAX_ATTEMPTS = int(os.getenv("S3_MULTIPART_MAX_ATTEMPTS", 3))
+PRESIGNED_UPLOAD_EXPIRES_SECONDS = int(os.getenv("PRESIGNED_UPLOAD_EXPIRES_SECONDS", 3600))
+# Presigned uploads not completed this long after they started are aborted and their records removed.
+PRESIGNED_UPLOAD_EXPIRE_MINUTES = int(os.getenv("PRESIGNED_UPLOAD_EXPIRE_MINUTES", 1440))  # 1 day
+PRESIGNED_CLEANUP_INTERVAL_SECONDS = int(os.getenv("PRESIGNED_CLEANUP_INTERVAL_SECONDS", 600))
+
+# Presigned playback URLs are cached per (file, user) and reissued once less than the margin remains.
+PLAYBACK_URL_EXPIRES_SECONDS = int(os.getenv("PLAYBACK_URL_EXPIRES_SECONDS", 3600))
+PLAYBACK_URL_REFRESH_MARGIN_SECONDS = int(os.getenv("PLAYBACK_URL_REFRESH_MARGIN_SECONDS", 300))
+PLAYBACK_URL_CACHE_MAX_SIZE = int(os.getenv("PLAYBACK_URL_CACHE_MAX_SIZE", 50000))
+
+# When enabled, uploads are hashed and sent to S3 while the request body is read, skipping UPLOAD_DIR;
+# an analyze job then reads each object back for its metadata and fingerprint.
+UPLOAD_STREAM_TO_S3 = os.getenv("UPLOAD_STREAM_TO_S3", "false").lower() == "true"
+
+# Durable upload queue. Each process runs UPLOAD_WORKERS workers, each handling one job at a time.
+# Temp files live on the local UPLOAD_DIR, so upload jobs are tied to the node that received them.
+UPLOAD_NODE_ID = os.getenv("UPLOAD_NODE_ID") or socket.gethostname()
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", 4))
+UPLOAD_JOB_MAX_ATTEMPTS = int(os.getenv("UPLOAD_JOB_MAX_ATTEMPTS", 5))
+UPLOAD_JOB_BACKOFF_SECONDS = int(os.getenv("UPLOAD_JOB_BACKOFF_SECONDS", 10))
+UPLOAD_JOB_POLL_SECONDS = int(os.getenv("UPLOAD_JOB_POLL_SECONDS", 5))
+# A processing job whose lock has not been renewed for this long is treated as abandoned.
+UPLOAD_JOB_LEASE_SECONDS = int(os.getenv("UPLOAD_JOB_LEASE_SECONDS", 300))
+# Files in UPLOAD_DIR untouched for this long that no pending job or resumable upload refers to
+# (their upload was deleted or failed for good) are removed by the recovery sweep.
+UPLOAD_ORPHAN_MIN_AGE_SECONDS = int(os.getenv("UPLOAD_ORPHAN_MIN_AGE_SECONDS", 3600))
+
+# S3 deletes are sent as DeleteObjects batches (at most 1000 keys each), several at a time.
+# Deletes touching more than DELETE_INLINE_MAX_KEYS objects run in the background and are polled.
+S3_DELETE_BATCH_SIZE = min(int(os.getenv("S3_DELETE_BATCH_SIZE", 1000)), 1000)
+S3_DELETE_CONCURRENCY = int(os.getenv("S3_DELETE_CONCURRENCY", 4))
+DELETE_INLINE_MAX_KEYS = int(os.getenv("DELETE_INLINE_MAX_KEYS", 1000))
+DELETE_OPERATION_LEASE_SECONDS = int(os.getenv("DELETE_OPERATION_LEASE_SECONDS", 300))
+BULK_DELETE_MAX_FILES = int(os.getenv("BULK_DELETE_MAX_FILES", 10000))
+
+# Audio metadata (duration, loudness, waveform peaks) is extracted in a process pool after upload.
+AUDIO_ANALYSIS_WORKERS = int(os.getenv("AUDIO_ANALYSIS_WORKERS", 2))
+AUDIO_ANALYSIS_CHUNK_BYTES = int(os.getenv("AUDIO_ANALYSIS_CHUNK_BYTES", 4 * 1024 * 1024))
+WAVEFORM_POINTS = int(os.getenv("WAVEFORM_POINTS", 800))
+
+# Near-duplicate detection for WAV uploads: "flag" records the match in processed_data, "reject" also
+# deletes the new upload and marks it "duplicate", "off" skips fingerprinting. A match needs at least
+# FINGERPRINT_MIN_MATCHES aligned hashes covering FINGERPRINT_MATCH_THRESHOLD of the sampled hashes.
+FINGERPRINT_DUPLICATE_ACTION = os.getenv("FINGERPRINT_DUPLICATE_ACTION", "flag")
+FINGERPRINT_MATCH_THRESHOLD = float(os.getenv("FINGERPRINT_MATCH_THRESHOLD", 0.2))
+FINGERPRINT_MIN_MATCHES = int(os.getenv("FINGERPRINT_MIN_MATCHES", 20))
+FINGERPRINT_QUERY_HASHES = int(os.getenv("FINGERPRINT_QUERY_HASHES", 2000))
+
+# Upload status changes reach GET /files/upload-events through Postgres NOTIFY. Streams send a heartbeat
+# comment every UPLOAD_EVENTS_HEARTBEAT_SECONDS and close after UPLOAD_EVENTS_STREAM_SECONDS so that
+# clients reconnect and are authenticated again.
+UPLOAD_EVENTS_HEARTBEAT_SECONDS = int(os.getenv("UPLOAD_EVENTS_HEARTBEAT_SECONDS", 15))
+UPLOAD_EVENTS_STREAM_SECONDS = int(os.getenv("UPLOAD_EVENTS_STREAM_SECONDS", 300))
+UPLOAD_EVENTS_QUEUE_SIZE = int(os.getenv("UPLOAD_EVENTS_QUEUE_SIZE", 100))
+UPLOAD_PROGRESS_STEP_PERCENT = int(os.getenv("UPLOAD_PROGRESS_STEP_PERCENT", 5))
+
+# POST /files/upload-batch accepts up to UPLOAD_BATCH_MAX_FILES files and stores UPLOAD_BATCH_CONCURRENCY at a time.
+UPLOAD_BATCH_MAX_FILES = int(os.getenv("UPLOAD_BATCH_MAX_FILES", 100))
+UPLOAD_BATCH_CONCURRENCY = int(os.getenv("UPLOAD_BATCH_CONCURRENCY", 4))
+
+# Admission control for upload request bodies (see fastapi_app/upload_admission.py), checked per process
+# before the body is read. Set any limit to 0 to disable it. Over a global limit, or with less than
+# UPLOAD_MIN_FREE_BYTES left on UPLOAD_DIR's volume, uploads get 503; over a per-user limit they get 429.
+UPLOAD_MAX_CONCURRENT = int(os.getenv("UPLOAD_MAX_CONCURRENT", 32))
+UPLOAD_MAX_INFLIGHT_BYTES = int(os.getenv("UPLOAD_MAX_INFLIGHT_BYTES", 8 * 1024 ** 3))  # 8GB
+UPLOAD_MAX_CONCURRENT_PER_USER = int(os.getenv("UPLOAD_MAX_CONCURRENT_PER_USER", 4))
+UPLOAD_MAX_INFLIGHT_BYTES_PER_USER = int(os.getenv("UPLOAD_MAX_INFLIGHT_BYTES_PER_USER", 2 * 1024 ** 3))  # 2GB
+UPLOAD_MIN_FREE_BYTES = int(os.getenv("UPLOAD_MIN_FREE_BYTES", 2 * 1024 ** 3))  # 2GB
+UPLOAD_RETRY_AFTER_SECONDS = int(os.getenv("UPLOAD_RETRY_AFTER_SECONDS", 10))
+
+# GET /metrics. With METRICS_TOKEN set, scrapers must send it as a bearer token; without it only
+# loopback clients are answered. The queue depth gauge costs a query, so it is refreshed at most every
+# METRICS_QUEUE_DEPTH_REFRESH_SECONDS however often the endpoint is scraped.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN") or None
+METRICS_QUEUE_DEPTH_REFRESH_SECONDS = float(os.getenv("METRICS_QUEUE_DEPTH_REFRESH_SECONDS", 15))
+
+# Resumable uploads expire this long after the last chunk was received.
+RESUMABLE_UPLOAD_EXPIRE_MINUTES = int(os.getenv("RESUMABLE_UPLOAD_EXPIRE_MINUTES", 1440))  # 1 day
+RESUMABLE_CLEANUP_INTERVAL_SECONDS = int(os.getenv("RESUMABLE_CLEANUP_INTERVAL_SECONDS", 600))
+# A PATCH holds a lease on its upload while appending, renewed every third of this; a lease that
+# has not been renewed for this long (its process died) no longer blocks the next PATCH.
+RESUMABLE_RECEIVE_LEASE_SECONDS = int(os.getenv("RESUMABLE_RECEIVE_LEASE_SECONDS", 60))
+
+# Directory for temporarily storing uploaded files, created by main.lifespan.
 UPLOAD_DIR = "./uploads"
-if not os.path.exists(UPLOAD_DIR):
-    os.makedirs(UPLOAD_DIR)
@@ -1,27 +1,45 @@
 import uuid
-import sys
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from fastapi_app.config import BUCKET_NAME
-from fastapi_app.database import get_db
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, Query
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi_app.config import AUTH_MODE, PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX
+from fastapi_app.database import get_async_db, get_read_db
 from fastapi_app.models import User, AudioFile
-from fastapi_app.schemas import UserCreate, UserOut, UserUpdate
-from fastapi_app.utils import get_password_hash, s3
-from fastapi_app.repositories.user_repo import create_user
+from fastapi_app.schemas import UserCreate, UserOut, UserUpdate, DeleteOperationOut
+from fastapi_app.services.audio_service import get_s3_key
+from fastapi_app.services.password_service import hash_password
+from fastapi_app.repositories.user_repo import create_user, get_user_by_id, list_users as get_users_page
+from fastapi_app.pagination import SortOrder, encode_cursor, decode_cursor, set_next_page
 from fastapi_app.dependencies import get_current_user, admin_required
+from fastapi_app.services import session_cache, token_revocation, playback_cache, deletion_service
 
 router = APIRouter()
 
-# GET /admin/users : List all users.
+# GET /admin/users : List a page of users, newest first by default. The next page cursor is in X-Next-Cursor.
 @router.get("/users", response_model=list[UserOut])
-def list_users(db: Session = Depends(get_db), admin: User = Depends(admin_required)):
-    return db.query(User).all()
+async def list_users(
+    request: Request,
+    response: Response,
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    account_type: Optional[str] = None,
+    order: SortOrder = SortOrder.desc,
+    db: AsyncSession = Depends(get_read_db),
+    admin: User = Depends(admin_required)
+):
+    after = decode_cursor(cursor) if cursor else None
+    users = await get_users_page(db, limit + 1, after, account_type, order)
+    if len(users) > limit:
+        users = users[:limit]
+        set_next_page(request, response, encode_cursor(users[-1].created_at, users[-1].user_id))
+    return users
 
 # POST /admin/users : Create a new user (admin version).
 @router.post("/users", response_model=UserOut)
-def admin_create_user(user: UserCreate, db: Session = Depends(get_db), admin: User = Depends(admin_required)):
+async def admin_create_user(user: UserCreate, db: AsyncSession = Depends(get_async_db), admin: User = Depends(admin_required)):
     try:
-        hashed_password = get_password_hash(user.password)
+        hashed_password = await hash_password(user.password)
         new_user = User(
             username=user.username,
             email=user.email,
@@ -29,18 +47,15 @@ def admin_create_user(user: UserCreate, db: Session = Depends(get_db), admin: Us
             first_name=user.first_name,
             last_name=user.last_name,
         )
-        db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
-        return new_user
+        return await create_user(db, new_user)
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 # PUT /admin/users/{user_id} : Update an existing user's info.
 @router.put("/users/{user_id}", response_model=UserOut)
-def admin_update_user(user_id: uuid.UUID, user_data: UserUpdate, db: Session = Depends(get_db), admin: User = Depends(admin_required)):
-    db_user = db.query(User).filter(User.user_id == user_id).first()
+async def admin_update_user(user_id: uuid.UUID, user_data: UserUpdate, db: AsyncSession = Depends(get_async_db), admin: User = Depends(admin_required)):
+    db_user = await get_user_by_id(db, user_id)
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -49,28 +64,34 @@ def admin_update_user(user_id: uuid.UUID, user_data: UserUpdate, db: Session = D
     db_user.first_name = user_data.first_name
     db_user.last_name = user_data.last_name
     if user_data.password:
-        db_user.password_hash = get_password_hash(user_data.password)
+        db_user.password_hash = await hash_password(user_data.password)
     
-    db.commit()
-    db.refresh(db_user)
+    await session_cache.invalidate(db, user_id=user_id)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 # DELETE /admin/users/{user_id} : Delete a user and all associated files.
-@router.delete("/users/{user_id}")
-def admin_delete_user(user_id: uuid.UUID, db: Session = Depends(get_db), admin: User = Depends(admin_required)):
-    # Delete associated audio files from S3 before deleting the user.
-    files = db.query(AudioFile).filter(AudioFile.user_id == user_id).all()
-    for audio in files:
-        if audio.file_path:
-            # Extract full key including folder prefix
-            file_key = audio.file_path.replace(f"https://{BUCKET_NAME}.s3.amazonaws.com/", "")
-            try:
-                s3.delete_object(Bucket=BUCKET_NAME, Key=file_key)
-            except Exception as e:
-                print(f"Error deleting S3 object {file_key}: {e}", file=sys.stderr)
-    db_user = db.query(User).filter(User.user_id == user_id).first()
+# The user's rows go immediately; their S3 objects are removed by a delete operation, which runs in
+# the background (202, poll GET /files/delete-operations/{operation_id}) when there are many.
+@router.delete("/users/{user_id}", response_model=DeleteOperationOut)
+async def admin_delete_user(user_id: uuid.UUID, response: Response, db: AsyncSession = Depends(get_async_db), admin: User = Depends(admin_required)):
+    db_user = await get_user_by_id(db, user_id)
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
-    db.delete(db_user)
-    db.commit()
-    return {"detail": "User and all associated files deleted"}
+    result = await db.execute(select(AudioFile.file_path).where(AudioFile.user_id == user_id))
+    keys = [key for key in map(get_s3_key, result.scalars()) if key]
+    operation = deletion_service.create_operation(db, admin.user_id, keys)
+    # Files, sessions and upload jobs go with the user through ON DELETE CASCADE.
+    await db.execute(delete(User).where(User.user_id == user_id))
+    await session_cache.invalidate(db, user_id=user_id)
+    await db.commit()
+    if AUTH_MODE == "token":
+        await token_revocation.revoke_user(db, user_id)
+    playback_cache.invalidate_user(user_id)
+
+    operation = await deletion_service.start_operation(db, operation)
+    if operation.status in ("queued", "running"):
+        response.status_code = 202
+        response.headers["Location"] = f"/files/delete-operations/{operation.operation_id}"
+    return operation
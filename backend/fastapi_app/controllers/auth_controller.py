@@ -1,37 +1,55 @@
-import datetime, secrets
+import datetime, secrets, time
 from fastapi import APIRouter, Depends, HTTPException, Response, Request, Cookie
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi_app.schemas import UserOut
-from fastapi_app.database import get_db
-from fastapi_app.repositories.user_repo import get_user_by_username
-from fastapi_app.repositories.token_repo import store_token, remove_token, is_token_valid
-from fastapi_app.utils import verify_password
-from fastapi_app.models import SessionToken, User
-from fastapi_app.config import ACCESS_TOKEN_EXPIRE_MINUTES
-from fastapi_app.dependencies import get_current_user, get_token_from_cookie
+from fastapi_app.database import get_async_db, get_read_db
+from fastapi_app.repositories.user_repo import get_user_by_username, get_user_by_id
+from fastapi_app.repositories.token_repo import store_token, remove_token, remove_user_tokens, is_token_valid
+from fastapi_app.utils import create_access_token
+from fastapi_app.services.password_service import verify_password
+from fastapi_app.models import User
+from fastapi_app.config import ACCESS_TOKEN_EXPIRE_MINUTES, AUTH_MODE
+from fastapi_app.dependencies import get_current_user, get_token_from_cookie, get_token_claims
+from fastapi_app.etags import check_not_modified
+from fastapi_app.services import session_cache, token_revocation
+from fastapi_app.read_routing import read_with_fallback
 
 router = APIRouter()
 
 # POST /login : Login endpoint using session-based auth.
 @router.post("/login")
-def login(response: Response, form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = get_user_by_username(db, form_data.username)
-    if not user or not verify_password(form_data.password, user.password_hash):
+async def login(response: Response, form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    user = await get_user_by_username(db, form_data.username)
+    if not user:
         raise HTTPException(status_code=400, detail="Incorrect username or password")
+    is_valid, new_hash = await verify_password(form_data.password, user.password_hash)
+    if not is_valid:
+        raise HTTPException(status_code=400, detail="Incorrect username or password")
+    if new_hash:
+        # Stored hash used a different cost factor; upgrade it now that we have the plain password.
+        user.password_hash = new_hash
     
     # Update last_logged_in
     user.last_logged_in = datetime.datetime.now()
-    db.commit()
+    await db.commit()
 
-    # Remove any previous sessions for this user.
-    db.query(SessionToken).filter(SessionToken.user_id == user.user_id).delete()
-    db.commit()
+    if AUTH_MODE == "token":
+        # Revoke previously issued tokens, then issue a signed token that is checked without the DB.
+        await session_cache.invalidate(db, user_id=user.user_id)
+        await token_revocation.revoke_user(db, user.user_id)
+        session_token = create_access_token(
+            {"sub": str(user.user_id), "jti": secrets.token_urlsafe(16), "iat": time.time()},
+            expires_delta=datetime.timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        )
+    else:
+        # Remove any previous sessions for this user.
+        await remove_user_tokens(db, user.user_id)
 
-    # Generate a new session token.
-    session_token = secrets.token_urlsafe(32)
-    expires_at = datetime.datetime.utcnow() + datetime.timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    store_token(db, session_token, user.user_id, expires_at)
+        # Generate a new session token.
+        session_token = secrets.token_urlsafe(32)
+        expires_at = datetime.datetime.utcnow() + datetime.timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        await store_token(db, session_token, user.user_id, expires_at)
 
     # Set session cookie.
     response.set_cookie(
@@ -44,21 +62,39 @@ def login(response: Response, form_data: OAuth2PasswordRequestForm = Depends(),
     )
     return {"message": "Login successful"}
 
-# GET /me : Retrieve current user info.
+# GET /me : Retrieve current user info. Answers 304 to a current If-None-Match; otherwise the user is
+# reloaded, as the session cache may hold an older copy than the ETag describes.
 @router.get("/me", response_model=UserOut)
-def read_me(current_user: User = Depends(get_current_user)):
-    return current_user
+async def read_me(request: Request, response: Response, db: AsyncSession = Depends(get_read_db), current_user: User = Depends(get_current_user)):
+    async def read_user(db: AsyncSession):
+        not_modified = await check_not_modified(request, response, db, current_user.user_id)
+        if not_modified:
+            return not_modified
+        return await get_user_by_id(db, current_user.user_id)
+
+    return await read_with_fallback(db, read_user, "user")
 
 # GET /auth-status : Check authentication status.
 @router.get("/auth-status")
-def auth_status(session_token: str = Cookie(None), db: Session = Depends(get_db)):
-    if session_token and is_token_valid(db, session_token):
+async def auth_status(session_token: str = Cookie(None), db: AsyncSession = Depends(get_async_db)):
+    if session_token and AUTH_MODE == "token":
+        if get_token_claims(session_token):
+            return {"authenticated": True}
+    elif session_token and (session_cache.get(session_token) or await is_token_valid(db, session_token)):
         return {"authenticated": True}
     return Response(status_code=401)
 
 # POST /logout : Logout endpoint.
 @router.post("/logout")
-def logout(response: Response, db: Session = Depends(get_db), token: str = Depends(get_token_from_cookie)):
-    remove_token(db, token)
+async def logout(response: Response, db: AsyncSession = Depends(get_async_db), token: str = Depends(get_token_from_cookie)):
+    if AUTH_MODE == "token":
+        claims = get_token_claims(token)
+        await session_cache.invalidate(db, token=token)
+        if claims:
+            await token_revocation.revoke_token(db, claims)
+        else:
+            await db.commit()
+    else:
+        await remove_token(db, token)
     response.delete_cookie("session_token")
     return {"message": "Logged out successfully"}
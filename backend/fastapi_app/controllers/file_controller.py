@@ -1,15 +1,36 @@
 import uuid
 import os
 import sys
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, BackgroundTasks, Response
-from sqlalchemy.orm import Session
-from fastapi_app.database import get_db
+import time
+import asyncio
+import json
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Request, Response, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, delete, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi_app.database import get_async_db, get_read_db, AsyncSessionLocal
 from fastapi_app.models import AudioFile, AudioCategoryEnum, User
-from fastapi_app.schemas import AudioFileOut
-from fastapi_app.repositories.audio_repo import get_audio_file
-from fastapi_app.services.audio_service import process_upload
-from fastapi_app.utils import save_file_to_disk_and_checksum, s3
-from fastapi_app.config import ALLOWED_AUDIO_MIME_TYPES, BUCKET_NAME
+from fastapi_app.schemas import (
+    AudioFileOut, BatchUploadOut, PlaybackUrlOut, PlaybackBatchRequest, PlaybackBatchOut, BulkDeleteRequest, BulkDeleteOut, DeleteOperationOut
+)
+from fastapi_app.repositories.audio_repo import (
+    get_audio_file, get_audio_files_by_ids, get_audio_files_by_user, search_audio_files_by_user, delete_audio_file as remove_audio_file
+)
+from fastapi_app.services.audio_service import (
+    S3MultipartWriter, find_duplicate_upload, find_duplicate_uploads, get_s3_key, get_s3_url, abort_multipart_upload
+)
+from fastapi_app.services.s3_service import get_s3_client
+from fastapi_app.services import upload_queue, upload_events, playback_cache, deletion_service
+from fastapi_app.utils import save_file_to_disk_and_checksum, stream_file_to_s3_and_checksum
+from fastapi_app.config import (
+    ALLOWED_AUDIO_MIME_TYPES, BUCKET_NAME, UPLOAD_STREAM_TO_S3, PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX, PLAYBACK_URL_EXPIRES_SECONDS,
+    BULK_DELETE_MAX_FILES, UPLOAD_BATCH_MAX_FILES, UPLOAD_BATCH_CONCURRENCY,
+    UPLOAD_EVENTS_HEARTBEAT_SECONDS, UPLOAD_EVENTS_STREAM_SECONDS
+)
+from fastapi_app.pagination import SortOrder, encode_cursor, decode_cursor, set_next_page
+from fastapi_app.etags import check_not_modified
+from fastapi_app.read_routing import read_with_fallback
 from fastapi_app.dependencies import get_current_user
 
 router = APIRouter()
@@ -17,11 +38,10 @@ router = APIRouter()
 # POST /upload : Upload an audio file.
 @router.post("/upload", response_model=AudioFileOut)
 async def upload_audio_file(
-    background_tasks: BackgroundTasks,
     description: str,
     category: AudioCategoryEnum,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     if file.content_type not in ALLOWED_AUDIO_MIME_TYPES:
@@ -30,38 +50,19 @@ async def upload_audio_file(
             status_code=400,
             detail=f"File type {file.content_type} is not allowed. Allowed: {allowed_list}"
         )
+
+    if UPLOAD_STREAM_TO_S3:
+        return await stream_audio_file_to_s3(description, category, file, db, current_user)
     
     # Save file to disk and compute checksum.
     file_location, checksum = await save_file_to_disk_and_checksum(file)
     
     try:
-        # Check for duplicate by content.
-        duplicate_by_checksum = db.query(AudioFile).filter(
-            AudioFile.user_id == current_user.user_id,
-            AudioFile.checksum == checksum,
-            AudioFile.upload_status == "completed"
-        ).first()
-        if duplicate_by_checksum:
-            if os.path.exists(file_location):
-                os.remove(file_location)
-            raise HTTPException(
-                status_code=400,
-                detail=f"Duplicate file detected with ID {duplicate_by_checksum.file_id} and description '{duplicate_by_checksum.description}'"
-            )
-        
-        # Check for duplicate by description.
-        duplicate_by_description = db.query(AudioFile).filter(
-            AudioFile.user_id == current_user.user_id,
-            AudioFile.description == description,
-            AudioFile.upload_status == "completed"
-        ).first()
-        if duplicate_by_description:
+        duplicate_detail = await find_duplicate_upload(db, current_user.user_id, checksum, description)
+        if duplicate_detail:
             if os.path.exists(file_location):
                 os.remove(file_location)
-            raise HTTPException(
-                status_code=400,
-                detail=f"Duplicate description detected. A file with description '{duplicate_by_description.description}' has already been uploaded."
-            )
+            raise HTTPException(status_code=400, detail=duplicate_detail)
         
         # Create new upload record.
         new_audio = AudioFile(
@@ -73,74 +74,376 @@ async def upload_audio_file(
             checksum=checksum
         )
         db.add(new_audio)
-        db.commit()
-        db.refresh(new_audio)
-        upload_id = new_audio.file_id
+        await db.flush()
+        # The S3 upload is handed to the durable queue in the same transaction as the record.
+        upload_queue.enqueue_upload(db, new_audio, file_location, file.filename)
+        await db.commit()
+        await db.refresh(new_audio)
+    except HTTPException:
+        raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         if os.path.exists(file_location):
             os.remove(file_location)
         raise HTTPException(status_code=500, detail=f"Error creating upload record: {str(e)}")
     
-    background_tasks.add_task(
-        process_upload, file_location, checksum, description, category,
-        str(upload_id), current_user.user_id, file.filename
-    )
+    upload_queue.notify()
     return new_audio
 
-# GET /upload-status/{file_id} : Retrieve the upload status.
+# Streaming mode: hash each chunk and send it to an S3 multipart upload as it arrives.
+# Duplicate checks run once the stream ends and abort the multipart upload on a match. Metadata and
+# the fingerprint need the whole file, so an analyze job reads the object back and completes the record.
+async def stream_audio_file_to_s3(description: str, category: AudioCategoryEnum, file: UploadFile, db: AsyncSession, current_user: User):
+    file_key = f"{current_user.user_id}/{uuid.uuid4()}_{file.filename}"
+    s3_client = await get_s3_client()
+    writer = S3MultipartWriter(s3_client, file_key)
+    await writer.start()
+    try:
+        _, checksum = await stream_file_to_s3_and_checksum(file, writer)
+        duplicate_detail = await find_duplicate_upload(db, current_user.user_id, checksum, description)
+        if duplicate_detail:
+            raise HTTPException(status_code=400, detail=duplicate_detail)
+        await writer.complete()
+    except BaseException as e:
+        await writer.abort()
+        # Cancellation and interrupts propagate unchanged; only errors become a 500.
+        if isinstance(e, HTTPException) or not isinstance(e, Exception):
+            raise
+        raise HTTPException(status_code=500, detail=f"Error uploading file to S3: {str(e)}")
+
+    try:
+        new_audio = AudioFile(
+            user_id=current_user.user_id,
+            description=description,
+            category=category,
+            # Set now, so deleting the record before the analyze job runs also deletes the object.
+            file_path=get_s3_url(file_key),
+            upload_status="processing",
+            checksum=checksum
+        )
+        db.add(new_audio)
+        await db.flush()
+        upload_queue.enqueue_analysis(db, new_audio, file_key)
+        await db.commit()
+        await db.refresh(new_audio)
+    except Exception as e:
+        await db.rollback()
+        await s3_client.delete_object(Bucket=BUCKET_NAME, Key=file_key)
+        raise HTTPException(status_code=500, detail=f"Error creating upload record: {str(e)}")
+    upload_queue.notify()
+    return new_audio
+
+# POST /upload-batch : Upload many audio files in one request. descriptions and categories are form
+# fields repeated once per file, in the same order as the files. Files are stored
+# UPLOAD_BATCH_CONCURRENCY at a time, checked for duplicates in one query and inserted together;
+# each file gets its own status in the response.
+@router.post("/upload-batch", response_model=BatchUploadOut)
+async def upload_audio_files(
+    files: List[UploadFile] = File(...),
+    descriptions: List[str] = Form(...),
+    categories: List[AudioCategoryEnum] = Form(...),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    if not len(files) == len(descriptions) == len(categories):
+        raise HTTPException(status_code=400, detail="Each file needs exactly one description and one category")
+    if len(files) > UPLOAD_BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {UPLOAD_BATCH_MAX_FILES} files can be uploaded at once")
+
+    results = [{"filename": file.filename, "status": "accepted"} for file in files]
+    accepted = []
+    for index, file in enumerate(files):
+        if file.content_type not in ALLOWED_AUDIO_MIME_TYPES:
+            results[index].update(status="rejected", detail=f"File type {file.content_type} is not allowed")
+        else:
+            accepted.append(index)
+
+    semaphore = asyncio.Semaphore(UPLOAD_BATCH_CONCURRENCY)
+    stored = {}  # index -> (file_location or file_key, checksum)
+
+    async def store(index: int):
+        async with semaphore:
+            try:
+                stored[index] = await store_batch_file(files[index], current_user)
+            except HTTPException as e:
+                results[index].update(status="rejected", detail=e.detail)
+            except Exception as e:
+                results[index].update(status="error", detail=f"Error storing file: {str(e)}")
+
+    async with asyncio.TaskGroup() as tg:
+        for index in accepted:
+            tg.create_task(store(index))
+
+    indexes = sorted(stored)
+    new_indexes = []
+    try:
+        duplicate_details = await find_duplicate_uploads(
+            db, current_user.user_id, [(stored[index][1], descriptions[index]) for index in indexes]
+        )
+        for index, detail in zip(indexes, duplicate_details):
+            if detail:
+                results[index].update(status="duplicate", detail=detail)
+            else:
+                new_indexes.append(index)
+        if new_indexes:
+            rows = [{
+                "user_id": current_user.user_id,
+                "description": descriptions[index],
+                "category": categories[index],
+                "file_path": get_s3_url(stored[index][0]) if UPLOAD_STREAM_TO_S3 else "",
+                "upload_status": "processing",
+                "checksum": stored[index][1]
+            } for index in new_indexes]
+            result = await db.scalars(insert(AudioFile).returning(AudioFile, sort_by_parameter_order=True), rows)
+            new_audio_files = result.all()
+            for index, new_audio in zip(new_indexes, new_audio_files):
+                if UPLOAD_STREAM_TO_S3:
+                    upload_queue.enqueue_analysis(db, new_audio, stored[index][0])
+                else:
+                    upload_queue.enqueue_upload(db, new_audio, stored[index][0], files[index].filename)
+            await db.commit()
+            for index, new_audio in zip(new_indexes, new_audio_files):
+                results[index]["file"] = new_audio
+    except Exception as e:
+        await db.rollback()
+        new_indexes = []
+        raise HTTPException(status_code=500, detail=f"Error creating upload records: {str(e)}")
+    finally:
+        await discard_batch_files([stored[index][0] for index in indexes if index not in new_indexes])
+
+    if new_indexes:
+        upload_queue.notify()
+    return {"results": results}
+
+# Store one batch file: on disk for the upload queue, or straight to S3 in streaming mode.
+# Returns (file_location or S3 key, checksum). Duplicates are only known once the whole batch is
+# stored, so streamed duplicates are completed and then deleted rather than holding parts open.
+async def store_batch_file(file: UploadFile, current_user: User):
+    if not UPLOAD_STREAM_TO_S3:
+        return await save_file_to_disk_and_checksum(file)
+    file_key = f"{current_user.user_id}/{uuid.uuid4()}_{file.filename}"
+    writer = S3MultipartWriter(await get_s3_client(), file_key)
+    await writer.start()
+    try:
+        _, checksum = await stream_file_to_s3_and_checksum(file, writer)
+        await writer.complete()
+    except BaseException:
+        await writer.abort()
+        raise
+    return file_key, checksum
+
+async def discard_batch_files(stored: list):
+    if not stored:
+        return
+    if UPLOAD_STREAM_TO_S3:
+        for failure in await deletion_service.delete_s3_keys(stored):
+            print(f"Error deleting S3 object {failure['key']}: {failure['code']} {failure['message']}", file=sys.stderr)
+    else:
+        for file_location in stored:
+            if os.path.exists(file_location):
+                os.remove(file_location)
+
+# GET /upload-status/{file_id} : Retrieve the upload status. Answers 304 to a current If-None-Match.
 @router.get("/upload-status/{file_id}", response_model=AudioFileOut)
-def upload_status(file_id: uuid.UUID, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    record = db.query(AudioFile).filter(
-        AudioFile.file_id == file_id,
-        AudioFile.user_id == current_user.user_id
-    ).first()
+async def upload_status(file_id: uuid.UUID, request: Request, response: Response, db: AsyncSession = Depends(get_read_db), current_user: User = Depends(get_current_user)):
+    async def read_status(db: AsyncSession):
+        not_modified = await check_not_modified(request, response, db, current_user.user_id)
+        if not_modified:
+            return not_modified
+        return await get_audio_file(db, file_id, current_user.user_id)
+
+    # Often polled straight after the upload, before a replica has the record.
+    record = await read_with_fallback(db, read_status, "upload_status")
     if not record:
         raise HTTPException(status_code=404, detail="Upload record not found")
     return record
 
-# GET /files : Retrieve all audio files for the current user.
+# GET /upload-events : Server-Sent Events stream of the caller's upload status changes and S3 upload
+# progress, replacing polling of /upload-status. Pass file_id (repeatable) to first receive the current
+# state of those uploads, covering changes made before the stream opened.
+@router.get("/upload-events")
+async def upload_status_events(file_id: List[uuid.UUID] = Query([]), current_user: User = Depends(get_current_user)):
+    user_id = current_user.user_id
+
+    def format_event(event: dict) -> str:
+        return f"event: upload_status\ndata: {json.dumps(event)}\n\n"
+
+    async def stream():
+        # Subscribe before reading the snapshot so no change falls between the two.
+        queue = upload_events.subscribe(user_id)
+        try:
+            yield "retry: 3000\n\n"
+            if file_id:
+                async with AsyncSessionLocal() as db:
+                    for audio_file in await get_audio_files_by_ids(db, file_id, user_id):
+                        yield format_event({"file_id": str(audio_file.file_id), "upload_status": audio_file.upload_status})
+            deadline = time.monotonic() + UPLOAD_EVENTS_STREAM_SECONDS
+            while (remaining := deadline - time.monotonic()) > 0:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=min(UPLOAD_EVENTS_HEARTBEAT_SECONDS, remaining))
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_event({key: value for key, value in event.items() if key != "user_id"})
+        finally:
+            upload_events.unsubscribe(user_id, queue)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# GET /files : Retrieve a page of the current user's audio files, newest first by default.
+# Pass the X-Next-Cursor header of the previous page as `cursor` to get the next one.
+# Answers 304 to a current If-None-Match without loading any rows.
 @router.get("/", response_model=list[AudioFileOut])
-def get_audio_files(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    return db.query(AudioFile).filter(AudioFile.user_id == current_user.user_id).all()
+async def get_audio_files(
+    request: Request,
+    response: Response,
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    category: Optional[AudioCategoryEnum] = None,
+    upload_status: Optional[str] = None,
+    order: SortOrder = SortOrder.desc,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    not_modified = await check_not_modified(request, response, db, current_user.user_id)
+    if not_modified:
+        return not_modified
+    after = decode_cursor(cursor) if cursor else None
+    files = await get_audio_files_by_user(db, current_user.user_id, limit + 1, after, category, upload_status, order)
+    if len(files) > limit:
+        files = files[:limit]
+        set_next_page(request, response, encode_cursor(files[-1].upload_timestamp, files[-1].file_id))
+    return files
+
+# GET /files/search : Search the current user's descriptions, best match first. Paged like GET /files.
+@router.get("/search", response_model=list[AudioFileOut])
+async def search_audio_files(
+    request: Request,
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    category: Optional[AudioCategoryEnum] = None,
+    upload_status: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    after = decode_cursor(cursor, sort_type=float) if cursor else None
+    rows = await search_audio_files_by_user(db, current_user.user_id, q, limit + 1, after, category, upload_status)
+    if len(rows) > limit:
+        rows = rows[:limit]
+        set_next_page(request, response, encode_cursor(rows[-1].rank, rows[-1].AudioFile.file_id))
+    return [row.AudioFile for row in rows]
+
+# DELETE /files : Delete many of the current user's audio files. S3 objects are removed by a delete
+# operation, which runs in the background (202, poll the Location) when there are many.
+@router.delete("/", response_model=BulkDeleteOut)
+async def delete_audio_files(request: BulkDeleteRequest, response: Response, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    file_ids = list(dict.fromkeys(request.file_ids))
+    if len(file_ids) > BULK_DELETE_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {BULK_DELETE_MAX_FILES} files can be deleted at once")
+
+    result = await db.execute(select(AudioFile.file_id, AudioFile.file_path, AudioFile.s3_upload_id).where(
+        AudioFile.file_id.in_(file_ids), AudioFile.user_id == current_user.user_id
+    ))
+    rows = result.all()
+    found_ids = [row.file_id for row in rows]
+    keys = [key for key in (get_s3_key(row.file_path) for row in rows) if key]
+    # Pending presigned uploads hold parts that only an abort releases; nothing finds them once the row is gone.
+    pending = [row for row in rows if row.s3_upload_id]
+    if pending:
+        s3_client = await get_s3_client()
+        for row in pending:
+            await abort_multipart_upload(s3_client, get_s3_key(row.file_path), row.s3_upload_id)
+    operation = deletion_service.create_operation(db, current_user.user_id, keys)
+    await db.execute(delete(AudioFile).where(AudioFile.file_id.in_(found_ids), AudioFile.user_id == current_user.user_id))
+    await db.commit()
+    for file_id in found_ids:
+        playback_cache.invalidate_file(file_id, current_user.user_id)
+
+    operation = await deletion_service.start_operation(db, operation)
+    if operation.status in ("queued", "running"):
+        response.status_code = 202
+        response.headers["Location"] = f"/files/delete-operations/{operation.operation_id}"
+    found = set(found_ids)
+    return {"operation": operation, "missing": [file_id for file_id in file_ids if file_id not in found]}
+
+# GET /files/delete-operations/{operation_id} : Progress of a delete operation started by the caller.
+@router.get("/delete-operations/{operation_id}", response_model=DeleteOperationOut)
+async def delete_operation_status(operation_id: uuid.UUID, db: AsyncSession = Depends(get_read_db), current_user: User = Depends(get_current_user)):
+    operation = await read_with_fallback(db, lambda db: deletion_service.get_operation(db, operation_id), "delete_operation")
+    if not operation or (operation.requested_by != current_user.user_id and current_user.account_type != "superuser"):
+        raise HTTPException(status_code=404, detail="Delete operation not found or not authorized")
+    return operation
 
 # DELETE /files/{file_id} : Delete an individual audio file.
 @router.delete("/{file_id}")
-def delete_audio_file(file_id: uuid.UUID, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    audio_file = db.query(AudioFile).filter(
-        AudioFile.file_id == file_id,
-        AudioFile.user_id == current_user.user_id
-    ).first()
+async def delete_audio_file(file_id: uuid.UUID, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    audio_file = await get_audio_file(db, file_id, current_user.user_id)
     if not audio_file:
         raise HTTPException(status_code=404, detail="Audio file not found or not authorized")
     
     if audio_file.file_path:
         file_key = audio_file.file_path.replace(f"https://{BUCKET_NAME}.s3.amazonaws.com/", "")
         try:
-            s3.delete_object(Bucket=BUCKET_NAME, Key=file_key)
+            s3_client = await get_s3_client()
+            if audio_file.s3_upload_id:
+                # A pending presigned upload: its parts are only released by aborting it.
+                await abort_multipart_upload(s3_client, file_key, audio_file.s3_upload_id)
+            await s3_client.delete_object(Bucket=BUCKET_NAME, Key=file_key)
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error deleting file from S3: {str(e)}")
     
-    db.delete(audio_file)
-    db.commit()
+    await remove_audio_file(db, audio_file)
+    playback_cache.invalidate_file(file_id, current_user.user_id)
     return {"detail": "Audio file deleted"}
 
-# GET /files/{file_id}/playback : Generate a pre-signed URL for playback.
-@router.get("/{file_id}/playback")
-def playback_audio_file(file_id: uuid.UUID, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    audio_file = db.query(AudioFile).filter(
-        AudioFile.file_id == file_id,
-        AudioFile.user_id == current_user.user_id
-    ).first()
+# Sign a playback URL for an audio file the caller owns. Only finished uploads are cached.
+async def presign_playback_url(audio_file: AudioFile) -> PlaybackUrlOut:
+    file_key = audio_file.file_path.replace(f"https://{BUCKET_NAME}.s3.amazonaws.com/", "")
+    issued_at = time.monotonic()
+    s3_client = await get_s3_client()
+    presigned_url = await s3_client.generate_presigned_url(
+        'get_object',
+        Params={'Bucket': BUCKET_NAME, 'Key': file_key},
+        ExpiresIn=PLAYBACK_URL_EXPIRES_SECONDS
+    )
+    if audio_file.upload_status == "completed":
+        playback_cache.put(audio_file.file_id, audio_file.user_id, presigned_url, issued_at)
+    return PlaybackUrlOut(file_path=presigned_url, expires_in=PLAYBACK_URL_EXPIRES_SECONDS)
+
+# POST /files/playback : Generate pre-signed URLs for many files with a single DB query.
+@router.post("/playback", response_model=PlaybackBatchOut)
+async def playback_audio_files(request: PlaybackBatchRequest, db: AsyncSession = Depends(get_read_db), current_user: User = Depends(get_current_user)):
+    file_ids = list(dict.fromkeys(request.file_ids))
+    if len(file_ids) > PAGE_SIZE_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {PAGE_SIZE_MAX} files can be requested at once")
+
+    urls = {}
+    for file_id in file_ids:
+        cached = playback_cache.get(file_id, current_user.user_id)
+        if cached:
+            urls[file_id] = PlaybackUrlOut(file_path=cached[0], expires_in=cached[1])
+    uncached_ids = [file_id for file_id in file_ids if file_id not in urls]
+    if uncached_ids:
+        try:
+            for audio_file in await get_audio_files_by_ids(db, uncached_ids, current_user.user_id):
+                if audio_file.upload_status == "completed":
+                    urls[audio_file.file_id] = await presign_playback_url(audio_file)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to generate pre-signed URLs: {str(e)}")
+    return PlaybackBatchOut(urls=urls, missing=[file_id for file_id in file_ids if file_id not in urls])
+
+# GET /files/{file_id}/playback : Generate a pre-signed URL for playback, reusing a cached one when fresh.
+@router.get("/{file_id}/playback", response_model=PlaybackUrlOut)
+async def playback_audio_file(file_id: uuid.UUID, db: AsyncSession = Depends(get_read_db), current_user: User = Depends(get_current_user)):
+    cached = playback_cache.get(file_id, current_user.user_id)
+    if cached:
+        return PlaybackUrlOut(file_path=cached[0], expires_in=cached[1])
+    audio_file = await get_audio_file(db, file_id, current_user.user_id)
     if not audio_file:
         raise HTTPException(status_code=404, detail="Audio file not found or not authorized")
-    file_key = audio_file.file_path.replace(f"https://{BUCKET_NAME}.s3.amazonaws.com/", "")
     try:
-        presigned_url = s3.generate_presigned_url(
-            'get_object',
-            Params={'Bucket': BUCKET_NAME, 'Key': file_key},
-            ExpiresIn=3600
-        )
+        return await presign_playback_url(audio_file)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate pre-signed URL: {str(e)}")
-    return {"file_path": presigned_url}
@@ -0,0 +1,177 @@
+import uuid
+import sys
+import math
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi_app.database import get_async_db
+from fastapi_app.models import AudioFile, User
+from fastapi_app.schemas import (
+    AudioFileOut, PresignedUploadCreate, PresignedUploadOut, PresignedPartsRequest,
+    PresignedPartsOut, PresignedUploadComplete
+)
+from fastapi_app.services.audio_service import find_duplicate_upload
+from fastapi_app.services.s3_service import get_s3_client
+from fastapi_app.services import upload_queue, upload_events
+from fastapi_app.services.presigned_upload_service import get_upload_expiry, get_file_key
+from fastapi_app.config import (
+    ALLOWED_AUDIO_MIME_TYPES, BUCKET_NAME, MAX_FILE_SIZE, S3_MULTIPART_PART_SIZE,
+    PRESIGNED_UPLOAD_EXPIRES_SECONDS
+)
+from fastapi_app.dependencies import get_current_user
+
+router = APIRouter()
+
+async def get_pending_upload(db: AsyncSession, file_id: uuid.UUID, user_id, for_update: bool = False) -> AudioFile:
+    query = select(AudioFile).where(
+        AudioFile.file_id == file_id,
+        AudioFile.user_id == user_id,
+        AudioFile.upload_status == "processing",
+        AudioFile.s3_upload_id.isnot(None)
+    )
+    if for_update:
+        query = query.with_for_update()
+    result = await db.execute(query)
+    audio_file = result.scalars().first()
+    if not audio_file:
+        raise HTTPException(status_code=404, detail="Pending upload not found or not authorized")
+    return audio_file
+
+# POST /files/presigned-upload : Start a client-side multipart upload straight to S3.
+@router.post("", response_model=PresignedUploadOut)
+async def start_presigned_upload(upload: PresignedUploadCreate, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    if upload.content_type not in ALLOWED_AUDIO_MIME_TYPES:
+        allowed_list = ", ".join(ALLOWED_AUDIO_MIME_TYPES)
+        raise HTTPException(
+            status_code=400,
+            detail=f"File type {upload.content_type} is not allowed. Allowed: {allowed_list}"
+        )
+    if upload.file_size <= 0 or upload.file_size > MAX_FILE_SIZE:
+        raise HTTPException(status_code=400, detail="File size exceeds the maximum allowed limit of 1GB")
+
+    duplicate_detail = await find_duplicate_upload(db, current_user.user_id, upload.checksum, upload.description)
+    if duplicate_detail:
+        raise HTTPException(status_code=400, detail=duplicate_detail)
+
+    file_key = f"{current_user.user_id}/{uuid.uuid4()}_{upload.filename}"
+    try:
+        s3_client = await get_s3_client()
+        # The declared checksum travels with the object until the analyze job verifies it against the
+        # bytes; the record only gets a checksum once it has been computed by the server.
+        response = await s3_client.create_multipart_upload(
+            Bucket=BUCKET_NAME,
+            Key=file_key,
+            ContentType=upload.content_type,
+            Metadata={"declared-md5": upload.checksum}
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error starting upload in S3: {str(e)}")
+
+    try:
+        new_audio = AudioFile(
+            user_id=current_user.user_id,
+            description=upload.description,
+            category=upload.category,
+            file_path=f"https://{BUCKET_NAME}.s3.amazonaws.com/{file_key}",
+            upload_status="processing",
+            file_size=upload.file_size,
+            s3_upload_id=response["UploadId"],
+            upload_expires_at=get_upload_expiry()
+        )
+        db.add(new_audio)
+        await db.commit()
+        await db.refresh(new_audio)
+    except Exception as e:
+        await db.rollback()
+        await s3_client.abort_multipart_upload(Bucket=BUCKET_NAME, Key=file_key, UploadId=response["UploadId"])
+        raise HTTPException(status_code=500, detail=f"Error creating upload record: {str(e)}")
+
+    return PresignedUploadOut(
+        file_id=new_audio.file_id,
+        part_size=S3_MULTIPART_PART_SIZE,
+        part_count=math.ceil(upload.file_size / S3_MULTIPART_PART_SIZE)
+    )
+
+# POST /files/presigned-upload/{file_id}/parts : Get pre-signed URLs for uploading parts.
+@router.post("/{file_id}/parts", response_model=PresignedPartsOut)
+async def presign_upload_parts(file_id: uuid.UUID, request: PresignedPartsRequest, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    audio_file = await get_pending_upload(db, file_id, current_user.user_id)
+    part_count = math.ceil(audio_file.file_size / S3_MULTIPART_PART_SIZE)
+    if any(n < 1 or n > part_count for n in request.part_numbers):
+        raise HTTPException(status_code=400, detail=f"Part numbers must be between 1 and {part_count}")
+
+    file_key = get_file_key(audio_file)
+    s3_client = await get_s3_client()
+    try:
+        urls = {
+            n: await s3_client.generate_presigned_url(
+                'upload_part',
+                Params={'Bucket': BUCKET_NAME, 'Key': file_key, 'UploadId': audio_file.s3_upload_id, 'PartNumber': n},
+                ExpiresIn=PRESIGNED_UPLOAD_EXPIRES_SECONDS
+            )
+            for n in request.part_numbers
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to generate pre-signed URLs: {str(e)}")
+    return PresignedPartsOut(urls=urls, expires_in=PRESIGNED_UPLOAD_EXPIRES_SECONDS)
+
+# POST /files/presigned-upload/{file_id}/complete : Finish the upload and check its size. The record
+# stays "processing" until an analyze job has read the object back, verified the declared checksum
+# and extracted its metadata and fingerprint.
+@router.post("/{file_id}/complete", response_model=AudioFileOut)
+async def complete_presigned_upload(file_id: uuid.UUID, upload: PresignedUploadComplete, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    # Locked so the expiry cleanup cannot abort the upload while it is being completed.
+    audio_file = await get_pending_upload(db, file_id, current_user.user_id, for_update=True)
+    file_key = get_file_key(audio_file)
+    parts = sorted(upload.parts, key=lambda part: part.part_number)
+    s3_client = await get_s3_client()
+    # A failure here leaves the upload open in S3, so the client can retry with the right parts.
+    try:
+        await s3_client.complete_multipart_upload(
+            Bucket=BUCKET_NAME,
+            Key=file_key,
+            UploadId=audio_file.s3_upload_id,
+            MultipartUpload={"Parts": [{"PartNumber": p.part_number, "ETag": p.etag} for p in parts]}
+        )
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error completing upload in S3: {str(e)}")
+
+    # From here the object exists and the upload id is spent, so any failure removes the object and
+    # fails the record rather than leaving it pending.
+    try:
+        head = await s3_client.head_object(Bucket=BUCKET_NAME, Key=file_key)
+        error_detail = None
+        if head["ContentLength"] != audio_file.file_size:
+            error_detail = f"Uploaded object does not match the declared size of {audio_file.file_size} bytes"
+    except Exception as e:
+        head, error_detail = None, f"Error checking uploaded object in S3: {str(e)}"
+    audio_file.s3_upload_id = None
+    audio_file.upload_expires_at = None
+    if error_detail:
+        try:
+            await s3_client.delete_object(Bucket=BUCKET_NAME, Key=file_key)
+        except Exception as e:
+            print(f"Error deleting S3 object {file_key}: {e}", file=sys.stderr)
+        audio_file.upload_status = "error"
+        await upload_events.publish(db, audio_file.file_id, audio_file.user_id, "error")
+        await db.commit()
+        raise HTTPException(status_code=400, detail=error_detail)
+
+    upload_queue.enqueue_analysis(db, audio_file, file_key, head.get("Metadata", {}).get("declared-md5"))
+    await db.commit()
+    await db.refresh(audio_file)
+    upload_queue.notify()
+    return audio_file
+
+# DELETE /files/presigned-upload/{file_id} : Abort an unfinished upload.
+@router.delete("/{file_id}")
+async def abort_presigned_upload(file_id: uuid.UUID, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    audio_file = await get_pending_upload(db, file_id, current_user.user_id)
+    try:
+        s3_client = await get_s3_client()
+        await s3_client.abort_multipart_upload(Bucket=BUCKET_NAME, Key=get_file_key(audio_file), UploadId=audio_file.s3_upload_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error aborting upload in S3: {str(e)}")
+    await db.delete(audio_file)
+    await db.commit()
+    return {"detail": "Upload aborted"}
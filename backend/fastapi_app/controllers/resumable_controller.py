@@ -0,0 +1,196 @@
+import uuid
+import os
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, Header
+from starlette.requests import ClientDisconnect
+from sqlalchemy import select, update, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi_app.database import get_async_db
+from fastapi_app.models import AudioFile, AudioCategoryEnum, User
+from fastapi_app.services.audio_service import find_duplicate_upload
+from fastapi_app.services import upload_queue
+from fastapi_app.services.resumable_service import (
+    get_partial_path, get_upload_expiry, append_chunks, finish_checksum, discard_upload,
+    lease_is_free, claim_receive_lease, renew_receive_lease, release_receive_lease
+)
+from fastapi_app.config import ALLOWED_AUDIO_MIME_TYPES, MAX_FILE_SIZE, UPLOAD_NODE_ID
+from fastapi_app.dependencies import get_current_user
+
+# Chunked, resumable uploads modelled on the tus protocol (https://tus.io/protocols/resumable-upload).
+router = APIRouter()
+
+TUS_VERSION = "1.0.0"
+
+async def get_resumable_upload(db: AsyncSession, file_id: uuid.UUID, user_id) -> AudioFile:
+    result = await db.execute(select(AudioFile).where(
+        AudioFile.file_id == file_id,
+        AudioFile.user_id == user_id,
+        AudioFile.upload_status == "uploading"
+    ))
+    audio_file = result.scalars().first()
+    if not audio_file:
+        raise HTTPException(status_code=404, detail="Resumable upload not found or not authorized")
+    return audio_file
+
+# The partial file is on the disk of the node that created the upload, so requests that write to it
+# must reach that node. Others get 421 naming the node, for the client or load balancer to retry there.
+def require_upload_node(audio_file: AudioFile):
+    if audio_file.upload_node not in (None, UPLOAD_NODE_ID):
+        raise HTTPException(
+            status_code=421,
+            detail=f"Upload is held by node {audio_file.upload_node}",
+            headers={"Upload-Node": audio_file.upload_node, "Tus-Resumable": TUS_VERSION}
+        )
+
+def offset_headers(audio_file: AudioFile) -> dict:
+    headers = {
+        "Upload-Offset": str(audio_file.upload_offset),
+        "Upload-Length": str(audio_file.file_size),
+        "Tus-Resumable": TUS_VERSION,
+        "Cache-Control": "no-store",
+    }
+    if audio_file.upload_node:
+        headers["Upload-Node"] = audio_file.upload_node
+    return headers
+
+# POST /files/resumable : Create a resumable upload. The total size is sent in the Upload-Length header.
+@router.post("", status_code=201)
+async def create_resumable_upload(
+    response: Response,
+    description: str,
+    category: AudioCategoryEnum,
+    filename: str,
+    content_type: str,
+    upload_length: int = Header(...),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    if content_type not in ALLOWED_AUDIO_MIME_TYPES:
+        allowed_list = ", ".join(ALLOWED_AUDIO_MIME_TYPES)
+        raise HTTPException(
+            status_code=400,
+            detail=f"File type {content_type} is not allowed. Allowed: {allowed_list}"
+        )
+    if upload_length <= 0 or upload_length > MAX_FILE_SIZE:
+        raise HTTPException(status_code=400, detail="File size exceeds the maximum allowed limit of 1GB")
+
+    try:
+        new_audio = AudioFile(
+            user_id=current_user.user_id,
+            description=description,
+            category=category,
+            file_path="",  # local partial file until the upload completes.
+            upload_status="uploading",
+            file_size=upload_length,
+            upload_offset=0,
+            upload_expires_at=get_upload_expiry(),
+            upload_node=UPLOAD_NODE_ID
+        )
+        db.add(new_audio)
+        await db.flush()
+        new_audio.file_path = get_partial_path(new_audio.file_id, os.path.basename(filename))
+        open(new_audio.file_path, "wb").close()
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Error creating upload record: {str(e)}")
+
+    response.headers["Location"] = f"/files/resumable/{new_audio.file_id}"
+    response.headers.update(offset_headers(new_audio))
+    return {"file_id": new_audio.file_id, "upload_offset": 0, "upload_length": upload_length}
+
+# HEAD /files/resumable/{file_id} : Report how many bytes have been received. Answered from the
+# database, so any node can serve it; Upload-Node names the node to send the next PATCH to.
+@router.head("/{file_id}")
+async def get_resumable_upload_offset(file_id: uuid.UUID, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    audio_file = await get_resumable_upload(db, file_id, current_user.user_id)
+    return Response(status_code=200, headers=offset_headers(audio_file))
+
+# PATCH /files/resumable/{file_id} : Append the request body at Upload-Offset.
+@router.patch("/{file_id}", status_code=204)
+async def upload_resumable_chunk(
+    file_id: uuid.UUID,
+    request: Request,
+    upload_offset: int = Header(...),
+    content_type: str = Header(...),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    if content_type != "application/offset+octet-stream":
+        raise HTTPException(status_code=415, detail="Content-Type must be application/offset+octet-stream")
+    audio_file = await get_resumable_upload(db, file_id, current_user.user_id)
+    require_upload_node(audio_file)
+    if upload_offset != audio_file.upload_offset:
+        raise HTTPException(status_code=409, detail=f"Upload offset mismatch, current offset is {audio_file.upload_offset}")
+    # Claiming the lease also ends the read transaction, so no pooled connection is held while the body streams in.
+    if not await claim_receive_lease(db, audio_file, upload_offset):
+        raise HTTPException(status_code=409, detail="Upload is already receiving data")
+
+    # Whatever reached the disk is kept, so an interrupted PATCH can be resumed from the new offset.
+    lease = asyncio.create_task(renew_receive_lease(file_id))
+    error_detail = None
+    try:
+        try:
+            new_offset = await append_chunks(
+                file_id, audio_file.file_path, upload_offset, audio_file.file_size, request.stream()
+            )
+        except ClientDisconnect:
+            new_offset = os.path.getsize(audio_file.file_path)
+        except ValueError as e:
+            new_offset = os.path.getsize(audio_file.file_path)
+            error_detail = str(e)
+    except BaseException:
+        # The recorded offset stands; the next PATCH truncates whatever this one left past it.
+        lease.cancel()
+        await asyncio.shield(release_receive_lease(file_id))
+        raise
+    lease.cancel()
+    audio_file.upload_offset = new_offset
+    audio_file.upload_expires_at = get_upload_expiry()
+    audio_file.receiving_until = None
+    await db.commit()
+    if error_detail:
+        raise HTTPException(status_code=400, detail=error_detail)
+
+    if new_offset == audio_file.file_size:
+        # An empty PATCH at the final offset can claim the lease before the PATCH that completed the
+        # upload moves it on, so only the request whose update finds it still uploading finishes it.
+        finishing = await db.execute(
+            update(AudioFile)
+            .where(AudioFile.file_id == file_id, AudioFile.upload_status == "uploading")
+            .values(upload_status="processing", upload_expires_at=None)
+        )
+        if finishing.rowcount != 1:
+            await db.rollback()
+            return Response(status_code=204, headers=offset_headers(audio_file))
+        checksum = finish_checksum(file_id)
+        duplicate_detail = await find_duplicate_upload(db, current_user.user_id, checksum, audio_file.description)
+        if duplicate_detail:
+            discard_upload(file_id, audio_file.file_path)
+            await db.delete(audio_file)
+            await db.commit()
+            raise HTTPException(status_code=400, detail=duplicate_detail)
+
+        audio_file.checksum = checksum
+        audio_file.upload_status = "processing"
+        audio_file.upload_expires_at = None
+        original_filename = os.path.basename(audio_file.file_path)[len(f"{file_id}_"):-len(".part")]
+        upload_queue.enqueue_upload(db, audio_file, audio_file.file_path, original_filename)
+        await db.commit()
+        upload_queue.notify()
+
+    return Response(status_code=204, headers=offset_headers(audio_file))
+
+# DELETE /files/resumable/{file_id} : Terminate an unfinished upload.
+@router.delete("/{file_id}", status_code=204)
+async def terminate_resumable_upload(file_id: uuid.UUID, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    audio_file = await get_resumable_upload(db, file_id, current_user.user_id)
+    require_upload_node(audio_file)
+    deleted = await db.execute(
+        delete(AudioFile).where(AudioFile.file_id == file_id, AudioFile.upload_status == "uploading", lease_is_free())
+    )
+    if deleted.rowcount != 1:
+        raise HTTPException(status_code=409, detail="Upload is receiving data")
+    await db.commit()
+    discard_upload(file_id, audio_file.file_path)
+    return Response(status_code=204, headers={"Tus-Resumable": TUS_VERSION})
@@ -1,14 +1,49 @@
+from fastapi import Depends, Request
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
-from fastapi_app.config import DATABASE_URL
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from fastapi_app.config import (
+    DATABASE_URL, ASYNC_DATABASE_URL, ASYNC_REPLICA_DATABASE_URL,
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT_SECONDS, DB_POOL_RECYCLE_SECONDS
+)
 
+# Sync engine for schema setup and seeding (fastapi_app/manage.py). No engine connects until first used.
 engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+pool_options = dict(
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT_SECONDS,
+    pool_recycle=DB_POOL_RECYCLE_SECONDS
+)
+
+# Async engine for request handlers and background work on the event loop.
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **pool_options)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+# Engine for read-only handlers: the replica when one is configured, otherwise the primary itself.
+replica_engine = create_async_engine(ASYNC_REPLICA_DATABASE_URL, **pool_options) if ASYNC_REPLICA_DATABASE_URL else async_engine
+ReplicaSessionLocal = async_sessionmaker(bind=replica_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
+# Cookie marking a client that wrote within REPLICA_STICKY_SECONDS; set by read_routing.ReadYourWritesMiddleware.
+READ_PRIMARY_COOKIE = "read_primary"
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Session for handlers that only read. Clients that just wrote read from the primary, so they see their
+# own changes before the replica has them; they then share the request's primary session, which opens
+# no connection unless used.
+async def get_read_db(request: Request, primary_db: AsyncSession = Depends(get_async_db)):
+    if replica_engine is async_engine or request.cookies.get(READ_PRIMARY_COOKIE):
+        yield primary_db
+        return
+    async with ReplicaSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+def is_replica(db: AsyncSession) -> bool:
+    return db.bind is not async_engine
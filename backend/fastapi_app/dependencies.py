@@ -1,8 +1,13 @@
-import datetime
+import datetime, uuid
 from fastapi import Depends, HTTPException, Request, Cookie, status
-from sqlalchemy.orm import Session
-from fastapi_app.database import get_db
-from fastapi_app.models import User, SessionToken
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi_app.database import get_async_db, AsyncSessionLocal
+from fastapi_app.models import User
+from fastapi_app.config import AUTH_MODE
+from fastapi_app.utils import decode_access_token
+from fastapi_app.repositories.token_repo import get_session_token
+from fastapi_app.repositories.user_repo import get_user_by_id
+from fastapi_app.services import session_cache, token_revocation
 
 def get_token_from_cookie(request: Request):
     token = request.cookies.get("session_token")
@@ -10,16 +15,67 @@ def get_token_from_cookie(request: Request):
         raise HTTPException(status_code=401, detail="Not authenticated")
     return token
 
-def get_current_user(token: str = Depends(get_token_from_cookie), db: Session = Depends(get_db)) -> User:
-    session_token = db.query(SessionToken).filter(SessionToken.token == token).first()
-    if not session_token or session_token.expires_at < datetime.datetime.utcnow():
+# Claims of a valid, unrevoked signed token (AUTH_MODE "token"), otherwise None.
+def get_token_claims(token: str):
+    claims = decode_access_token(token)
+    if not claims or token_revocation.is_revoked(claims):
+        return None
+    return claims
+
+# (user, session expiry) for a session token, the user being None if it no longer exists.
+# None when the session is missing or expired.
+async def load_session_user(db: AsyncSession, token: str, claims):
+    if AUTH_MODE == "token":
+        user_id = uuid.UUID(claims["sub"])
+        expires_at = datetime.datetime.utcfromtimestamp(claims["exp"])
+    else:
+        session_token = await get_session_token(db, token)
+        if not session_token or session_token.expires_at < datetime.datetime.utcnow():
+            return None
+        user_id = session_token.user_id
+        expires_at = session_token.expires_at
+    return await get_user_by_id(db, user_id), expires_at
+
+# Sessions are checked on the primary, never a replica: a lagging replica could still return a session
+# that was logged out, and caching it would outlast the invalidation. Handlers reading from a replica
+# get the same primary session through get_read_db, so this adds no connection on a cache hit.
+async def get_current_user(token: str = Depends(get_token_from_cookie), db: AsyncSession = Depends(get_async_db)) -> User:
+    claims = None
+    if AUTH_MODE == "token":
+        claims = get_token_claims(token)
+        if not claims:
+            raise HTTPException(status_code=401, detail="Session expired or invalid")
+    cached_user = session_cache.get(token)
+    if cached_user:
+        return cached_user
+
+    session_user = await load_session_user(db, token, claims)
+    if not session_user:
         raise HTTPException(status_code=401, detail="Session expired or invalid")
-    user = db.query(User).filter(User.user_id == session_token.user_id).first()
+    user, expires_at = session_user
     if not user:
         raise HTTPException(status_code=401, detail="User not found for this session")
+    session_cache.put(token, user, expires_at)
     return user
 
-def admin_required(current_user: User = Depends(get_current_user)):
+# The id of the user a session token belongs to, or None when the token is not valid, for code that
+# runs before the dependencies do. Checked as get_current_user checks it, sharing the session cache.
+async def authenticate_token(token: str):
+    if AUTH_MODE == "token":
+        claims = get_token_claims(token)
+        return uuid.UUID(claims["sub"]) if claims else None
+    cached_user = session_cache.get(token)
+    if cached_user:
+        return cached_user.user_id
+    async with AsyncSessionLocal() as db:
+        session_user = await load_session_user(db, token, None)
+    if not session_user or not session_user[0]:
+        return None
+    user, expires_at = session_user
+    session_cache.put(token, user, expires_at)
+    return user.user_id
+
+async def admin_required(current_user: User = Depends(get_current_user)):
     if current_user.account_type != "superuser":
         raise HTTPException(status_code=403, detail="Not authorized as admin")
     return current_user
@@ -0,0 +1,34 @@
+import hashlib
+from fastapi import Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi_app.models import User
+
+# Strong ETags for per-user GET endpoints. users.data_version is bumped by triggers whenever the user
+# or any of their audio files change, so (version, URL) identifies the response body exactly.
+# The version is read before the data, so a concurrent change can only make an ETag older than its
+# body, never newer. Both must come from the same session: a replica lagging the primary would
+# otherwise pair one server's version with the other's rows.
+
+async def get_data_version(db: AsyncSession, user_id) -> int:
+    return await db.scalar(select(User.data_version).where(User.user_id == user_id))
+
+def make_etag(request: Request, user_id, data_version: int) -> str:
+    resource = f"{user_id}:{request.url.path}?{sorted(request.query_params.multi_items())}"
+    return f'"{data_version}-{hashlib.sha1(resource.encode()).hexdigest()[:16]}"'
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+# Returns a 304 response when the client's copy is current. Otherwise sets the ETag on `response`
+# and returns None, and the handler builds the body as usual.
+async def check_not_modified(request: Request, response: Response, db: AsyncSession, user_id):
+    etag = make_etag(request, user_id, await get_data_version(db, user_id))
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
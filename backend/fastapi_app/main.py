@@ -1,37 +1,91 @@
+import os, time, asyncio, secrets
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi_app.config import ALLOWED_ORIGINS
-from fastapi_app.database import engine, Base
-from fastapi_app.controllers import auth_controller, user_controller, admin_controller, file_controller
-from fastapi_app.seed import seed_users
-
-Base.metadata.create_all(bind=engine)
+from fastapi.responses import PlainTextResponse
+from fastapi_app.config import (
+    ALLOWED_ORIGINS, AUTH_MODE, UPLOAD_DIR, WEB_CONCURRENCY, ASYNC_REPLICA_DATABASE_URL,
+    METRICS_TOKEN, METRICS_QUEUE_DEPTH_REFRESH_SECONDS
+)
+from fastapi_app.controllers import auth_controller, user_controller, admin_controller, file_controller, presigned_upload_controller, resumable_controller
+from fastapi_app.services.resumable_service import run_cleanup_loop
+from fastapi_app.services.token_revocation import run_refresh_loop
+from fastapi_app.services import password_service, upload_queue, notifications, s3_service, deletion_service, audio_service
+from fastapi_app.services import session_cache, playback_cache, presigned_upload_service
+from fastapi_app.database import AsyncSessionLocal
+from fastapi_app import metrics, upload_admission, read_routing
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Seed the database when the app starts.
-    seed_users()
+    # Migrations and seeding run once per deploy (`python -m fastapi_app.manage setup`), not per worker,
+    # and the S3 client opens on first use, so startup only spawns the background tasks.
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    background_tasks = [asyncio.create_task(run_cleanup_loop())]
+    background_tasks.append(asyncio.create_task(presigned_upload_service.run_cleanup_loop()))
+    background_tasks += upload_queue.start_workers()
+    background_tasks.append(asyncio.create_task(deletion_service.run_recovery_loop()))
+    background_tasks.append(asyncio.create_task(notifications.run_listener()))
+    if AUTH_MODE == "token":
+        background_tasks.append(asyncio.create_task(run_refresh_loop()))
     yield
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    await deletion_service.shutdown()
+    await s3_service.close_s3_client()
+    password_service.shutdown()
+    audio_service.shutdown_analysis_executor()
 
 app = FastAPI(lifespan=lifespan)
 
+# Only needed when reads can go to a replica; see read_routing.py.
+if ASYNC_REPLICA_DATABASE_URL:
+    app.add_middleware(read_routing.ReadYourWritesMiddleware)
+# Inside CORS, so refused uploads still carry CORS headers and the browser can read why.
+app.add_middleware(upload_admission.UploadAdmissionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=ALLOWED_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Link", "ETag", "Retry-After"],
 )
+# Added last so it is outermost and times the whole request, CORS included.
+app.add_middleware(metrics.MetricsMiddleware)
 
 # Routers from controllers.
 app.include_router(auth_controller.router, prefix="/auth")
 app.include_router(user_controller.router, prefix="/users")
 app.include_router(admin_controller.router, prefix="/admin")
 app.include_router(file_controller.router, prefix="/files")
+app.include_router(presigned_upload_controller.router, prefix="/files/presigned-upload")
+app.include_router(resumable_controller.router, prefix="/files/resumable")
+
+# Monotonic time after which the next scrape recounts the upload queue.
+_queue_depth_refresh_after = [0.0]
+
+# Prometheus scrape endpoint. Values are per process; see metrics.py.
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(request: Request):
+    if METRICS_TOKEN:
+        authorized = secrets.compare_digest(request.headers.get("authorization", ""), f"Bearer {METRICS_TOKEN}")
+    else:
+        authorized = request.client is not None and request.client.host in ("127.0.0.1", "::1")
+    if not authorized:
+        raise HTTPException(status_code=403, detail="Not authorized to read metrics")
+    if time.monotonic() >= _queue_depth_refresh_after[0]:
+        _queue_depth_refresh_after[0] = time.monotonic() + METRICS_QUEUE_DEPTH_REFRESH_SECONDS
+        async with AsyncSessionLocal() as db:
+            metrics.upload_queue_depth.set(value=await upload_queue.get_queue_depth(db))
+    for event, count in session_cache.stats.items():
+        metrics.session_cache_events.set(event, value=count)
+    for event, count in playback_cache.stats.items():
+        metrics.playback_cache_events.set(event, value=count)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
     import sys
     print(sys.path)
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8080)
+    uvicorn.run("fastapi_app.main:app", host="0.0.0.0", port=8080, workers=WEB_CONCURRENCY)
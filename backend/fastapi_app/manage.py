@@ -0,0 +1,29 @@
+# fastapi_app/manage.py
+# One-shot commands run once per deploy, before the web workers start:
+#   python -m fastapi_app.manage setup      apply migrations, then seed
+#   python -m fastapi_app.manage migrate
+#   python -m fastapi_app.manage seed
+import sys, argparse
+from fastapi_app.migrate import run_migrations
+from fastapi_app.seed import seed_users
+
+COMMANDS = {
+    "migrate": [run_migrations],
+    "seed": [seed_users],
+    "setup": [run_migrations, seed_users],
+}
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m fastapi_app.manage")
+    parser.add_argument("command", choices=COMMANDS)
+    args = parser.parse_args(argv)
+    try:
+        for step in COMMANDS[args.command]:
+            step()
+    except Exception as e:
+        print(f"Error running {args.command}:", e, file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+import time, threading, contextvars
+from sqlalchemy import event
+from fastapi_app.database import engine, async_engine, replica_engine
+
+# In-process metrics rendered in the Prometheus text format by GET /metrics. Each worker process keeps
+# its own values, so scrape every worker (or aggregate by instance) when running several.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+DURATION_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+_lock = threading.Lock()
+_metrics = []
+
+# Label values escaped as the text format requires: backslash, double quote and newline.
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name, self.documentation, self.labels = name, documentation, labels
+        self.values = {}
+        _metrics.append(self)
+
+    def inc(self, *label_values, amount: float = 1):
+        with _lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def samples(self):
+        return [(self.name, _format_labels(self.labels, key), value) for key, value in self.values.items()]
+
+# Gauges are set when they change or, for values owned elsewhere, just before each scrape.
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name, self.documentation, self.labels = name, documentation, labels
+        self.values = {}
+        _metrics.append(self)
+
+    def set(self, *label_values, value: float):
+        with _lock:
+            self.values[label_values] = value
+
+    def samples(self):
+        return [(self.name, _format_labels(self.labels, key), value) for key, value in self.values.items()]
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.documentation, self.labels, self.buckets = name, documentation, labels, buckets
+        self.values = {}  # label values -> [bucket counts..., sum, count]
+        _metrics.append(self)
+
+    def observe(self, *label_values, value: float):
+        with _lock:
+            state = self.values.get(label_values)
+            if state is None:
+                state = self.values[label_values] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def samples(self):
+        samples = []
+        for key, state in self.values.items():
+            for bound, count in zip(self.buckets, state):
+                samples.append((f"{self.name}_bucket", _format_labels(self.labels, key, f'le="{bound}"'), count))
+            samples.append((f"{self.name}_bucket", _format_labels(self.labels, key, 'le="+Inf"'), state[-1]))
+            samples.append((f"{self.name}_sum", _format_labels(self.labels, key), state[-2]))
+            samples.append((f"{self.name}_count", _format_labels(self.labels, key), state[-1]))
+        return samples
+
+def render() -> str:
+    lines = []
+    with _lock:
+        for metric in _metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {value}")
+    return "\n".join(lines) + "\n"
+
+http_requests = Counter("http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+http_request_duration = Histogram("http_request_duration_seconds", "HTTP request latency.", ("method", "route"))
+http_request_queries = Histogram("http_request_db_queries", "SQL statements run per HTTP request.", ("method", "route"), COUNT_BUCKETS)
+http_request_db_duration = Histogram("http_request_db_seconds", "Time spent in SQL per HTTP request.", ("method", "route"))
+db_query_duration = Histogram("db_query_duration_seconds", "SQL statement latency.", ("engine",))
+s3_request_duration = Histogram("s3_request_duration_seconds", "S3 call latency, including presigning.", ("operation", "outcome"))
+s3_bytes = Counter("s3_bytes_sent_total", "Bytes sent to S3 in upload calls.", ("operation",))
+s3_deleted_objects = Counter("s3_deleted_objects_total", "Objects S3 reported deleted.")
+upload_duration = Histogram("upload_duration_seconds", "Time from upload record creation to its final status.", ("outcome",), DURATION_BUCKETS)
+upload_job_failures = Counter("upload_job_failures_total", "Failed upload job attempts.", ("final",))
+upload_admission_rejections = Counter("upload_admission_rejections_total", "Uploads refused before their body was read.", ("reason",))
+uploads_in_flight = Gauge("uploads_in_flight", "Upload request bodies being received by this process.")
+upload_bytes_in_flight = Gauge("upload_bytes_in_flight", "Declared bytes of upload request bodies being received by this process.")
+upload_queue_depth = Gauge("upload_queue_depth", "Upload jobs waiting to be claimed, across all nodes.")
+session_cache_events = Gauge("session_cache_events", "Session cache hits, misses, evictions and invalidations.", ("event",))
+playback_cache_events = Gauge("playback_cache_events", "Playback URL cache hits, misses, evictions and invalidations.", ("event",))
+replica_fallbacks = Counter("db_replica_fallbacks_total", "Reads repeated on the primary because the replica did not have the row yet.", ("query",))
+
+# SQL statements run by the current HTTP request, collected by the engine events below.
+_request_queries = contextvars.ContextVar("request_queries", default=None)
+
+# Start times are kept per connection with the statement's execution context, so a statement that
+# fails (and gets handle_error instead of after_cursor_execute) cannot leave one behind.
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append((context, time.perf_counter()))
+
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    starts = connection.info.get("query_start_time") if connection is not None else None
+    if starts and starts[-1][0] is exception_context.execution_context:
+        starts.pop()
+
+def _after_cursor_execute(engine_label: str):
+    def record(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start_time"].pop()[1]
+        db_query_duration.observe(engine_label, value=elapsed)
+        queries = _request_queries.get()
+        if queries is not None:
+            queries[0] += 1
+            queries[1] += elapsed
+    return record
+
+_engines = [(engine, "sync"), (async_engine.sync_engine, "async")]
+if replica_engine is not async_engine:
+    _engines.append((replica_engine.sync_engine, "replica"))
+for _engine, _label in _engines:
+    event.listen(_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(_engine, "after_cursor_execute", _after_cursor_execute(_label))
+    event.listen(_engine, "handle_error", _handle_error)
+
+# ASGI middleware timing each HTTP request under its route template, e.g. /files/{file_id}/playback.
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        queries = [0, 0.0]
+        token = _request_queries.set(queries)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_queries.reset(token)
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope["method"]
+            http_requests.inc(method, route, status["code"])
+            http_request_duration.observe(method, route, value=elapsed)
+            http_request_queries.observe(method, route, value=queries[0])
+            http_request_db_duration.observe(method, route, value=queries[1])
+
+# Time S3 calls made through the shared client. botocore emits before-call/after-call around every
+# API request; presigning makes no request, so generate_presigned_url is wrapped instead.
+def instrument_s3_client(s3_client):
+    def before_call(model, params, context, **kwargs):
+        context["metrics_start_time"] = time.perf_counter()
+        # botocore has already wrapped bytes bodies in a file object by this point.
+        body = params.get("body")
+        size = len(body) if isinstance(body, (bytes, bytearray)) else 0
+        if hasattr(body, "getbuffer"):
+            size = body.getbuffer().nbytes - body.tell()
+        if size:
+            s3_bytes.inc(model.name, amount=size)
+
+    def after_call(http_response, parsed, model, context, **kwargs):
+        start = context.get("metrics_start_time")
+        if start is not None:
+            outcome = "error" if parsed.get("Error") else "ok"
+            s3_request_duration.observe(model.name, outcome, value=time.perf_counter() - start)
+        if model.name == "DeleteObjects":
+            s3_deleted_objects.inc(amount=len(parsed.get("Deleted", [])))
+        elif model.name == "DeleteObject" and not parsed.get("Error"):
+            s3_deleted_objects.inc()
+
+    def after_call_error(model, context, **kwargs):
+        start = context.get("metrics_start_time")
+        if start is not None:
+            s3_request_duration.observe(model.name, "error", value=time.perf_counter() - start)
+
+    s3_client.meta.events.register("before-call.s3", before_call)
+    s3_client.meta.events.register("after-call.s3", after_call)
+    s3_client.meta.events.register("after-call-error.s3", after_call_error)
+
+    generate_presigned_url = s3_client.generate_presigned_url
+
+    async def timed_generate_presigned_url(client_method, *args, **kwargs):
+        start, outcome = time.perf_counter(), "error"
+        try:
+            url = await generate_presigned_url(client_method, *args, **kwargs)
+            outcome = "ok"
+            return url
+        finally:
+            s3_request_duration.observe(f"presign_{client_method}", outcome, value=time.perf_counter() - start)
+
+    s3_client.generate_presigned_url = timed_generate_presigned_url
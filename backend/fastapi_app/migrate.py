@@ -0,0 +1,67 @@
+# fastapi_app/migrate.py
+# Versioned schema migrations: migrations/NNNN_name.sql files applied in order and recorded in
+# schema_migrations. Files starting with "-- migrate:no-transaction" run statement by statement
+# outside a transaction, which CREATE INDEX CONCURRENTLY requires.
+import os, re, sys
+from sqlalchemy import text
+from fastapi_app.database import engine
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), "migrations")
+NO_TRANSACTION_MARKER = "-- migrate:no-transaction"
+# Key for the advisory lock that stops several workers from migrating at once.
+MIGRATION_LOCK_ID = 48151623
+
+def load_migrations() -> list:
+    migrations = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        match = re.fullmatch(r"(\d+)_(\w+)\.sql", filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(MIGRATIONS_DIR, filename)))
+    return sorted(migrations)
+
+def split_statements(sql: str) -> list:
+    statements = []
+    for statement in re.split(r";\s*$", sql, flags=re.MULTILINE):
+        code = "\n".join(line for line in statement.splitlines() if not line.strip().startswith("--"))
+        if code.strip():
+            statements.append(code.strip())
+    return statements
+
+def run_migrations() -> list:
+    applied_now = []
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        conn.execute(text("SELECT pg_advisory_lock(:lock_id)"), {"lock_id": MIGRATION_LOCK_ID})
+        try:
+            conn.exec_driver_sql(
+                "CREATE TABLE IF NOT EXISTS schema_migrations ("
+                "version INTEGER PRIMARY KEY, name TEXT NOT NULL, applied_at TIMESTAMP DEFAULT NOW())"
+            )
+            applied = {row[0] for row in conn.exec_driver_sql("SELECT version FROM schema_migrations")}
+            for version, name, path in load_migrations():
+                if version in applied:
+                    continue
+                with open(path) as f:
+                    sql = f.read()
+                record = text("INSERT INTO schema_migrations (version, name) VALUES (:version, :name)")
+                if sql.startswith(NO_TRANSACTION_MARKER):
+                    # Every statement must be idempotent, since a failure part way leaves earlier ones applied.
+                    for statement in split_statements(sql):
+                        conn.exec_driver_sql(statement)
+                    conn.execute(record, {"version": version, "name": name})
+                else:
+                    with engine.begin() as tx:
+                        tx.exec_driver_sql(sql)
+                        tx.execute(record, {"version": version, "name": name})
+                print(f"Applied migration {version:04d}_{name}.")
+                applied_now.append(version)
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:lock_id)"), {"lock_id": MIGRATION_LOCK_ID})
+    return applied_now
+
+if __name__ == "__main__":
+    try:
+        run_migrations()
+    except Exception as e:
+        print("Error applying migrations:", e, file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,31 @@
+-- Columns and tables added for multipart, resumable and queued uploads and for token revocation.
+ALTER TABLE audio_files ADD COLUMN IF NOT EXISTS file_size BIGINT DEFAULT NULL;
+ALTER TABLE audio_files ADD COLUMN IF NOT EXISTS s3_upload_id TEXT DEFAULT NULL;
+ALTER TABLE audio_files ADD COLUMN IF NOT EXISTS upload_offset BIGINT DEFAULT NULL;
+ALTER TABLE audio_files ADD COLUMN IF NOT EXISTS upload_expires_at TIMESTAMP DEFAULT NULL;
+
+CREATE TABLE IF NOT EXISTS token_revocations (
+    revocation_id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    jti TEXT DEFAULT NULL,
+    user_id UUID DEFAULT NULL,
+    revoked_before TIMESTAMP DEFAULT NULL,
+    created_at TIMESTAMP DEFAULT NOW(),
+    expires_at TIMESTAMP NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS upload_jobs (
+    job_id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    file_id UUID NOT NULL REFERENCES audio_files(file_id) ON DELETE CASCADE,
+    file_location TEXT NOT NULL,
+    file_key TEXT NOT NULL,
+    hostname VARCHAR(255) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    run_after TIMESTAMP NOT NULL DEFAULT (NOW() AT TIME ZONE 'utc'),
+    locked_at TIMESTAMP DEFAULT NULL,
+    s3_upload_id TEXT DEFAULT NULL,
+    last_error TEXT DEFAULT NULL,
+    created_at TIMESTAMP DEFAULT NOW(),
+    CHECK (status IN ('queued', 'processing', 'done', 'failed'))
+);
@@ -0,0 +1,30 @@
+-- migrate:no-transaction
+-- Built CONCURRENTLY so existing deployments keep serving reads and writes while they are created.
+-- An interrupted build leaves an INVALID index behind; drop it and rerun the migration.
+
+-- Duplicate checks only consider completed uploads. Descriptions are unbounded text, so that
+-- lookup indexes md5(description) to stay under the btree row size limit.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_audio_files_user_checksum_completed
+    ON audio_files (user_id, checksum) WHERE upload_status = 'completed';
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_audio_files_user_description_completed
+    ON audio_files (user_id, md5(description)) WHERE upload_status = 'completed';
+
+-- GET /files filters by owner; the trailing columns give a stable order for paging.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_audio_files_user_uploaded
+    ON audio_files (user_id, upload_timestamp, file_id);
+
+-- Resumable upload cleanup.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_audio_files_uploading_expires
+    ON audio_files (upload_expires_at) WHERE upload_status = 'uploading';
+
+-- Session lookup on every authenticated request.
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ux_sessions_token ON sessions (token);
+
+-- Upload queue claims and lease recovery.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_upload_jobs_queued
+    ON upload_jobs (hostname, run_after) WHERE status = 'queued';
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_upload_jobs_processing
+    ON upload_jobs (hostname, locked_at) WHERE status = 'processing';
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_upload_jobs_file_id ON upload_jobs (file_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_token_revocations_expires_at ON token_revocations (expires_at);
@@ -0,0 +1,5 @@
+-- migrate:no-transaction
+-- Keyset pagination for GET /files filtered by category and for GET /admin/users.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_audio_files_user_category_uploaded
+    ON audio_files (user_id, category, upload_timestamp, file_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_created ON users (created_at, user_id);
@@ -0,0 +1,5 @@
+-- Full-text and trigram search over descriptions. Adding the stored column rewrites audio_files once.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE audio_files ADD COLUMN IF NOT EXISTS description_tsv tsvector
+    GENERATED ALWAYS AS (to_tsvector('english'::regconfig, description)) STORED;
@@ -0,0 +1,5 @@
+-- migrate:no-transaction
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_audio_files_description_tsv
+    ON audio_files USING gin (description_tsv);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_audio_files_description_trgm
+    ON audio_files USING gin (description gin_trgm_ops);
@@ -0,0 +1,17 @@
+-- Tracked S3 cleanup for deleted users and files.
+CREATE TABLE IF NOT EXISTS delete_operations (
+    operation_id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    requested_by UUID DEFAULT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    keys TEXT[] NOT NULL,
+    total_keys INTEGER NOT NULL,
+    deleted_keys INTEGER NOT NULL DEFAULT 0,
+    failed_keys JSONB NOT NULL DEFAULT '[]'::jsonb,
+    created_at TIMESTAMP DEFAULT NOW(),
+    updated_at TIMESTAMP NOT NULL DEFAULT (NOW() AT TIME ZONE 'utc'),
+    finished_at TIMESTAMP DEFAULT NULL,
+    CHECK (status IN ('queued', 'running', 'completed', 'completed_with_errors'))
+);
+
+CREATE INDEX IF NOT EXISTS ix_delete_operations_unfinished
+    ON delete_operations (updated_at) WHERE status IN ('queued', 'running');
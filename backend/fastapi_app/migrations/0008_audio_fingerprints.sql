@@ -0,0 +1,12 @@
+-- Landmark hashes for near-duplicate detection. Lookups probe (user_id, hash) for each hash of a
+-- new upload, so the cost follows the number of matching hashes rather than the size of the library.
+CREATE TABLE IF NOT EXISTS audio_fingerprints (
+    file_id UUID NOT NULL REFERENCES audio_files(file_id) ON DELETE CASCADE,
+    user_id UUID NOT NULL,
+    hash INTEGER NOT NULL,
+    frame_offset INTEGER NOT NULL,
+    PRIMARY KEY (file_id, hash, frame_offset)
+);
+
+CREATE INDEX IF NOT EXISTS ix_audio_fingerprints_user_hash
+    ON audio_fingerprints (user_id, hash) INCLUDE (file_id, frame_offset);
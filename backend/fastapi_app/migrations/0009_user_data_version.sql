@@ -0,0 +1,41 @@
+-- Per-user version counter behind the ETags of GET /files, GET /files/upload-status and GET /auth/me.
+-- Any change to a user's row or to their audio_files rows bumps it.
+ALTER TABLE users ADD COLUMN IF NOT EXISTS data_version BIGINT NOT NULL DEFAULT 0;
+
+-- Statement-level, so a bulk insert or delete bumps each affected user once.
+CREATE OR REPLACE FUNCTION bump_user_data_version() RETURNS trigger AS $$
+BEGIN
+    UPDATE users SET data_version = data_version + 1
+    WHERE user_id IN (SELECT DISTINCT user_id FROM changed_rows);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS audio_files_insert_data_version ON audio_files;
+CREATE TRIGGER audio_files_insert_data_version AFTER INSERT ON audio_files
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_user_data_version();
+
+DROP TRIGGER IF EXISTS audio_files_update_data_version ON audio_files;
+CREATE TRIGGER audio_files_update_data_version AFTER UPDATE ON audio_files
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_user_data_version();
+
+DROP TRIGGER IF EXISTS audio_files_delete_data_version ON audio_files;
+CREATE TRIGGER audio_files_delete_data_version AFTER DELETE ON audio_files
+    REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_user_data_version();
+
+-- Direct changes to a user row bump its own version, unless the update already did.
+CREATE OR REPLACE FUNCTION bump_own_data_version() RETURNS trigger AS $$
+BEGIN
+    IF NEW.data_version = OLD.data_version THEN
+        NEW.data_version := OLD.data_version + 1;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS users_data_version ON users;
+CREATE TRIGGER users_data_version BEFORE UPDATE ON users
+    FOR EACH ROW WHEN (OLD.* IS DISTINCT FROM NEW.*) EXECUTE FUNCTION bump_own_data_version();
@@ -0,0 +1,3 @@
+-- Lease held by the PATCH appending to a resumable upload, so only one request in any process
+-- writes to its partial file at a time. Renewed while the body streams in; NULL when idle.
+ALTER TABLE audio_files ADD COLUMN IF NOT EXISTS receiving_until TIMESTAMP DEFAULT NULL;
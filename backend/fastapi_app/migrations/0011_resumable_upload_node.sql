@@ -0,0 +1,3 @@
+-- Node whose UPLOAD_DIR holds a resumable upload's partial file. Only that node may append to it,
+-- terminate it or clean it up. NULL for uploads created before this column existed.
+ALTER TABLE audio_files ADD COLUMN IF NOT EXISTS upload_node VARCHAR(255) DEFAULT NULL;
@@ -0,0 +1,9 @@
+-- Analysis jobs for uploads that went straight to S3 (streaming mode, presigned uploads). They read
+-- the object back to fingerprint it, extract its metadata and, when the client declared one,
+-- verify its checksum. Any node can run them, as nothing is held on local disk in between.
+ALTER TABLE upload_jobs ADD COLUMN IF NOT EXISTS kind VARCHAR(20) NOT NULL DEFAULT 'upload'
+    CHECK (kind IN ('upload', 'analyze'));
+ALTER TABLE upload_jobs ADD COLUMN IF NOT EXISTS expected_checksum TEXT DEFAULT NULL;
+
+CREATE INDEX IF NOT EXISTS ix_upload_jobs_queued_analyze ON upload_jobs (run_after)
+    WHERE status = 'queued' AND kind = 'analyze';
@@ -0,0 +1,7 @@
+-- migrate:no-transaction
+-- Presigned uploads now expire like resumable ones. Those already pending get a day from their start.
+UPDATE audio_files SET upload_expires_at = upload_timestamp + INTERVAL '1 day'
+    WHERE s3_upload_id IS NOT NULL AND upload_expires_at IS NULL;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_audio_files_presigned_expires ON audio_files (upload_expires_at)
+    WHERE s3_upload_id IS NOT NULL;
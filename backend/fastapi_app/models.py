@@ -1,7 +1,7 @@
-import uuid, enum
-from sqlalchemy import Column, String, DateTime, ForeignKey, Enum, Text, func
-from sqlalchemy.dialects.postgresql import UUID, JSONB, ARRAY
-from sqlalchemy.orm import relationship
+import uuid, enum, datetime
+from sqlalchemy import Column, String, DateTime, ForeignKey, Enum, Text, BigInteger, Integer, Index, Computed, func
+from sqlalchemy.dialects.postgresql import UUID, JSONB, ARRAY, TSVECTOR
+from sqlalchemy.orm import relationship, deferred
 from fastapi_app.database import Base
 
 # Enum definitions
@@ -23,12 +23,15 @@ class User(Base):
     account_type = Column(String(20), nullable=False, default="regular")
     created_at = Column(DateTime, default=func.now())
     last_logged_in = Column(DateTime, nullable=True)
-    audio_files = relationship("AudioFile", back_populates="user", cascade="all, delete-orphan")
+    data_version = Column(BigInteger, nullable=False, default=0)  # Bumped by DB triggers; see fastapi_app/etags.py
+    audio_files = relationship("AudioFile", back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
+
+Index("ix_users_created", User.created_at, User.user_id)
 
 class AudioFile(Base):
     __tablename__ = "audio_files"
     file_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.user_id"), nullable=False)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False)
     description = Column(Text, nullable=False)
     category = Column(Enum(
         AudioCategoryEnum, 
@@ -41,12 +44,104 @@ class AudioFile(Base):
     ai_processing_types = Column(ARRAY(String), default=None)
     checksum = Column(String, nullable=True)
     upload_status = Column(String, nullable=False, default="processing")
+    file_size = Column(BigInteger, nullable=True)
+    s3_upload_id = Column(Text, nullable=True)  # Set while a client-side multipart upload is in progress
+    upload_offset = Column(BigInteger, nullable=True)  # Bytes received so far for resumable uploads
+    upload_expires_at = Column(DateTime, nullable=True)
+    receiving_until = Column(DateTime, nullable=True)  # Lease of the PATCH appending to a resumable upload
+    upload_node = Column(String(255), nullable=True)  # Node holding a resumable upload's partial file
+    # Search vector maintained by Postgres; deferred so ordinary loads do not fetch it.
+    description_tsv = deferred(Column(TSVECTOR, Computed("to_tsvector('english'::regconfig, description)", persisted=True)))
     user = relationship("User", back_populates="audio_files")
 
+# Lookup indexes, created by the migrations in fastapi_app/migrations.
+Index("ix_audio_files_user_checksum_completed", AudioFile.user_id, AudioFile.checksum,
+      postgresql_where=AudioFile.upload_status == "completed")
+Index("ix_audio_files_user_description_completed", AudioFile.user_id, func.md5(AudioFile.description),
+      postgresql_where=AudioFile.upload_status == "completed")
+Index("ix_audio_files_user_uploaded", AudioFile.user_id, AudioFile.upload_timestamp, AudioFile.file_id)
+Index("ix_audio_files_user_category_uploaded", AudioFile.user_id, AudioFile.category, AudioFile.upload_timestamp, AudioFile.file_id)
+Index("ix_audio_files_description_tsv", AudioFile.description_tsv, postgresql_using="gin")
+Index("ix_audio_files_description_trgm", AudioFile.description, postgresql_using="gin",
+      postgresql_ops={"description": "gin_trgm_ops"})
+Index("ix_audio_files_uploading_expires", AudioFile.upload_expires_at,
+      postgresql_where=AudioFile.upload_status == "uploading")
+Index("ix_audio_files_presigned_expires", AudioFile.upload_expires_at,
+      postgresql_where=AudioFile.s3_upload_id.isnot(None))
+
+# Landmark hashes of an upload's audio (see fastapi_app/audio_fingerprint.py), used to find
+# re-encoded or trimmed copies. user_id is repeated here so lookups stay within one library.
+class AudioFingerprint(Base):
+    __tablename__ = "audio_fingerprints"
+    file_id = Column(UUID(as_uuid=True), ForeignKey("audio_files.file_id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(UUID(as_uuid=True), nullable=False)
+    hash = Column(Integer, primary_key=True)
+    frame_offset = Column(Integer, primary_key=True)
+
+Index("ix_audio_fingerprints_user_hash", AudioFingerprint.user_id, AudioFingerprint.hash,
+      postgresql_include=["file_id", "frame_offset"])
+
+# Durable queue of S3 uploads, claimed by workers with SELECT ... FOR UPDATE SKIP LOCKED.
+# "upload" jobs send a temp file to S3 from the node holding it; "analyze" jobs read back an object
+# the client or the request already stored in S3, on any node.
+class UploadJob(Base):
+    __tablename__ = "upload_jobs"
+    job_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    file_id = Column(UUID(as_uuid=True), ForeignKey("audio_files.file_id", ondelete="CASCADE"), nullable=False)
+    kind = Column(String(20), nullable=False, default="upload")  # upload, analyze
+    file_location = Column(Text, nullable=False)
+    file_key = Column(Text, nullable=False)
+    hostname = Column(String(255), nullable=False)  # UPLOAD_NODE_ID of the node holding the temp file
+    expected_checksum = Column(Text, nullable=True)  # MD5 an analyze job verifies, declared by the client
+    status = Column(String(20), nullable=False, default="queued")  # queued, processing, done, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False)
+    run_after = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+    locked_at = Column(DateTime, nullable=True)
+    s3_upload_id = Column(Text, nullable=True)  # Multipart upload resumed by the next attempt
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=func.now())
+
+Index("ix_upload_jobs_queued", UploadJob.hostname, UploadJob.run_after, postgresql_where=UploadJob.status == "queued")
+Index("ix_upload_jobs_queued_analyze", UploadJob.run_after,
+      postgresql_where=(UploadJob.status == "queued") & (UploadJob.kind == "analyze"))
+Index("ix_upload_jobs_processing", UploadJob.hostname, UploadJob.locked_at, postgresql_where=UploadJob.status == "processing")
+Index("ix_upload_jobs_file_id", UploadJob.file_id)
+
+# S3 cleanup for deleted users and files. The DB rows are removed up front; the keys are kept here so
+# the S3 side can run in the background, be polled, and be rerun if the process handling it dies.
+class DeleteOperation(Base):
+    __tablename__ = "delete_operations"
+    operation_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    requested_by = Column(UUID(as_uuid=True), nullable=True)
+    status = Column(String(20), nullable=False, default="queued")  # queued, running, completed, completed_with_errors
+    keys = Column(ARRAY(Text), nullable=False)
+    total_keys = Column(Integer, nullable=False)
+    deleted_keys = Column(Integer, nullable=False, default=0)
+    failed_keys = Column(JSONB, nullable=False, default=list)  # [{"key", "code", "message"}]
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)  # Heartbeat while running
+    finished_at = Column(DateTime, nullable=True)
+
+Index("ix_delete_operations_unfinished", DeleteOperation.updated_at,
+      postgresql_where=DeleteOperation.status.in_(["queued", "running"]))
+
+# Revoked signed tokens, either one token by jti or every token a user was issued before revoked_before.
+class TokenRevocation(Base):
+    __tablename__ = "token_revocations"
+    revocation_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    jti = Column(Text, nullable=True)
+    user_id = Column(UUID(as_uuid=True), nullable=True)
+    revoked_before = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=func.now())
+    expires_at = Column(DateTime, nullable=False, index=True)  # Safe to purge once every affected token has expired
+
 class SessionToken(Base):
     __tablename__ = "sessions"
     session_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.user_id"), nullable=False)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False)
     token = Column(Text, nullable=False)
     created_at = Column(DateTime, default=func.now())
     expires_at = Column(DateTime, nullable=False)
+
+Index("ux_sessions_token", SessionToken.token, unique=True)
@@ -0,0 +1,46 @@
+# fastapi_app/pagination.py
+# Keyset pagination helpers. A cursor is the sort key of the last row on the previous page,
+# so each page is one index range scan however deep the client pages.
+import base64, binascii, datetime, enum, json, uuid
+from fastapi import HTTPException, Request, Response
+from sqlalchemy import tuple_
+
+class SortOrder(str, enum.Enum):
+    asc = "asc"
+    desc = "desc"
+
+# The sort key is a timestamp for listings and a float relevance score for search results.
+def encode_cursor(sort_value, row_id: uuid.UUID) -> str:
+    if isinstance(sort_value, datetime.datetime):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, str(row_id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort_type=datetime.datetime):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_value, row_id = json.loads(raw)
+        if sort_type is datetime.datetime:
+            sort_value = datetime.datetime.fromisoformat(sort_value)
+        elif not isinstance(sort_value, (int, float)):
+            raise ValueError("Cursor sort value is not a number")
+        return sort_value, uuid.UUID(row_id)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+# Rows strictly after the cursor in the given order, as a row comparison that matches the index.
+def after_cursor(sort_column, id_column, cursor, order: SortOrder):
+    key = tuple_(sort_column, id_column)
+    if order == SortOrder.desc:
+        return key < tuple_(*cursor)
+    return key > tuple_(*cursor)
+
+def order_by(sort_column, id_column, order: SortOrder):
+    if order == SortOrder.desc:
+        return (sort_column.desc(), id_column.desc())
+    return (sort_column.asc(), id_column.asc())
+
+# Pages are returned as plain lists; the next cursor travels in headers.
+def set_next_page(request: Request, response: Response, cursor: str):
+    response.headers["X-Next-Cursor"] = cursor
+    response.headers["Link"] = f'<{request.url.include_query_params(cursor=cursor)}>; rel="next"'
@@ -0,0 +1,57 @@
+import re
+from starlette.datastructures import MutableHeaders
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi_app.config import REPLICA_STICKY_SECONDS
+from fastapi_app.database import READ_PRIMARY_COOKIE, AsyncSessionLocal, is_replica
+from fastapi_app import metrics
+
+# Read-your-writes for replica routing. Read-only handlers take their session from database.get_read_db,
+# which uses the replica unless the request carries READ_PRIMARY_COOKIE. This middleware sets that cookie
+# on every successful write, so for REPLICA_STICKY_SECONDS afterwards the client reads from the primary:
+# a file listing right after an upload includes the upload, and a status poll finds the new record.
+# Being a cookie, it holds whichever worker or node serves the next request.
+#
+# Handlers that look up a row the client may have just created (/auth/me, upload and delete status)
+# also retry on the primary when the replica has no such row, see read_with_fallback. Sessions are
+# always checked on the primary, see dependencies.get_current_user.
+
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# POSTs that only read, so do not pin the client to the primary.
+READ_ONLY_ROUTES = [
+    ("POST", re.compile(r"/files/playback/?")),
+]
+
+def is_write(scope) -> bool:
+    if scope["method"] in SAFE_METHODS:
+        return False
+    return not any(scope["method"] == method and path.fullmatch(scope["path"]) for method, path in READ_ONLY_ROUTES)
+
+class ReadYourWritesMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not is_write(scope):
+            return await self.app(scope, receive, send)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                MutableHeaders(scope=message).append(
+                    "set-cookie",
+                    f"{READ_PRIMARY_COOKIE}=1; Max-Age={REPLICA_STICKY_SECONDS}; Path=/; HttpOnly; Secure; SameSite=lax"
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+# Runs `read(db)`, and when `db` is a replica session that found nothing, runs it again on the primary:
+# the client may be asking for a row it created moments ago that has not replicated yet. `read` takes
+# everything it returns from the session it is given, so that an ETag and its body come from one server.
+async def read_with_fallback(db: AsyncSession, read, query: str):
+    result = await read(db)
+    if not result and is_replica(db):
+        metrics.replica_fallbacks.inc(query)
+        async with AsyncSessionLocal() as primary_db:
+            result = await read(primary_db)
+    return result
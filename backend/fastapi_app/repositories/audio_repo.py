@@ -1,23 +1,67 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select, func, literal, literal_column, or_
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi_app.models import AudioFile
+from fastapi_app.config import SEARCH_SIMILARITY_THRESHOLD
+from fastapi_app.pagination import SortOrder, after_cursor, order_by
 
-def get_audio_file(db: Session, file_id, user_id):
-    return db.query(AudioFile).filter(AudioFile.file_id == file_id, AudioFile.user_id == user_id).first()
+# Must match the configuration of the generated audio_files.description_tsv column.
+SEARCH_TEXT_CONFIG = literal_column("'english'::regconfig")
 
-def get_audio_files_by_user(db: Session, user_id):
-    return db.query(AudioFile).filter(AudioFile.user_id == user_id).all()
+async def get_audio_file(db: AsyncSession, file_id, user_id):
+    result = await db.execute(select(AudioFile).where(AudioFile.file_id == file_id, AudioFile.user_id == user_id))
+    return result.scalars().first()
 
-def create_audio_file(db: Session, audio_file: AudioFile):
+async def get_audio_files_by_ids(db: AsyncSession, file_ids, user_id):
+    result = await db.execute(select(AudioFile).where(AudioFile.file_id.in_(file_ids), AudioFile.user_id == user_id))
+    return result.scalars().all()
+
+async def get_audio_files_by_user(db: AsyncSession, user_id, limit: int, cursor=None, category=None, upload_status=None, order=SortOrder.desc):
+    query = select(AudioFile).where(AudioFile.user_id == user_id)
+    if category:
+        query = query.where(AudioFile.category == category)
+    if upload_status:
+        query = query.where(AudioFile.upload_status == upload_status)
+    if cursor:
+        query = query.where(after_cursor(AudioFile.upload_timestamp, AudioFile.file_id, cursor, order))
+    query = query.order_by(*order_by(AudioFile.upload_timestamp, AudioFile.file_id, order)).limit(limit)
+    result = await db.execute(query)
+    return result.scalars().all()
+
+# Matches on the full-text index or on trigram word similarity, so typos and partial words still hit.
+# Rows are ranked by text rank plus similarity and paged on (rank, file_id).
+async def search_audio_files_by_user(db: AsyncSession, user_id, query_text: str, limit: int, cursor=None, category=None, upload_status=None):
+    # The <% operator reads its threshold from this setting; scope it to the current transaction.
+    await db.execute(select(func.set_config("pg_trgm.word_similarity_threshold", str(SEARCH_SIMILARITY_THRESHOLD), True)))
+    ts_query = func.websearch_to_tsquery(SEARCH_TEXT_CONFIG, query_text)
+    rank = func.ts_rank_cd(AudioFile.description_tsv, ts_query) + func.word_similarity(query_text, AudioFile.description)
+    query = select(AudioFile, rank.label("rank")).where(
+        AudioFile.user_id == user_id,
+        or_(
+            AudioFile.description_tsv.op("@@")(ts_query),
+            literal(query_text).op("<%")(AudioFile.description)
+        )
+    )
+    if category:
+        query = query.where(AudioFile.category == category)
+    if upload_status:
+        query = query.where(AudioFile.upload_status == upload_status)
+    if cursor:
+        query = query.where(after_cursor(rank, AudioFile.file_id, cursor, SortOrder.desc))
+    query = query.order_by(*order_by(rank, AudioFile.file_id, SortOrder.desc)).limit(limit)
+    result = await db.execute(query)
+    return result.all()
+
+async def create_audio_file(db: AsyncSession, audio_file: AudioFile):
     db.add(audio_file)
-    db.commit()
-    db.refresh(audio_file)
+    await db.commit()
+    await db.refresh(audio_file)
     return audio_file
 
-def update_audio_file(db: Session, audio_file):
-    db.commit()
-    db.refresh(audio_file)
+async def update_audio_file(db: AsyncSession, audio_file):
+    await db.commit()
+    await db.refresh(audio_file)
     return audio_file
 
-def delete_audio_file(db: Session, audio_file):
-    db.delete(audio_file)
-    db.commit()
+async def delete_audio_file(db: AsyncSession, audio_file):
+    await db.delete(audio_file)
+    await db.commit()
@@ -0,0 +1,62 @@
+from collections import defaultdict
+from sqlalchemy import select, insert, func, literal, bindparam, Integer
+from sqlalchemy.dialects.postgresql import ARRAY, UUID
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi_app.config import FINGERPRINT_MATCH_THRESHOLD, FINGERPRINT_MIN_MATCHES, FINGERPRINT_QUERY_HASHES
+from fastapi_app.models import AudioFingerprint
+
+# First key of the two-key advisory lock serialising fingerprint checks within a user's library.
+FINGERPRINT_LOCK_NAMESPACE = 4817
+
+# Hold until commit so two copies processed at the same time cannot both miss each other.
+async def lock_user_fingerprints(db: AsyncSession, user_id):
+    await db.execute(select(func.pg_advisory_xact_lock(FINGERPRINT_LOCK_NAMESPACE, func.hashtext(str(user_id)))))
+
+def _unnest_hashes(hashes: list, offsets: list):
+    return select(
+        func.unnest(bindparam("hashes", hashes, type_=ARRAY(Integer))).label("hash"),
+        func.unnest(bindparam("offsets", offsets, type_=ARRAY(Integer))).label("frame_offset")
+    )
+
+async def save_fingerprint(db: AsyncSession, file_id, user_id, hashes: list, offsets: list):
+    if not hashes:
+        return
+    rows = _unnest_hashes(hashes, offsets).subquery()
+    await db.execute(insert(AudioFingerprint).from_select(
+        ["file_id", "user_id", "hash", "frame_offset"],
+        select(literal(file_id, UUID(as_uuid=True)), literal(user_id, UUID(as_uuid=True)), rows.c.hash, rows.c.frame_offset)
+    ))
+
+# Returns (file_id, score) for the user's file sharing the most time-aligned hashes, if it clears the
+# match thresholds. Score is the fraction of the sampled hashes found at one consistent time offset.
+async def find_near_duplicate(db: AsyncSession, user_id, file_id, hashes: list, offsets: list):
+    if len(hashes) > FINGERPRINT_QUERY_HASHES:
+        step = len(hashes) / FINGERPRINT_QUERY_HASHES
+        picks = [int(i * step) for i in range(FINGERPRINT_QUERY_HASHES)]
+        hashes, offsets = [hashes[i] for i in picks], [offsets[i] for i in picks]
+    if not hashes:
+        return None
+
+    query = _unnest_hashes(hashes, offsets).subquery()
+    delta = (AudioFingerprint.frame_offset - query.c.frame_offset).label("delta")
+    result = await db.execute(
+        select(AudioFingerprint.file_id, delta, func.count().label("matches"))
+        .join(query, AudioFingerprint.hash == query.c.hash)
+        .where(AudioFingerprint.user_id == user_id, AudioFingerprint.file_id != file_id)
+        .group_by(AudioFingerprint.file_id, delta)
+        .having(func.count() >= 2)
+    )
+    counts = defaultdict(dict)
+    for row in result:
+        counts[row.file_id][row.delta] = row.matches
+
+    best_file_id, best_matches = None, 0
+    for candidate, deltas in counts.items():
+        # A trim that is not a whole number of frames splits matches across neighbouring offsets.
+        matches = max(count + deltas.get(offset + 1, 0) for offset, count in deltas.items())
+        if matches > best_matches:
+            best_file_id, best_matches = candidate, matches
+    score = best_matches / len(hashes)
+    if best_matches >= FINGERPRINT_MIN_MATCHES and score >= FINGERPRINT_MATCH_THRESHOLD:
+        return best_file_id, round(score, 3)
+    return None
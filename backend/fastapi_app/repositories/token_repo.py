@@ -1,18 +1,46 @@
 import datetime
-from sqlalchemy.orm import Session
-from fastapi_app.models import SessionToken
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi_app.models import SessionToken, TokenRevocation
+from fastapi_app.services import session_cache
 
-def store_token(db: Session, token: str, user_id, expires_at: datetime.datetime):
+async def store_token(db: AsyncSession, token: str, user_id, expires_at: datetime.datetime):
     session_token = SessionToken(user_id=user_id, token=token, expires_at=expires_at)
     db.add(session_token)
-    db.commit()
+    await db.commit()
 
-def remove_token(db: Session, token: str):
-    session_token = db.query(SessionToken).filter(SessionToken.token == token).first()
+async def get_session_token(db: AsyncSession, token: str):
+    result = await db.execute(select(SessionToken).where(SessionToken.token == token))
+    return result.scalars().first()
+
+async def remove_token(db: AsyncSession, token: str):
+    await session_cache.invalidate(db, token=token)
+    session_token = await get_session_token(db, token)
     if session_token:
-        db.delete(session_token)
-        db.commit()
+        await db.delete(session_token)
+        await db.commit()
+
+async def remove_user_tokens(db: AsyncSession, user_id):
+    await db.execute(delete(SessionToken).where(SessionToken.user_id == user_id))
+    await session_cache.invalidate(db, user_id=user_id)
+    await db.commit()
 
-def is_token_valid(db: Session, token: str) -> bool:
-    session_token = db.query(SessionToken).filter(SessionToken.token == token).first()
+async def is_token_valid(db: AsyncSession, token: str) -> bool:
+    session_token = await get_session_token(db, token)
     return bool(session_token and session_token.expires_at > datetime.datetime.utcnow())
+
+async def revoke_token_id(db: AsyncSession, jti: str, expires_at: datetime.datetime):
+    db.add(TokenRevocation(jti=jti, expires_at=expires_at))
+    await db.commit()
+
+async def revoke_user_tokens(db: AsyncSession, user_id, revoked_before: datetime.datetime, expires_at: datetime.datetime):
+    db.add(TokenRevocation(user_id=user_id, revoked_before=revoked_before, expires_at=expires_at))
+    await db.commit()
+
+async def get_active_revocations(db: AsyncSession):
+    result = await db.execute(select(TokenRevocation).where(TokenRevocation.expires_at > datetime.datetime.utcnow()))
+    return result.scalars().all()
+
+async def purge_expired_revocations(db: AsyncSession):
+    await db.execute(delete(TokenRevocation).where(TokenRevocation.expires_at <= datetime.datetime.utcnow()))
+    await db.commit()
@@ -1,14 +1,28 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi_app.models import User
+from fastapi_app.pagination import SortOrder, after_cursor, order_by
 
-def get_user_by_username(db: Session, username: str):
-    return db.query(User).filter(User.username == username).first()
+async def get_user_by_username(db: AsyncSession, username: str):
+    result = await db.execute(select(User).where(User.username == username))
+    return result.scalars().first()
 
-def get_user_by_id(db: Session, user_id):
-    return db.query(User).filter(User.user_id == user_id).first()
+async def get_user_by_id(db: AsyncSession, user_id):
+    result = await db.execute(select(User).where(User.user_id == user_id))
+    return result.scalars().first()
 
-def create_user(db: Session, user: User):
+async def create_user(db: AsyncSession, user: User):
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     return user
+
+async def list_users(db: AsyncSession, limit: int, cursor=None, account_type=None, order=SortOrder.desc):
+    query = select(User)
+    if account_type:
+        query = query.where(User.account_type == account_type)
+    if cursor:
+        query = query.where(after_cursor(User.created_at, User.user_id, cursor, order))
+    query = query.order_by(*order_by(User.created_at, User.user_id, order)).limit(limit)
+    result = await db.execute(query)
+    return result.scalars().all()
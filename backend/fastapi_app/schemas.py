@@ -1,5 +1,5 @@
 import uuid, datetime, re
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pydantic import BaseModel, EmailStr, validator
 from fastapi_app.models import AudioCategoryEnum
 
@@ -84,3 +84,80 @@ class AudioFileOut(BaseModel):
 
     class Config:
         orm_mode = True
+
+class BatchUploadResult(BaseModel):
+    filename: str
+    status: str  # accepted, duplicate, rejected or error
+    detail: Optional[str] = None
+    file: Optional[AudioFileOut] = None
+
+class BatchUploadOut(BaseModel):
+    results: List[BatchUploadResult]
+
+class PlaybackUrlOut(BaseModel):
+    file_path: str
+    expires_in: int
+
+class PlaybackBatchRequest(BaseModel):
+    file_ids: List[uuid.UUID]
+
+class PlaybackBatchOut(BaseModel):
+    urls: Dict[uuid.UUID, PlaybackUrlOut]
+    missing: List[uuid.UUID]  # Not found, not owned by the caller, or not uploaded yet
+
+class BulkDeleteRequest(BaseModel):
+    file_ids: List[uuid.UUID]
+
+class DeleteFailure(BaseModel):
+    key: str
+    code: Optional[str] = None
+    message: Optional[str] = None
+
+class DeleteOperationOut(BaseModel):
+    operation_id: uuid.UUID
+    status: str
+    total_keys: int
+    deleted_keys: int
+    failed_keys: List[DeleteFailure]
+    created_at: datetime.datetime
+    finished_at: Optional[datetime.datetime] = None
+
+    class Config:
+        orm_mode = True
+
+class BulkDeleteOut(BaseModel):
+    operation: DeleteOperationOut
+    missing: List[uuid.UUID]  # Not found or not owned by the caller
+
+class PresignedUploadCreate(BaseModel):
+    description: str
+    category: AudioCategoryEnum
+    filename: str
+    content_type: str
+    file_size: int
+    checksum: str  # Hex MD5 of the whole file
+
+    @validator("checksum")
+    def checksum_valid(cls, value):
+        if not re.fullmatch(r"[0-9a-fA-F]{32}", value):
+            raise ValueError("Checksum must be a hex-encoded MD5 digest")
+        return value.lower()
+
+class PresignedUploadOut(BaseModel):
+    file_id: uuid.UUID
+    part_size: int
+    part_count: int
+
+class PresignedPartsRequest(BaseModel):
+    part_numbers: List[int]
+
+class PresignedPartsOut(BaseModel):
+    urls: Dict[int, str]
+    expires_in: int
+
+class CompletedPart(BaseModel):
+    part_number: int
+    etag: str
+
+class PresignedUploadComplete(BaseModel):
+    parts: List[CompletedPart]
@@ -1,13 +1,16 @@
 # fastapi_app/seed.py
-from fastapi_app.database import SessionLocal, engine
-from fastapi_app.models import Base, User
+from sqlalchemy import text
+from fastapi_app.database import SessionLocal
+from fastapi_app.models import User
 from fastapi_app.utils import get_password_hash
 
+# Key for the advisory lock that stops concurrent setup runs from inserting the same users.
+SEED_LOCK_ID = 48151624
+
 def seed_users():
-    # Ensure all tables exist first.
-    Base.metadata.create_all(bind=engine)
     db = SessionLocal()
     try:
+        db.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": SEED_LOCK_ID})
         existing_user1 = db.query(User).filter_by(username="user1").first()
         if not existing_user1:
             user1 = User(
@@ -34,8 +37,8 @@ def seed_users():
 
         db.commit()
         print("Database seeded successfully.")
-    except Exception as e:
+    except Exception:
         db.rollback()
-        print("Error seeding users:", e)
+        raise
     finally:
         db.close()
@@ -1,58 +1,388 @@
-import os, uuid, sys
+import os, uuid, sys, math, asyncio, hashlib
 import aiofiles
-import aioboto3
+from concurrent.futures import ProcessPoolExecutor
 from fastapi import HTTPException
-from fastapi_app.config import AWS_ACCESS_KEY, AWS_SECRET_KEY, BUCKET_NAME
-from fastapi_app.database import SessionLocal
+from fastapi_app.config import (
+    BUCKET_NAME, S3_MULTIPART_THRESHOLD,
+    S3_MULTIPART_PART_SIZE, S3_MULTIPART_CONCURRENCY, S3_MULTIPART_MAX_ATTEMPTS,
+    AUDIO_ANALYSIS_WORKERS, AUDIO_ANALYSIS_CHUNK_BYTES, WAVEFORM_POINTS, FINGERPRINT_DUPLICATE_ACTION,
+    UPLOAD_PROGRESS_STEP_PERCENT
+)
+from sqlalchemy import select, func, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi_app.database import AsyncSessionLocal
 from fastapi_app.models import AudioFile
+from fastapi_app.services.s3_service import get_s3_client
+from fastapi_app.services import upload_events
+from fastapi_app import metrics
+from fastapi_app.repositories.fingerprint_repo import lock_user_fingerprints, find_near_duplicate, save_fingerprint
+
+# Audio analysis is CPU bound, so it runs in its own process pool rather than on the event loop.
+_analysis_executor = None
+
+def get_analysis_executor() -> ProcessPoolExecutor:
+    global _analysis_executor
+    if _analysis_executor is None:
+        _analysis_executor = ProcessPoolExecutor(max_workers=AUDIO_ANALYSIS_WORKERS)
+    return _analysis_executor
+
+def shutdown_analysis_executor():
+    global _analysis_executor
+    if _analysis_executor is not None:
+        _analysis_executor.shutdown(wait=False, cancel_futures=True)
+        _analysis_executor = None
 
 async def upload_file_to_s3(file_path: str, file_key: str) -> None:
-    session = aioboto3.Session(
-        aws_access_key_id=AWS_ACCESS_KEY,
-        aws_secret_access_key=AWS_SECRET_KEY,
-    )
-    async with session.client("s3") as s3_client:
-        async with aiofiles.open(file_path, "rb") as f:
-            data = await f.read()
-        await s3_client.put_object(Bucket=BUCKET_NAME, Key=file_key, Body=data)
-    os.remove(file_path)
-
-async def process_upload(
-    file_location: str,
-    checksum: str,
-    description: str,
-    category,
-    upload_id: str,
-    user_id: str,
-    original_filename: str
-):
-    try:
-        file_key = f"{user_id}/{uuid.uuid4()}_{original_filename}"
-        await upload_file_to_s3(file_location, file_key)
-        s3_url = f"https://{BUCKET_NAME}.s3.amazonaws.com/{file_key}"
+    async with aiofiles.open(file_path, "rb") as f:
+        data = await f.read()
+    s3_client = await get_s3_client()
+    await s3_client.put_object(Bucket=BUCKET_NAME, Key=file_key, Body=data)
 
-        db = SessionLocal()
+# Upload a single part, retrying with backoff. Returns the entry expected by CompleteMultipartUpload.
+async def upload_part_with_retry(s3_client, file_key: str, s3_upload_id: str, part_number: int, data: bytes) -> dict:
+    for attempt in range(1, S3_MULTIPART_MAX_ATTEMPTS + 1):
         try:
-            upload_record = db.query(AudioFile).filter(AudioFile.file_id == upload_id).first()
-            if upload_record:
-                upload_record.file_path = s3_url
-                upload_record.upload_status = "completed"
-                db.commit()
+            response = await s3_client.upload_part(
+                Bucket=BUCKET_NAME, Key=file_key, UploadId=s3_upload_id,
+                PartNumber=part_number, Body=data
+            )
+            return {"PartNumber": part_number, "ETag": response["ETag"]}
         except Exception as e:
-            db.rollback()
-            print("DB error updating upload record:", e, file=sys.stderr)
+            if attempt == S3_MULTIPART_MAX_ATTEMPTS:
+                raise
+            print(f"Retrying part {part_number} of {file_key} after error:", e, file=sys.stderr)
+            await asyncio.sleep(min(2 ** attempt, 10))
+
+# Parts already stored for an in-progress multipart upload, keyed by part number.
+async def list_uploaded_parts(s3_client, file_key: str, s3_upload_id: str) -> dict:
+    parts = {}
+    paginator = s3_client.get_paginator("list_parts")
+    async for page in paginator.paginate(Bucket=BUCKET_NAME, Key=file_key, UploadId=s3_upload_id):
+        for part in page.get("Parts", []):
+            parts[part["PartNumber"]] = part
+    return parts
+
+async def abort_multipart_upload(s3_client, file_key: str, s3_upload_id: str) -> None:
+    try:
+        await s3_client.abort_multipart_upload(Bucket=BUCKET_NAME, Key=file_key, UploadId=s3_upload_id)
+    except Exception as e:
+        print(f"Error aborting multipart upload {s3_upload_id} for {file_key}:", e, file=sys.stderr)
+
+# Streams chunks straight into an S3 multipart upload. Memory is bounded by one buffered part
+# plus S3_MULTIPART_CONCURRENCY parts in flight; write() waits when that limit is reached.
+class S3MultipartWriter:
+    def __init__(self, s3_client, file_key: str):
+        self.s3_client = s3_client
+        self.file_key = file_key
+        self.s3_upload_id = None
+        self.buffer = bytearray()
+        self.part_count = 0
+        self.parts = {}
+        self.tasks = set()
+        self.semaphore = asyncio.Semaphore(S3_MULTIPART_CONCURRENCY)
+
+    async def start(self):
+        response = await self.s3_client.create_multipart_upload(Bucket=BUCKET_NAME, Key=self.file_key)
+        self.s3_upload_id = response["UploadId"]
+
+    async def write(self, data: bytes):
+        self.buffer.extend(data)
+        while len(self.buffer) >= S3_MULTIPART_PART_SIZE:
+            part = bytes(self.buffer[:S3_MULTIPART_PART_SIZE])
+            del self.buffer[:S3_MULTIPART_PART_SIZE]
+            await self._send_part(part)
+
+    async def _send_part(self, data: bytes):
+        for task in self.tasks:
+            if task.done() and task.exception():
+                raise task.exception()
+        await self.semaphore.acquire()
+        self.part_count += 1
+        task = asyncio.create_task(self._upload_part(self.part_count, data))
+        self.tasks.add(task)
+
+    async def _upload_part(self, part_number: int, data: bytes):
+        try:
+            self.parts[part_number] = await upload_part_with_retry(
+                self.s3_client, self.file_key, self.s3_upload_id, part_number, data
+            )
         finally:
-            db.close()
+            self.semaphore.release()
+
+    async def complete(self):
+        if self.buffer or self.part_count == 0:
+            await self._send_part(bytes(self.buffer))
+            self.buffer.clear()
+        await asyncio.gather(*self.tasks)
+        await self.s3_client.complete_multipart_upload(
+            Bucket=BUCKET_NAME, Key=self.file_key, UploadId=self.s3_upload_id,
+            MultipartUpload={"Parts": [self.parts[n] for n in sorted(self.parts)]}
+        )
+
+    async def abort(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        if self.s3_upload_id:
+            await abort_multipart_upload(self.s3_client, self.file_key, self.s3_upload_id)
+
+# Upload a file on disk in fixed-size parts with at most S3_MULTIPART_CONCURRENCY parts in memory.
+# Passing an existing s3_upload_id resumes it, skipping parts S3 already holds; on_create is awaited
+# with the id of a newly created upload so callers can persist it for a later resume.
+async def upload_file_to_s3_multipart(
+    file_path: str,
+    file_key: str,
+    s3_upload_id: str = None,
+    abort_on_failure: bool = True,
+    on_create=None,
+    on_progress=None
+) -> None:
+    file_size = os.path.getsize(file_path)
+    part_count = max(1, math.ceil(file_size / S3_MULTIPART_PART_SIZE))
+    s3_client = await get_s3_client()
+    completed = {}
+    if s3_upload_id:
+        try:
+            uploaded_parts = await list_uploaded_parts(s3_client, file_key, s3_upload_id)
+        except Exception as e:
+            print(f"Cannot resume multipart upload {s3_upload_id}, starting over:", e, file=sys.stderr)
+            s3_upload_id = None
+        else:
+            for part_number, part in uploaded_parts.items():
+                expected_size = min(S3_MULTIPART_PART_SIZE, file_size - (part_number - 1) * S3_MULTIPART_PART_SIZE)
+                if part_number <= part_count and part["Size"] == expected_size:
+                    completed[part_number] = {"PartNumber": part_number, "ETag": part["ETag"]}
+    if not s3_upload_id:
+        response = await s3_client.create_multipart_upload(Bucket=BUCKET_NAME, Key=file_key)
+        s3_upload_id = response["UploadId"]
+        if on_create:
+            await on_create(s3_upload_id)
+
+    semaphore = asyncio.Semaphore(S3_MULTIPART_CONCURRENCY)
+
+    async def send_part(part_number: int):
+        async with semaphore:
+            async with aiofiles.open(file_path, "rb") as f:
+                await f.seek((part_number - 1) * S3_MULTIPART_PART_SIZE)
+                data = await f.read(S3_MULTIPART_PART_SIZE)
+            completed[part_number] = await upload_part_with_retry(
+                s3_client, file_key, s3_upload_id, part_number, data
+            )
+        if on_progress:
+            await on_progress(min(len(completed) * S3_MULTIPART_PART_SIZE, file_size), file_size)
+
+    try:
+        async with asyncio.TaskGroup() as tg:
+            for part_number in range(1, part_count + 1):
+                if part_number not in completed:
+                    tg.create_task(send_part(part_number))
+        await s3_client.complete_multipart_upload(
+            Bucket=BUCKET_NAME, Key=file_key, UploadId=s3_upload_id,
+            MultipartUpload={"Parts": [completed[n] for n in sorted(completed)]}
+        )
+    except BaseException:
+        if abort_on_failure:
+            await abort_multipart_upload(s3_client, file_key, s3_upload_id)
+        raise
+
+# Returns an error detail if the user already has a completed upload with this content or description.
+async def find_duplicate_upload(db: AsyncSession, user_id, checksum: str, description: str):
+    # Check for duplicate by content.
+    result = await db.execute(select(AudioFile).where(
+        AudioFile.user_id == user_id,
+        AudioFile.checksum == checksum,
+        AudioFile.upload_status == "completed"
+    ))
+    duplicate_by_checksum = result.scalars().first()
+    if duplicate_by_checksum:
+        return f"Duplicate file detected with ID {duplicate_by_checksum.file_id} and description '{duplicate_by_checksum.description}'"
+
+    # Check for duplicate by description. The md5 predicate matches ix_audio_files_user_description_completed.
+    result = await db.execute(select(AudioFile).where(
+        AudioFile.user_id == user_id,
+        func.md5(AudioFile.description) == func.md5(description),
+        AudioFile.description == description,
+        AudioFile.upload_status == "completed"
+    ))
+    duplicate_by_description = result.scalars().first()
+    if duplicate_by_description:
+        return f"Duplicate description detected. A file with description '{duplicate_by_description.description}' has already been uploaded."
+    return None
+
+# Duplicate checks for a batch of (checksum, description) pairs in one query, plus matches within the
+# batch itself. Returns an error detail or None for each pair, in order.
+async def find_duplicate_uploads(db: AsyncSession, user_id, uploads: list) -> list:
+    if not uploads:
+        return []
+    checksums = {checksum for checksum, _ in uploads}
+    descriptions = {description for _, description in uploads}
+    result = await db.execute(select(AudioFile.file_id, AudioFile.checksum, AudioFile.description).where(
+        AudioFile.user_id == user_id,
+        AudioFile.upload_status == "completed",
+        or_(
+            AudioFile.checksum.in_(checksums),
+            # The md5 predicate matches ix_audio_files_user_description_completed.
+            and_(
+                func.md5(AudioFile.description).in_([hashlib.md5(d.encode()).hexdigest() for d in descriptions]),
+                AudioFile.description.in_(descriptions)
+            )
+        )
+    ))
+    by_checksum, by_description = {}, {}
+    for row in result:
+        by_checksum.setdefault(row.checksum, row)
+        by_description.setdefault(row.description, row)
+
+    details, batch_checksums, batch_descriptions = [], set(), set()
+    for checksum, description in uploads:
+        if checksum in by_checksum:
+            existing = by_checksum[checksum]
+            details.append(f"Duplicate file detected with ID {existing.file_id} and description '{existing.description}'")
+        elif description in by_description:
+            details.append(f"Duplicate description detected. A file with description '{description}' has already been uploaded.")
+        elif checksum in batch_checksums:
+            details.append("Duplicate file detected earlier in this batch")
+        elif description in batch_descriptions:
+            details.append(f"Duplicate description detected. Description '{description}' is used earlier in this batch.")
+        else:
+            details.append(None)
+        batch_checksums.add(checksum)
+        batch_descriptions.add(description)
+    return details
+
+def get_s3_url(file_key: str) -> str:
+    return f"https://{BUCKET_NAME}.s3.amazonaws.com/{file_key}"
+
+# The object key for a stored file_path, or None while the file is not in S3 yet.
+def get_s3_key(file_path: str):
+    prefix = get_s3_url("")
+    if file_path and file_path.startswith(prefix):
+        return file_path[len(prefix):]
+    return None
+
+# Read duration, sample format, loudness, waveform peaks and the fingerprint from a file on disk.
+# Returns (metadata, fingerprint); both are None when the file cannot be analysed, which never fails the upload.
+async def extract_metadata(file_location: str):
+    # Imported on first use so that numpy stays out of startup.
+    from fastapi_app.audio_metadata import analyze_audio
+    try:
+        return await asyncio.get_running_loop().run_in_executor(
+            get_analysis_executor(), analyze_audio, file_location, WAVEFORM_POINTS, AUDIO_ANALYSIS_CHUNK_BYTES,
+            FINGERPRINT_DUPLICATE_ACTION != "off"
+        )
     except Exception as e:
-        print("Error in background file processing:", e, file=sys.stderr)
-        db = SessionLocal()
+        print(f"Error extracting audio metadata from {file_location}:", e, file=sys.stderr)
+        return None, None
+
+# Upload a temp file to S3 while extracting its metadata, then mark its record completed. Raises on
+# failure so the caller can retry; multipart arguments are passed through to upload_file_to_s3_multipart.
+async def process_upload(file_location: str, upload_id, file_key: str, **multipart_options):
+    async with AsyncSessionLocal() as db:
+        user_id = await db.scalar(select(AudioFile.user_id).where(AudioFile.file_id == upload_id))
+    last_reported = 0
+    progress_lock = asyncio.Lock()
+
+    # Progress goes out every UPLOAD_PROGRESS_STEP_PERCENT; completion is announced with the status change.
+    # Parts finish concurrently, so reports are serialised to keep them in increasing order.
+    async def report_progress(sent: int, total: int):
+        nonlocal last_reported
+        async with progress_lock:
+            percent = sent * 100 // total
+            if not user_id or percent >= 100 or percent - last_reported < UPLOAD_PROGRESS_STEP_PERCENT:
+                return
+            last_reported = percent
+            try:
+                await upload_events.publish_now(upload_id, user_id, "processing", percent)
+            except Exception as e:
+                print(f"Error publishing progress for upload {upload_id}:", e, file=sys.stderr)
+
+    if os.path.getsize(file_location) >= S3_MULTIPART_THRESHOLD:
+        upload = upload_file_to_s3_multipart(file_location, file_key, on_progress=report_progress, **multipart_options)
+    else:
+        upload = upload_file_to_s3(file_location, file_key)
+    (metadata, fingerprint), _ = await asyncio.gather(extract_metadata(file_location), upload)
+    await finish_upload(file_location, upload_id, file_key, metadata, fingerprint)
+
+# Read back an object stored in S3 by the client (presigned upload) or by the request itself
+# (streaming mode), then analyse it like a queued upload. When the client declared a checksum it is
+# verified here, as only now has the server seen the bytes; a mismatch deletes the object.
+async def analyze_upload(file_location: str, upload_id, file_key: str, expected_checksum: str = None):
+    checksum = await download_file_from_s3(file_key, file_location)
+    if expected_checksum and checksum != expected_checksum.lower():
+        await delete_s3_object(file_key)
+        os.remove(file_location)
+        await mark_upload_failed(upload_id)
+        return
+    metadata, fingerprint = await extract_metadata(file_location)
+    await finish_upload(file_location, upload_id, file_key, metadata, fingerprint, checksum)
+
+# Store an object in a local file, returning its MD5 checksum.
+async def download_file_from_s3(file_key: str, file_location: str) -> str:
+    s3_client = await get_s3_client()
+    response = await s3_client.get_object(Bucket=BUCKET_NAME, Key=file_key)
+    md5_hash = hashlib.md5()
+    body = response["Body"]
+    async with body, aiofiles.open(file_location, "wb") as out_file:
+        while chunk := await body.read(1024 * 1024):
+            await out_file.write(chunk)
+            md5_hash.update(chunk)
+    return md5_hash.hexdigest()
+
+async def delete_s3_object(file_key: str):
+    s3_client = await get_s3_client()
+    await s3_client.delete_object(Bucket=BUCKET_NAME, Key=file_key)
+
+# Mark an upload whose object is in S3 completed (or a rejected near-duplicate), with its metadata
+# and fingerprint. The temp file is kept until the commit succeeds, so a retry can use it again.
+async def finish_upload(file_location: str, upload_id, file_key: str, metadata, fingerprint, checksum: str = None):
+    async with AsyncSessionLocal() as db:
+        upload_record = await db.get(AudioFile, upload_id)
+        if not upload_record:
+            # Deleted while uploading; nothing will ever reference the object.
+            await delete_s3_object(file_key)
+            os.remove(file_location)
+            return
+        upload_record.upload_status = "completed"
+        if checksum:
+            upload_record.checksum = checksum
+        if metadata:
+            upload_record.ai_processing_types = ["metadata", "waveform"] if "waveform" in metadata else ["metadata"]
+        if fingerprint is not None:
+            hashes, offsets = fingerprint[0].tolist(), fingerprint[1].tolist()
+            await lock_user_fingerprints(db, upload_record.user_id)
+            duplicate = await find_near_duplicate(db, upload_record.user_id, upload_id, hashes, offsets)
+            upload_record.ai_processing_types.append("fingerprint")
+            if duplicate:
+                metadata["near_duplicate"] = {"file_id": str(duplicate[0]), "score": duplicate[1]}
+            if duplicate and FINGERPRINT_DUPLICATE_ACTION == "reject":
+                await delete_s3_object(file_key)
+                upload_record.upload_status = "duplicate"
+            else:
+                await save_fingerprint(db, upload_id, upload_record.user_id, hashes, offsets)
+        upload_record.file_path = get_s3_url(file_key) if upload_record.upload_status == "completed" else ""
+        upload_record.processed_data = metadata
+        await record_upload_duration(db, upload_id, upload_record.upload_status)
+        await upload_events.publish(db, upload_id, upload_record.user_id, upload_record.upload_status, 100)
+        await db.commit()
+    os.remove(file_location)
+
+# upload_timestamp is set by the database, so the elapsed time is measured there too.
+async def record_upload_duration(db: AsyncSession, upload_id, outcome: str):
+    elapsed = await db.scalar(
+        select(func.extract("epoch", func.localtimestamp() - AudioFile.upload_timestamp)).where(AudioFile.file_id == upload_id)
+    )
+    if elapsed is not None:
+        metrics.upload_duration.observe(outcome, value=float(elapsed))
+
+async def mark_upload_failed(upload_id):
+    async with AsyncSessionLocal() as db:
         try:
-            upload_record = db.query(AudioFile).filter(AudioFile.file_id == upload_id).first()
+            upload_record = await db.get(AudioFile, upload_id)
             if upload_record:
                 upload_record.upload_status = "error"
-                db.commit()
-        except Exception as ex:
-            db.rollback()
-            print("DB error updating upload error:", ex, file=sys.stderr)
-        finally:
-            db.close()
+                await record_upload_duration(db, upload_id, "error")
+                await upload_events.publish(db, upload_id, upload_record.user_id, "error")
+                await db.commit()
+        except Exception as e:
+            await db.rollback()
+            print("DB error updating upload error:", e, file=sys.stderr)
@@ -0,0 +1,152 @@
+import sys, datetime, asyncio
+from sqlalchemy import select, update, or_, type_coerce
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi_app.config import (
+    BUCKET_NAME, S3_DELETE_BATCH_SIZE, S3_DELETE_CONCURRENCY, DELETE_INLINE_MAX_KEYS, DELETE_OPERATION_LEASE_SECONDS
+)
+from fastapi_app.database import AsyncSessionLocal
+from fastapi_app.models import DeleteOperation
+from fastapi_app.services.s3_service import get_s3_client
+
+# Operations running in this process, so shutdown can wait for them.
+_tasks = set()
+
+# Delete keys in DeleteObjects batches, several batches at a time. `on_batch(deleted, failures)` is
+# awaited after each batch; failures are {"key", "code", "message"} dicts, one per key S3 did not delete.
+async def delete_s3_keys(keys: list, on_batch=None) -> list:
+    s3_client = await get_s3_client()
+    semaphore = asyncio.Semaphore(S3_DELETE_CONCURRENCY)
+    failures = []
+
+    async def delete_batch(batch: list):
+        async with semaphore:
+            try:
+                response = await s3_client.delete_objects(
+                    Bucket=BUCKET_NAME,
+                    Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True}
+                )
+                batch_failures = [
+                    {"key": error["Key"], "code": error.get("Code"), "message": error.get("Message")}
+                    for error in response.get("Errors", [])
+                ]
+            except Exception as e:
+                batch_failures = [{"key": key, "code": type(e).__name__, "message": str(e)} for key in batch]
+        failures.extend(batch_failures)
+        if on_batch:
+            await on_batch(len(batch) - len(batch_failures), batch_failures)
+
+    async with asyncio.TaskGroup() as tg:
+        for start in range(0, len(keys), S3_DELETE_BATCH_SIZE):
+            tg.create_task(delete_batch(keys[start:start + S3_DELETE_BATCH_SIZE]))
+    return failures
+
+# Record the S3 keys of rows the caller is deleting. The caller commits, so rows and keys change together.
+def create_operation(db: AsyncSession, requested_by, keys: list) -> DeleteOperation:
+    operation = DeleteOperation(requested_by=requested_by, keys=keys, total_keys=len(keys), failed_keys=[])
+    db.add(operation)
+    return operation
+
+async def get_operation(db: AsyncSession, operation_id):
+    return await db.get(DeleteOperation, operation_id)
+
+# Take ownership of a queued or abandoned operation. Progress is reset because it is rerun from the start;
+# deleting an already deleted key succeeds, so a rerun is safe.
+async def _claim(operation_id, stale_before: datetime.datetime = None) -> bool:
+    condition = DeleteOperation.status == "queued"
+    if stale_before:
+        condition = or_(condition, DeleteOperation.status == "running")
+        condition = condition & (DeleteOperation.updated_at < stale_before)
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            update(DeleteOperation)
+            .where(DeleteOperation.operation_id == operation_id, condition)
+            .values(status="running", deleted_keys=0, failed_keys=[], updated_at=datetime.datetime.utcnow())
+        )
+        await db.commit()
+        return result.rowcount == 1
+
+async def _record_batch(operation_id, deleted: int, failures: list):
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(DeleteOperation)
+            .where(DeleteOperation.operation_id == operation_id)
+            .values(
+                deleted_keys=DeleteOperation.deleted_keys + deleted,
+                failed_keys=DeleteOperation.failed_keys.op("||")(type_coerce(failures, JSONB)),
+                updated_at=datetime.datetime.utcnow()
+            )
+        )
+        await db.commit()
+
+async def run_operation(operation_id):
+    async with AsyncSessionLocal() as db:
+        operation = await db.get(DeleteOperation, operation_id)
+        keys = operation.keys
+
+    async def record_batch(deleted: int, failures: list):
+        await _record_batch(operation_id, deleted, failures)
+
+    failures = await delete_s3_keys(keys, on_batch=record_batch)
+    for failure in failures:
+        print(f"Error deleting S3 object {failure['key']}: {failure['code']} {failure['message']}", file=sys.stderr)
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(DeleteOperation)
+            .where(DeleteOperation.operation_id == operation_id)
+            .values(
+                status="completed_with_errors" if failures else "completed",
+                updated_at=datetime.datetime.utcnow(),
+                finished_at=datetime.datetime.utcnow()
+            )
+        )
+        await db.commit()
+
+async def _claim_and_run(operation_id, stale_before: datetime.datetime = None):
+    if await _claim(operation_id, stale_before):
+        await run_operation(operation_id)
+
+def _spawn(operation_id, stale_before: datetime.datetime = None):
+    task = asyncio.create_task(_claim_and_run(operation_id, stale_before))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+# Run a committed operation: inline when it is small, otherwise in the background.
+# Returns the operation as it stands when the request should respond.
+async def start_operation(db: AsyncSession, operation: DeleteOperation) -> DeleteOperation:
+    if operation.total_keys <= DELETE_INLINE_MAX_KEYS:
+        await _claim_and_run(operation.operation_id)
+        await db.refresh(operation)
+    else:
+        _spawn(operation.operation_id)
+    return operation
+
+# Rerun operations whose process stopped heartbeating, including queued ones that were never claimed.
+async def recover_stale_operations() -> int:
+    stale_before = datetime.datetime.utcnow() - datetime.timedelta(seconds=DELETE_OPERATION_LEASE_SECONDS)
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(DeleteOperation.operation_id).where(
+                DeleteOperation.status.in_(["queued", "running"]),
+                DeleteOperation.updated_at < stale_before
+            )
+        )
+        operation_ids = result.scalars().all()
+    for operation_id in operation_ids:
+        _spawn(operation_id, stale_before)
+    return len(operation_ids)
+
+async def run_recovery_loop():
+    while True:
+        try:
+            recovered = await recover_stale_operations()
+            if recovered:
+                print(f"Resuming {recovered} stale delete operations.")
+        except Exception as e:
+            print("Error recovering delete operations:", e, file=sys.stderr)
+        await asyncio.sleep(DELETE_OPERATION_LEASE_SECONDS)
+
+async def shutdown():
+    for task in list(_tasks):
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
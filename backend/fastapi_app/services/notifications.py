@@ -0,0 +1,49 @@
+import sys, asyncio
+import asyncpg
+from fastapi_app.config import ASYNC_DATABASE_URL
+
+# One Postgres LISTEN connection per process, shared by every module that needs to hear about
+# changes made by other processes. Modules register their channels at import with listen().
+RECONNECT_SECONDS = 5
+
+# channel -> (callback(payload), on_connect, on_disconnect)
+_channels = {}
+
+# on_connect runs once the channel is being listened to, including after a reconnect; on_disconnect
+# runs when the connection is lost, as notifications sent until the reconnect are never delivered.
+def listen(channel: str, callback, on_connect=None, on_disconnect=None):
+    _channels[channel] = (callback, on_connect, on_disconnect)
+
+def _listener(callback):
+    def receive(connection, pid, channel, payload: str):
+        try:
+            callback(payload)
+        except Exception as e:
+            print(f"Error handling notification on {channel}:", e, file=sys.stderr)
+    return receive
+
+async def run_listener():
+    dsn = ASYNC_DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://", 1)
+    while True:
+        connection = None
+        try:
+            connection = await asyncpg.connect(dsn)
+            closed = asyncio.Event()
+            connection.add_termination_listener(lambda _: closed.set())
+            for channel, (callback, on_connect, _) in _channels.items():
+                await connection.add_listener(channel, _listener(callback))
+                if on_connect:
+                    on_connect()
+            await closed.wait()
+            print("Notification listener disconnected, reconnecting.", file=sys.stderr)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print("Error in notification listener:", e, file=sys.stderr)
+        finally:
+            for _, _, on_disconnect in _channels.values():
+                if on_disconnect:
+                    on_disconnect()
+            if connection is not None and not connection.is_closed():
+                await connection.close()
+        await asyncio.sleep(RECONNECT_SECONDS)
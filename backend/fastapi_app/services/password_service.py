@@ -0,0 +1,42 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import HTTPException
+from fastapi_app.config import PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING, PASSWORD_HASH_RETRY_AFTER_SECONDS
+from fastapi_app.utils import get_password_hash, verify_and_update_password
+
+# bcrypt runs in a bounded process pool so a burst of logins cannot starve other requests.
+# Work beyond PASSWORD_HASH_MAX_PENDING is rejected with 503 rather than queued without limit.
+_executor = None
+_pending = 0
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS)
+    return _executor
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+async def _run(func, *args):
+    global _pending
+    if _pending >= PASSWORD_HASH_MAX_PENDING:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many password operations in progress, please retry shortly",
+            headers={"Retry-After": str(PASSWORD_HASH_RETRY_AFTER_SECONDS)}
+        )
+    _pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(get_executor(), func, *args)
+    finally:
+        _pending -= 1
+
+async def hash_password(password: str) -> str:
+    return await _run(get_password_hash, password)
+
+async def verify_password(password: str, hashed_password: str):
+    return await _run(verify_and_update_password, password, hashed_password)
@@ -0,0 +1,64 @@
+import time, threading
+from collections import OrderedDict
+from fastapi_app.config import PLAYBACK_URL_EXPIRES_SECONDS, PLAYBACK_URL_REFRESH_MARGIN_SECONDS, PLAYBACK_URL_CACHE_MAX_SIZE
+
+# Bounded LRU cache of presigned playback URLs keyed by (file_id, user_id). An entry is only created
+# after an ownership check, so a hit can skip the DB lookup. URLs are reused until they are within
+# PLAYBACK_URL_REFRESH_MARGIN_SECONDS of expiring. Like the session cache this is per process.
+_entries = OrderedDict()  # (file_id, user_id) -> (url, monotonic expiry)
+_keys_by_user = {}
+_lock = threading.Lock()
+
+stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+# Returns (url, seconds until it expires) or None.
+def get(file_id, user_id):
+    key = (file_id, user_id)
+    with _lock:
+        entry = _entries.get(key)
+        if entry:
+            remaining = entry[1] - time.monotonic()
+            if remaining > PLAYBACK_URL_REFRESH_MARGIN_SECONDS:
+                _entries.move_to_end(key)
+                stats["hits"] += 1
+                return entry[0], int(remaining)
+            _remove(key)
+        stats["misses"] += 1
+        return None
+
+# `issued_at` is the monotonic time taken before the URL was signed, so the cached expiry never runs late.
+def put(file_id, user_id, url: str, issued_at: float):
+    key = (file_id, user_id)
+    with _lock:
+        _remove(key)
+        _entries[key] = (url, issued_at + PLAYBACK_URL_EXPIRES_SECONDS)
+        _keys_by_user.setdefault(user_id, set()).add(key)
+        while len(_entries) > PLAYBACK_URL_CACHE_MAX_SIZE:
+            _remove(next(iter(_entries)))
+            stats["evictions"] += 1
+
+def invalidate_file(file_id, user_id):
+    with _lock:
+        if _remove((file_id, user_id)):
+            stats["invalidations"] += 1
+
+def invalidate_user(user_id):
+    with _lock:
+        for key in list(_keys_by_user.get(user_id, ())):
+            _remove(key)
+            stats["invalidations"] += 1
+
+def clear():
+    with _lock:
+        _entries.clear()
+        _keys_by_user.clear()
+
+def _remove(key) -> bool:
+    if _entries.pop(key, None) is None:
+        return False
+    keys = _keys_by_user.get(key[1])
+    if keys:
+        keys.discard(key)
+        if not keys:
+            del _keys_by_user[key[1]]
+    return True
@@ -0,0 +1,42 @@
+import sys, datetime, asyncio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi_app.config import BUCKET_NAME, PRESIGNED_UPLOAD_EXPIRE_MINUTES, PRESIGNED_CLEANUP_INTERVAL_SECONDS
+from fastapi_app.database import AsyncSessionLocal
+from fastapi_app.models import AudioFile
+from fastapi_app.services.audio_service import abort_multipart_upload
+from fastapi_app.services.s3_service import get_s3_client
+
+def get_upload_expiry() -> datetime.datetime:
+    return datetime.datetime.utcnow() + datetime.timedelta(minutes=PRESIGNED_UPLOAD_EXPIRE_MINUTES)
+
+def get_file_key(audio_file: AudioFile) -> str:
+    return audio_file.file_path.replace(f"https://{BUCKET_NAME}.s3.amazonaws.com/", "")
+
+# Abort presigned uploads the client started but never completed, releasing the parts S3 holds.
+# Rows are locked while their uploads are aborted, so a concurrent complete waits and then finds none.
+async def cleanup_expired_uploads(db: AsyncSession) -> int:
+    result = await db.execute(
+        select(AudioFile)
+        .where(AudioFile.s3_upload_id.isnot(None), AudioFile.upload_expires_at < datetime.datetime.utcnow())
+        .with_for_update(skip_locked=True)
+    )
+    expired = result.scalars().all()
+    s3_client = await get_s3_client() if expired else None
+    for audio_file in expired:
+        await abort_multipart_upload(s3_client, get_file_key(audio_file), audio_file.s3_upload_id)
+        await db.delete(audio_file)
+    await db.commit()
+    return len(expired)
+
+async def run_cleanup_loop():
+    while True:
+        async with AsyncSessionLocal() as db:
+            try:
+                removed = await cleanup_expired_uploads(db)
+                if removed:
+                    print(f"Removed {removed} expired presigned uploads.")
+            except Exception as e:
+                await db.rollback()
+                print("Error cleaning up expired presigned uploads:", e, file=sys.stderr)
+        await asyncio.sleep(PRESIGNED_CLEANUP_INTERVAL_SECONDS)
@@ -0,0 +1,131 @@
+import os, sys, hashlib, datetime, asyncio
+import aiofiles
+from sqlalchemy import select, update, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi_app.config import (
+    UPLOAD_DIR, UPLOAD_NODE_ID, RESUMABLE_UPLOAD_EXPIRE_MINUTES, RESUMABLE_CLEANUP_INTERVAL_SECONDS,
+    RESUMABLE_RECEIVE_LEASE_SECONDS
+)
+from fastapi_app.database import AsyncSessionLocal
+from fastapi_app.models import AudioFile
+
+# Running MD5 state per upload, keyed by file_id as (hasher, bytes hashed).
+# hashlib objects cannot be serialized, so the state lives in this process; a resume that lands
+# in another worker process on the node (or after a restart) rehashes the bytes already on disk once.
+_hashers = {}
+
+def get_partial_path(file_id, filename: str) -> str:
+    return os.path.join(UPLOAD_DIR, f"{file_id}_{filename}.part")
+
+def get_upload_expiry() -> datetime.datetime:
+    return datetime.datetime.utcnow() + datetime.timedelta(minutes=RESUMABLE_UPLOAD_EXPIRE_MINUTES)
+
+def lease_is_free():
+    return or_(AudioFile.receiving_until.is_(None), AudioFile.receiving_until < datetime.datetime.utcnow())
+
+def get_receive_lease() -> datetime.datetime:
+    return datetime.datetime.utcnow() + datetime.timedelta(seconds=RESUMABLE_RECEIVE_LEASE_SECONDS)
+
+# Take the receive lease if the upload is still at `offset` and no other PATCH, in any process,
+# holds it. The conditional update is what serialises concurrent PATCHes.
+async def claim_receive_lease(db: AsyncSession, audio_file: AudioFile, offset: int) -> bool:
+    claimed = await db.execute(
+        update(AudioFile)
+        .where(
+            AudioFile.file_id == audio_file.file_id,
+            AudioFile.upload_status == "uploading",
+            AudioFile.upload_offset == offset,
+            lease_is_free()
+        )
+        .values(receiving_until=get_receive_lease())
+    )
+    await db.commit()
+    return claimed.rowcount == 1
+
+async def renew_receive_lease(file_id):
+    while True:
+        await asyncio.sleep(RESUMABLE_RECEIVE_LEASE_SECONDS / 3)
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(AudioFile)
+                .where(AudioFile.file_id == file_id, AudioFile.receiving_until.is_not(None))
+                .values(receiving_until=get_receive_lease())
+            )
+            await db.commit()
+
+async def release_receive_lease(file_id):
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(AudioFile).where(AudioFile.file_id == file_id).values(receiving_until=None))
+        await db.commit()
+
+# Returns an MD5 hasher covering exactly the first `offset` bytes of the partial file.
+async def get_hasher(file_id, partial_path: str, offset: int):
+    cached = _hashers.get(file_id)
+    if cached and cached[1] == offset:
+        return cached[0]
+
+    md5_hash = hashlib.md5()
+    remaining = offset
+    async with aiofiles.open(partial_path, "rb") as f:
+        while remaining > 0:
+            chunk = await f.read(min(1024 * 1024, remaining))
+            if not chunk:
+                break
+            md5_hash.update(chunk)
+            remaining -= len(chunk)
+    _hashers[file_id] = (md5_hash, offset)
+    return md5_hash
+
+# Append a request body stream at `offset`, returning the new offset.
+# Bytes past the recorded offset from an earlier interrupted write are discarded first.
+async def append_chunks(file_id, partial_path: str, offset: int, upload_length: int, chunks) -> int:
+    if os.path.getsize(partial_path) != offset:
+        os.truncate(partial_path, offset)
+    md5_hash = await get_hasher(file_id, partial_path, offset)
+    try:
+        async with aiofiles.open(partial_path, "ab") as out_file:
+            async for chunk in chunks:
+                if offset + len(chunk) > upload_length:
+                    raise ValueError("Chunk exceeds the declared upload length")
+                await out_file.write(chunk)
+                md5_hash.update(chunk)
+                offset += len(chunk)
+    finally:
+        _hashers[file_id] = (md5_hash, offset)
+    return offset
+
+def finish_checksum(file_id) -> str:
+    md5_hash, _ = _hashers.pop(file_id)
+    return md5_hash.hexdigest()
+
+def discard_upload(file_id, partial_path: str):
+    _hashers.pop(file_id, None)
+    if os.path.exists(partial_path):
+        os.remove(partial_path)
+
+# Each node cleans up the uploads whose partial files are on its own disk.
+async def cleanup_expired_uploads(db: AsyncSession) -> int:
+    result = await db.execute(select(AudioFile).where(
+        AudioFile.upload_status == "uploading",
+        or_(AudioFile.upload_node == UPLOAD_NODE_ID, AudioFile.upload_node.is_(None)),
+        AudioFile.upload_expires_at < datetime.datetime.utcnow(),
+        lease_is_free()
+    ).with_for_update(skip_locked=True))
+    expired = result.scalars().all()
+    for audio_file in expired:
+        discard_upload(audio_file.file_id, audio_file.file_path)
+        await db.delete(audio_file)
+    await db.commit()
+    return len(expired)
+
+async def run_cleanup_loop():
+    while True:
+        async with AsyncSessionLocal() as db:
+            try:
+                removed = await cleanup_expired_uploads(db)
+                if removed:
+                    print(f"Removed {removed} expired resumable uploads.")
+            except Exception as e:
+                await db.rollback()
+                print("Error cleaning up expired uploads:", e, file=sys.stderr)
+        await asyncio.sleep(RESUMABLE_CLEANUP_INTERVAL_SECONDS)
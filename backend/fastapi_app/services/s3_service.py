@@ -0,0 +1,50 @@
+import asyncio, contextlib
+from fastapi_app import metrics
+from fastapi_app.config import (
+    AWS_ACCESS_KEY, AWS_SECRET_KEY, S3_ENDPOINT_URL, S3_MAX_POOL_CONNECTIONS, S3_CONNECT_TIMEOUT_SECONDS,
+    S3_READ_TIMEOUT_SECONDS, S3_MAX_ATTEMPTS, S3_RETRY_MODE
+)
+
+# One long-lived client per process, opened on first use and closed by main.lifespan. Its connection
+# pool is shared by uploads, deletes and presigning, so requests reuse warm TLS connections.
+# Workers that never touch S3 never pay for importing boto3 or loading its service model.
+_client = None
+_exit_stack = None
+_start_lock = asyncio.Lock()
+
+def get_s3_config():
+    from aiobotocore.config import AioConfig
+    return AioConfig(
+        max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+        connect_timeout=S3_CONNECT_TIMEOUT_SECONDS,
+        read_timeout=S3_READ_TIMEOUT_SECONDS,
+        retries={"max_attempts": S3_MAX_ATTEMPTS, "mode": S3_RETRY_MODE}
+    )
+
+async def start_s3_client():
+    global _client, _exit_stack
+    async with _start_lock:
+        if _client is not None:
+            return _client
+        # Imported here: botocore and boto3 take a few hundred milliseconds to import.
+        import aioboto3
+        session = aioboto3.Session(
+            aws_access_key_id=AWS_ACCESS_KEY,
+            aws_secret_access_key=AWS_SECRET_KEY,
+        )
+        _exit_stack = contextlib.AsyncExitStack()
+        _client = await _exit_stack.enter_async_context(session.client("s3", endpoint_url=S3_ENDPOINT_URL, config=get_s3_config()))
+        metrics.instrument_s3_client(_client)
+        return _client
+
+async def close_s3_client():
+    global _client, _exit_stack
+    if _exit_stack is not None:
+        await _exit_stack.aclose()
+    _client = None
+    _exit_stack = None
+
+async def get_s3_client():
+    if _client is None:
+        return await start_s3_client()
+    return _client
@@ -0,0 +1,107 @@
+import json, time, hashlib, datetime, threading
+from collections import OrderedDict
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi_app.config import SESSION_CACHE_TTL_SECONDS, SESSION_CACHE_MAX_SIZE
+from fastapi_app.models import User
+from fastapi_app.services import notifications
+
+# Bounded TTL/LRU cache from session token to a detached snapshot of its user, so authenticated
+# requests skip the sessions and users lookups. Entries never outlive the session's expires_at.
+# Each process has its own cache; invalidations are broadcast with NOTIFY so they reach every
+# process, and the cache is bypassed while this process is not listening for them.
+# Entries are keyed by a SHA-256 of the token, so raw tokens never appear in notifications.
+CHANNEL = "session_invalidation"
+
+_entries = OrderedDict()  # token hash -> (user snapshot, monotonic expiry)
+_tokens_by_user = {}
+_lock = threading.Lock()
+_listening = False
+
+stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+def snapshot_user(user: User) -> User:
+    return User(**{column.key: getattr(user, column.key) for column in User.__table__.columns})
+
+def _key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def get(token: str):
+    if not _listening:
+        return None
+    token = _key(token)
+    with _lock:
+        entry = _entries.get(token)
+        if entry and entry[1] > time.monotonic():
+            _entries.move_to_end(token)
+            stats["hits"] += 1
+            return entry[0]
+        if entry:
+            _remove(token)
+        stats["misses"] += 1
+        return None
+
+def put(token: str, user: User, session_expires_at: datetime.datetime):
+    ttl = min(SESSION_CACHE_TTL_SECONDS, (session_expires_at - datetime.datetime.utcnow()).total_seconds())
+    if ttl <= 0 or not _listening:
+        return
+    token = _key(token)
+    snapshot = snapshot_user(user)
+    with _lock:
+        _remove(token)
+        _entries[token] = (snapshot, time.monotonic() + ttl)
+        _tokens_by_user.setdefault(str(snapshot.user_id), set()).add(token)
+        while len(_entries) > SESSION_CACHE_MAX_SIZE:
+            _remove(next(iter(_entries)))
+            stats["evictions"] += 1
+
+# Drop a token's entry, or all of a user's, in this process now and in every process (this one
+# included) once the caller's transaction commits. Call it before that commit, so a request that
+# re-caches the old state in between is corrected by the notification.
+async def invalidate(db: AsyncSession, token: str = None, user_id=None):
+    event = {"token": _key(token)} if token else {"user_id": str(user_id)}
+    _invalidate(event)
+    await db.execute(select(func.pg_notify(CHANNEL, json.dumps(event))))
+
+def _invalidate(event: dict):
+    with _lock:
+        if "token" in event:
+            keys = [event["token"]]
+        else:
+            keys = list(_tokens_by_user.get(event["user_id"], ()))
+        for key in keys:
+            if _remove(key):
+                stats["invalidations"] += 1
+
+def _receive(payload: str):
+    _invalidate(json.loads(payload))
+
+def clear():
+    with _lock:
+        _entries.clear()
+        _tokens_by_user.clear()
+
+def _remove(token: str) -> bool:
+    entry = _entries.pop(token, None)
+    if not entry:
+        return False
+    user_id = str(entry[0].user_id)
+    tokens = _tokens_by_user.get(user_id)
+    if tokens:
+        tokens.discard(token)
+        if not tokens:
+            del _tokens_by_user[user_id]
+    return True
+
+# Invalidations sent while the listener was down are lost, so the cache starts empty on every connect.
+def _start_listening():
+    global _listening
+    clear()
+    _listening = True
+
+def _stop_listening():
+    global _listening
+    _listening = False
+    clear()
+
+notifications.listen(CHANNEL, _receive, _start_listening, _stop_listening)
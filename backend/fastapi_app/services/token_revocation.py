@@ -0,0 +1,55 @@
+import sys, datetime, asyncio
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi_app.config import ACCESS_TOKEN_EXPIRE_MINUTES, REVOCATION_REFRESH_SECONDS
+from fastapi_app.database import AsyncSessionLocal
+from fastapi_app.repositories.token_repo import (
+    revoke_token_id, revoke_user_tokens, get_active_revocations, purge_expired_revocations
+)
+
+# In-memory view of token_revocations used to check signed tokens without a DB round trip.
+# Revocations made in this process apply immediately; others arrive with the next refresh.
+_revoked_ids = set()
+_revoked_before = {}  # user_id -> epoch seconds; tokens issued earlier are revoked
+
+def _timestamp(value: datetime.datetime) -> float:
+    return value.replace(tzinfo=datetime.timezone.utc).timestamp()
+
+def is_revoked(claims: dict) -> bool:
+    if claims.get("jti") in _revoked_ids:
+        return True
+    revoked_before = _revoked_before.get(claims.get("sub"))
+    return revoked_before is not None and claims.get("iat", 0) < revoked_before
+
+async def revoke_token(db: AsyncSession, claims: dict):
+    _revoked_ids.add(claims["jti"])
+    await revoke_token_id(db, claims["jti"], datetime.datetime.utcfromtimestamp(claims["exp"]))
+
+async def revoke_user(db: AsyncSession, user_id):
+    now = datetime.datetime.utcnow()
+    _revoked_before[str(user_id)] = max(_revoked_before.get(str(user_id), 0), _timestamp(now))
+    await revoke_user_tokens(db, user_id, now, now + datetime.timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+
+async def refresh(db: AsyncSession):
+    await purge_expired_revocations(db)
+    revoked_ids = set()
+    revoked_before = {}
+    for revocation in await get_active_revocations(db):
+        if revocation.jti:
+            revoked_ids.add(revocation.jti)
+        if revocation.user_id and revocation.revoked_before:
+            key = str(revocation.user_id)
+            revoked_before[key] = max(revoked_before.get(key, 0), _timestamp(revocation.revoked_before))
+    _revoked_ids.clear()
+    _revoked_ids.update(revoked_ids)
+    _revoked_before.clear()
+    _revoked_before.update(revoked_before)
+
+async def run_refresh_loop():
+    while True:
+        async with AsyncSessionLocal() as db:
+            try:
+                await refresh(db)
+            except Exception as e:
+                await db.rollback()
+                print("Error refreshing token revocations:", e, file=sys.stderr)
+        await asyncio.sleep(REVOCATION_REFRESH_SECONDS)
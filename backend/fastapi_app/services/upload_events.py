@@ -0,0 +1,54 @@
+import json, asyncio
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi_app.config import UPLOAD_EVENTS_QUEUE_SIZE
+from fastapi_app.database import AsyncSessionLocal
+from fastapi_app.services import notifications
+
+# Upload status changes are published with Postgres NOTIFY, so whichever process handles an upload,
+# every process hears about it. Each process fans them out to the event streams of the affected user.
+CHANNEL = "upload_status"
+
+# user_id (str) -> set of queues, one per open event stream in this process.
+_subscribers = {}
+
+def _payload(file_id, user_id, upload_status: str, progress=None) -> str:
+    event = {"file_id": str(file_id), "user_id": str(user_id), "upload_status": upload_status}
+    if progress is not None:
+        event["progress"] = progress
+    return json.dumps(event)
+
+# Queue a notification in the caller's transaction; it is delivered only if that transaction commits.
+async def publish(db: AsyncSession, file_id, user_id, upload_status: str, progress=None):
+    await db.execute(select(func.pg_notify(CHANNEL, _payload(file_id, user_id, upload_status, progress))))
+
+# Notify outside any other transaction, e.g. upload progress while the record is unchanged.
+async def publish_now(file_id, user_id, upload_status: str, progress=None):
+    async with AsyncSessionLocal() as db:
+        await publish(db, file_id, user_id, upload_status, progress)
+        await db.commit()
+
+def subscribe(user_id) -> asyncio.Queue:
+    queue = asyncio.Queue(maxsize=UPLOAD_EVENTS_QUEUE_SIZE)
+    _subscribers.setdefault(str(user_id), set()).add(queue)
+    return queue
+
+def unsubscribe(user_id, queue: asyncio.Queue):
+    queues = _subscribers.get(str(user_id))
+    if queues:
+        queues.discard(queue)
+        if not queues:
+            del _subscribers[str(user_id)]
+
+def _dispatch(payload: str):
+    try:
+        event = json.loads(payload)
+    except ValueError:
+        return
+    for queue in _subscribers.get(event.get("user_id"), ()):
+        if queue.full():
+            # A slow client loses its oldest update rather than holding memory; the latest state wins.
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+notifications.listen(CHANNEL, _dispatch)
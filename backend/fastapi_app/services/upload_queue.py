@@ -0,0 +1,260 @@
+import os, sys, time, uuid, datetime, asyncio
+from sqlalchemy import select, update, func, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi_app.config import (
+    UPLOAD_NODE_ID, UPLOAD_WORKERS, UPLOAD_JOB_MAX_ATTEMPTS, UPLOAD_JOB_BACKOFF_SECONDS,
+    UPLOAD_JOB_POLL_SECONDS, UPLOAD_JOB_LEASE_SECONDS, UPLOAD_ORPHAN_MIN_AGE_SECONDS, UPLOAD_DIR
+)
+from fastapi_app.database import AsyncSessionLocal
+from fastapi_app.models import AudioFile, UploadJob
+from fastapi_app.services.audio_service import (
+    process_upload, analyze_upload, mark_upload_failed, delete_s3_object, abort_multipart_upload
+)
+from fastapi_app.services.s3_service import get_s3_client
+from fastapi_app import metrics
+
+_wakeup = None
+
+def _get_wakeup() -> asyncio.Event:
+    global _wakeup
+    if _wakeup is None:
+        _wakeup = asyncio.Event()
+    return _wakeup
+
+# Add a job for a new upload record. The caller commits, so the record and its job are written together.
+def enqueue_upload(db: AsyncSession, audio_file: AudioFile, file_location: str, original_filename: str) -> UploadJob:
+    job = UploadJob(
+        file_id=audio_file.file_id,
+        file_location=file_location,
+        file_key=f"{audio_file.user_id}/{uuid.uuid4()}_{original_filename}",
+        hostname=UPLOAD_NODE_ID,
+        max_attempts=UPLOAD_JOB_MAX_ATTEMPTS
+    )
+    db.add(job)
+    return job
+
+# Add a job to analyse an object already in S3, verifying expected_checksum when one is given.
+# The caller commits. The object is downloaded to file_location by whichever node runs the job.
+def enqueue_analysis(db: AsyncSession, audio_file: AudioFile, file_key: str, expected_checksum: str = None) -> UploadJob:
+    job = UploadJob(
+        file_id=audio_file.file_id,
+        kind="analyze",
+        file_location=os.path.join(UPLOAD_DIR, os.path.basename(file_key)),
+        file_key=file_key,
+        hostname=UPLOAD_NODE_ID,
+        expected_checksum=expected_checksum,
+        max_attempts=UPLOAD_JOB_MAX_ATTEMPTS
+    )
+    db.add(job)
+    return job
+
+# Upload jobs need the temp file on their own node; analyze jobs can run, or be recovered, anywhere.
+def runs_here():
+    return or_(UploadJob.hostname == UPLOAD_NODE_ID, UploadJob.kind == "analyze")
+
+# Wake idle workers in this process after a commit that enqueued jobs.
+def notify():
+    _get_wakeup().set()
+
+async def get_queue_depth(db: AsyncSession) -> int:
+    result = await db.execute(select(func.count()).select_from(UploadJob).where(UploadJob.status == "queued"))
+    return result.scalar_one()
+
+async def claim_job():
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(UploadJob)
+            .where(
+                UploadJob.status == "queued",
+                runs_here(),
+                UploadJob.run_after <= datetime.datetime.utcnow()
+            )
+            .order_by(UploadJob.run_after)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        job = result.scalars().first()
+        if not job:
+            return None
+        # The status guard keeps the claim exclusive even where row locks are unavailable. The job
+        # moves to this node, where an analyze job writes its temp file.
+        claimed = await db.execute(
+            update(UploadJob)
+            .where(UploadJob.job_id == job.job_id, UploadJob.status == "queued")
+            .values(
+                status="processing", attempts=UploadJob.attempts + 1, locked_at=datetime.datetime.utcnow(),
+                hostname=UPLOAD_NODE_ID
+            )
+        )
+        await db.commit()
+        if claimed.rowcount != 1:
+            return None
+        await db.refresh(job)
+        return job
+
+async def _update_job(job_id, **values):
+    async with AsyncSessionLocal() as db:
+        job = await db.get(UploadJob, job_id)
+        if job:
+            for key, value in values.items():
+                setattr(job, key, value)
+            await db.commit()
+
+async def _renew_lease(job_id):
+    while True:
+        await asyncio.sleep(UPLOAD_JOB_LEASE_SECONDS / 3)
+        await _update_job(job_id, locked_at=datetime.datetime.utcnow())
+
+# Fail the upload of a job that will not be retried.
+async def _fail_upload(job: UploadJob):
+    await mark_upload_failed(job.file_id)
+    if job.kind == "analyze":
+        # The record is never completed, so nothing would reference the object.
+        try:
+            await delete_s3_object(job.file_key)
+        except Exception as e:
+            print(f"Error deleting S3 object {job.file_key}:", e, file=sys.stderr)
+
+async def run_job(job: UploadJob):
+    final_attempt = job.attempts >= job.max_attempts
+    lease = asyncio.create_task(_renew_lease(job.job_id))
+
+    async def save_s3_upload_id(s3_upload_id):
+        await _update_job(job.job_id, s3_upload_id=s3_upload_id)
+
+    try:
+        if job.kind == "analyze":
+            await analyze_upload(job.file_location, job.file_id, job.file_key, job.expected_checksum)
+        else:
+            await process_upload(
+                job.file_location, job.file_id, job.file_key,
+                s3_upload_id=job.s3_upload_id, abort_on_failure=final_attempt, on_create=save_s3_upload_id
+            )
+        await _update_job(job.job_id, status="done", locked_at=None, last_error=None)
+    except asyncio.CancelledError:
+        # Shutting down: hand the job back so it is picked up again without waiting for the lease.
+        await asyncio.shield(_update_job(job.job_id, status="queued", locked_at=None))
+        raise
+    except Exception as e:
+        print(f"Upload job {job.job_id} attempt {job.attempts} failed:", e, file=sys.stderr)
+        metrics.upload_job_failures.inc(str(final_attempt).lower())
+        if final_attempt:
+            await _update_job(job.job_id, status="failed", locked_at=None, last_error=str(e))
+            await _fail_upload(job)
+        else:
+            backoff = min(UPLOAD_JOB_BACKOFF_SECONDS * 2 ** (job.attempts - 1), 3600)
+            await _update_job(
+                job.job_id, status="queued", locked_at=None, last_error=str(e),
+                run_after=datetime.datetime.utcnow() + datetime.timedelta(seconds=backoff)
+            )
+    finally:
+        lease.cancel()
+
+async def run_worker():
+    wakeup = _get_wakeup()
+    while True:
+        try:
+            job = await claim_job()
+        except Exception as e:
+            print("Error claiming upload job:", e, file=sys.stderr)
+            job = None
+        if job:
+            await run_job(job)
+            continue
+        wakeup.clear()
+        try:
+            await asyncio.wait_for(wakeup.wait(), timeout=UPLOAD_JOB_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+# Requeue jobs left processing by a crashed or restarted worker: this host's upload jobs and any
+# node's analyze jobs. Upload jobs whose temp file is gone cannot be retried and are failed along
+# with their upload record; analyze jobs download theirs again. A job that was on its last attempt is
+# failed too, as one that kills its worker every time would otherwise be retried forever.
+async def recover_stale_jobs() -> int:
+    stale_before = datetime.datetime.utcnow() - datetime.timedelta(seconds=UPLOAD_JOB_LEASE_SECONDS)
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(UploadJob)
+            .where(
+                UploadJob.status == "processing",
+                runs_here(),
+                UploadJob.locked_at < stale_before
+            )
+            .with_for_update(skip_locked=True)
+        )
+        stale_jobs = result.scalars().all()
+        failed_jobs = []
+        for job in stale_jobs:
+            job.locked_at = None
+            if job.attempts >= job.max_attempts:
+                job.status = "failed"
+                job.last_error = f"Worker stopped during the last of {job.max_attempts} attempts"
+                failed_jobs.append(job)
+            elif job.kind == "analyze" or os.path.exists(job.file_location):
+                job.status = "queued"
+                job.run_after = datetime.datetime.utcnow()
+            else:
+                job.status = "failed"
+                job.last_error = "Temp file missing during recovery"
+                failed_jobs.append(job)
+        await db.commit()
+    for job in failed_jobs:
+        metrics.upload_job_failures.inc("true")
+        if job.s3_upload_id:
+            await abort_multipart_upload(await get_s3_client(), job.file_key, job.s3_upload_id)
+        await _fail_upload(job)
+    return len(stale_jobs)
+
+# Remove temp files nothing will pick up again: jobs are deleted with their upload (file_id cascades)
+# and failed jobs are never retried, leaving their files behind. Recently modified files are kept,
+# as they may still be receiving a request body or waiting for the commit that enqueues their job.
+async def sweep_orphaned_files() -> int:
+    modified_before = time.time() - UPLOAD_ORPHAN_MIN_AGE_SECONDS
+    candidates = []
+    with os.scandir(UPLOAD_DIR) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.stat().st_mtime < modified_before:
+                candidates.append(os.path.abspath(entry.path))
+    if not candidates:
+        return 0
+    async with AsyncSessionLocal() as db:
+        job_files = await db.scalars(
+            select(UploadJob.file_location).where(
+                UploadJob.hostname == UPLOAD_NODE_ID,
+                UploadJob.status.in_(("queued", "processing"))
+            )
+        )
+        partial_files = await db.scalars(select(AudioFile.file_path).where(AudioFile.upload_status == "uploading"))
+        referenced = {os.path.abspath(path) for path in [*job_files, *partial_files] if path}
+    removed = 0
+    for path in candidates:
+        if path not in referenced:
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
+
+async def run_recovery_loop():
+    while True:
+        try:
+            recovered = await recover_stale_jobs()
+            if recovered:
+                print(f"Recovered {recovered} stale upload jobs.")
+                notify()
+        except Exception as e:
+            print("Error recovering upload jobs:", e, file=sys.stderr)
+        try:
+            removed = await sweep_orphaned_files()
+            if removed:
+                print(f"Removed {removed} orphaned upload temp files.")
+        except Exception as e:
+            print("Error removing orphaned upload files:", e, file=sys.stderr)
+        await asyncio.sleep(UPLOAD_JOB_LEASE_SECONDS)
+
+def start_workers() -> list:
+    tasks = [asyncio.create_task(run_recovery_loop())]
+    tasks += [asyncio.create_task(run_worker()) for _ in range(UPLOAD_WORKERS)]
+    return tasks
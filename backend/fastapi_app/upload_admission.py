@@ -0,0 +1,111 @@
+import re, shutil
+from starlette.datastructures import Headers
+from starlette.requests import cookie_parser
+from starlette.responses import JSONResponse
+from fastapi_app.config import (
+    UPLOAD_DIR, UPLOAD_STREAM_TO_S3, UPLOAD_MAX_CONCURRENT, UPLOAD_MAX_INFLIGHT_BYTES,
+    UPLOAD_MAX_CONCURRENT_PER_USER, UPLOAD_MAX_INFLIGHT_BYTES_PER_USER, UPLOAD_MIN_FREE_BYTES,
+    UPLOAD_RETRY_AFTER_SECONDS
+)
+from fastapi_app.dependencies import authenticate_token
+from fastapi_app import metrics
+
+# Admission control for requests carrying audio. FastAPI reads a whole multipart body before any
+# dependency runs, so limits checked in a handler come too late to protect the disk. This middleware
+# decides from the headers alone: a refused upload is answered before its body is read, and a client
+# that sent Expect: 100-continue never sends the body at all.
+#
+# Uploads are counted by their declared Content-Length from admission until the response is sent.
+# The session cookie is validated here, through the session cache, so per-user limits are keyed by
+# user id: a made-up or second session cookie gets no allowance of its own.
+
+# (method, path, whether the body is written to UPLOAD_DIR)
+UPLOAD_ROUTES = [
+    ("POST", re.compile(r"/files/upload/?"), not UPLOAD_STREAM_TO_S3),
+    ("POST", re.compile(r"/files/upload-batch/?"), not UPLOAD_STREAM_TO_S3),
+    ("PATCH", re.compile(r"/files/resumable/[^/]+/?"), True),
+]
+
+# Totals for this process, and per user id: (uploads, bytes).
+in_flight = {"uploads": 0, "bytes": 0, "disk_bytes": 0}
+_per_user = {}
+
+def match_upload_route(scope):
+    for method, path, writes_to_disk in UPLOAD_ROUTES:
+        if scope["method"] == method and path.fullmatch(scope["path"]):
+            return writes_to_disk
+    return None
+
+# Returns (status code, reason, detail) when the upload must be refused, otherwise None.
+def check_admission(user_id, length: int, writes_to_disk: bool):
+    if (UPLOAD_MAX_INFLIGHT_BYTES and length > UPLOAD_MAX_INFLIGHT_BYTES) or \
+            (UPLOAD_MAX_INFLIGHT_BYTES_PER_USER and length > UPLOAD_MAX_INFLIGHT_BYTES_PER_USER):
+        # Could never be admitted, so retrying would not help.
+        return 413, "too_large", "Upload is larger than this server accepts in one request; send fewer or smaller files"
+
+    uploads, used = _per_user.get(user_id, (0, 0))
+    if UPLOAD_MAX_CONCURRENT_PER_USER and uploads >= UPLOAD_MAX_CONCURRENT_PER_USER:
+        return 429, "user_concurrency", f"Too many uploads in progress for this account, retry in {UPLOAD_RETRY_AFTER_SECONDS} seconds"
+    if UPLOAD_MAX_INFLIGHT_BYTES_PER_USER and used + length > UPLOAD_MAX_INFLIGHT_BYTES_PER_USER:
+        return 429, "user_bytes", f"Too much upload data in progress for this account, retry in {UPLOAD_RETRY_AFTER_SECONDS} seconds"
+
+    if UPLOAD_MAX_CONCURRENT and in_flight["uploads"] >= UPLOAD_MAX_CONCURRENT:
+        return 503, "concurrency", f"Server is busy with other uploads, retry in {UPLOAD_RETRY_AFTER_SECONDS} seconds"
+    if UPLOAD_MAX_INFLIGHT_BYTES and in_flight["bytes"] + length > UPLOAD_MAX_INFLIGHT_BYTES:
+        return 503, "bytes", f"Server is busy with other uploads, retry in {UPLOAD_RETRY_AFTER_SECONDS} seconds"
+    if writes_to_disk:
+        # Admitted bodies still being received will need their full declared size.
+        free = shutil.disk_usage(UPLOAD_DIR).free - in_flight["disk_bytes"]
+        if free - length < UPLOAD_MIN_FREE_BYTES:
+            return 503, "disk_space", f"Not enough free space for uploads, retry in {UPLOAD_RETRY_AFTER_SECONDS} seconds"
+    return None
+
+def _track(user_id, length: int, writes_to_disk: bool, sign: int):
+    in_flight["uploads"] += sign
+    in_flight["bytes"] += sign * length
+    if writes_to_disk:
+        in_flight["disk_bytes"] += sign * length
+    uploads, used = _per_user.get(user_id, (0, 0))
+    if uploads + sign:
+        _per_user[user_id] = (uploads + sign, used + sign * length)
+    else:
+        _per_user.pop(user_id, None)
+    metrics.uploads_in_flight.set(value=in_flight["uploads"])
+    metrics.upload_bytes_in_flight.set(value=in_flight["bytes"])
+
+class UploadAdmissionMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        writes_to_disk = match_upload_route(scope) if scope["type"] == "http" else None
+        if writes_to_disk is None:
+            return await self.app(scope, receive, send)
+
+        headers = Headers(scope=scope)
+        token = cookie_parser(headers.get("cookie", "")).get("session_token")
+        length = headers.get("content-length", "")
+        user_id = None
+        if not token:
+            # Would fail authentication anyway; refuse before reading the body rather than after.
+            rejection = 401, "unauthenticated", "Not authenticated"
+        elif not length.isdigit():
+            rejection = 411, "no_length", "Uploads must declare their size with Content-Length"
+        elif not (user_id := await authenticate_token(token)):
+            rejection = 401, "unauthenticated", "Session expired or invalid"
+        else:
+            length = int(length)
+            rejection = check_admission(user_id, length, writes_to_disk)
+
+        if rejection:
+            status_code, reason, detail = rejection
+            metrics.upload_admission_rejections.inc(reason)
+            response_headers = {"Retry-After": str(UPLOAD_RETRY_AFTER_SECONDS)} if status_code in (429, 503) else None
+            response = JSONResponse({"detail": detail}, status_code=status_code, headers=response_headers)
+            return await response(scope, receive, send)
+
+        _track(user_id, length, writes_to_disk, 1)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _track(user_id, length, writes_to_disk, -1)
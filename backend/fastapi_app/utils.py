@@ -2,10 +2,16 @@
 import datetime, jwt, os, uuid, hashlib, aiofiles, secrets
 from fastapi import HTTPException
 from passlib.context import CryptContext
-from fastapi_app.config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, MAX_FILE_SIZE, UPLOAD_DIR, AWS_ACCESS_KEY, AWS_SECRET_KEY, BUCKET_NAME
-import boto3
+from fastapi_app.config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, MAX_FILE_SIZE, UPLOAD_DIR, BCRYPT_ROUNDS
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashes with any other cost factor are flagged by needs_update and rehashed on login.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS
+)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
@@ -13,6 +19,10 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+# Returns (is_valid, new_hash); new_hash is set when the stored hash should be upgraded.
+def verify_and_update_password(plain_password: str, hashed_password: str):
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
 def create_access_token(data: dict, expires_delta: datetime.timedelta = None) -> str:
     to_encode = data.copy()
     expire = datetime.datetime.utcnow() + (expires_delta or datetime.timedelta(minutes=15))
@@ -20,12 +30,12 @@ def create_access_token(data: dict, expires_delta: datetime.timedelta = None) ->
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-# Synchronous S3 client - for generating pre-signed URLs
-s3 = boto3.client(
-    's3',
-    aws_access_key_id=AWS_ACCESS_KEY,
-    aws_secret_access_key=AWS_SECRET_KEY
-)
+# Returns the token's claims, or None if the signature is invalid or it has expired.
+def decode_access_token(token: str):
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.PyJWTError:
+        return None
 
 # Helper to save an uploaded file and compute its MD5 checksum.
 async def save_file_to_disk_and_checksum(file) -> (str, str):
@@ -45,4 +55,19 @@ async def save_file_to_disk_and_checksum(file) -> (str, str):
             await out_file.write(chunk)
             md5_hash.update(chunk)
     checksum = md5_hash.hexdigest()
-    return file_location, checksum
\ No newline at end of file
+    return file_location, checksum
+
+# Helper to stream an uploaded file into an S3 multipart writer while computing its MD5 checksum.
+async def stream_file_to_s3_and_checksum(file, writer) -> (int, str):
+    md5_hash = hashlib.md5()
+    total_bytes = 0
+    while True:
+        chunk = await file.read(1024 * 1024)  # 1 MB chunks
+        if not chunk:
+            break
+        total_bytes += len(chunk)
+        if total_bytes > MAX_FILE_SIZE:
+            raise HTTPException(status_code=400, detail="File size exceeds the maximum allowed limit of 1GB")
+        md5_hash.update(chunk)
+        await writer.write(chunk)
+    return total_bytes, md5_hash.hexdigest()
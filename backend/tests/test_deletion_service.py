@@ -0,0 +1,64 @@
+import asyncio, uuid
+from fastapi_app.config import BUCKET_NAME, DELETE_OPERATION_LEASE_SECONDS
+from fastapi_app.services import deletion_service
+
+def insert_operation(sql, keys: list, status: str, age_seconds: int) -> str:
+    (operation_id,), = sql(
+        "INSERT INTO delete_operations (operation_id, status, keys, total_keys, deleted_keys, failed_keys, updated_at) "
+        "VALUES (%s, %s, %s, %s, 0, '[]', (now() AT TIME ZONE 'utc') - make_interval(secs => %s)) RETURNING operation_id",
+        (str(uuid.uuid4()), status, keys, len(keys), age_seconds)
+    )
+    return operation_id
+
+def put_objects(s3, count: int) -> list:
+    keys = [f"deletion-test/{uuid.uuid4()}.wav" for _ in range(count)]
+    for key in keys:
+        s3.put_object(Bucket=BUCKET_NAME, Key=key, Body=b"audio")
+    return keys
+
+def remaining(s3, keys: list) -> list:
+    return [key for key in keys if s3.list_objects_v2(Bucket=BUCKET_NAME, Prefix=key)["KeyCount"]]
+
+async def recover() -> int:
+    recovered = await deletion_service.recover_stale_operations()
+    await asyncio.gather(*deletion_service._tasks)
+    return recovered
+
+def test_abandoned_operations_are_rerun(sql, s3, run):
+    stale_running_keys, stale_queued_keys, live_keys = put_objects(s3, 3), put_objects(s3, 2), put_objects(s3, 2)
+    # A process died part way through this one, leaving its progress behind.
+    stale_running = insert_operation(sql, stale_running_keys, "running", DELETE_OPERATION_LEASE_SECONDS + 60)
+    sql("UPDATE delete_operations SET deleted_keys = 1 WHERE operation_id = %s", (stale_running,))
+    stale_queued = insert_operation(sql, stale_queued_keys, "queued", DELETE_OPERATION_LEASE_SECONDS + 60)
+    # Still heartbeating in another process, so it must be left alone.
+    live = insert_operation(sql, live_keys, "running", 5)
+
+    assert run(recover) == 2
+
+    for operation_id, total in ((stale_running, 3), (stale_queued, 2)):
+        assert sql(
+            "SELECT status, deleted_keys, failed_keys, finished_at IS NOT NULL FROM delete_operations WHERE operation_id = %s",
+            (operation_id,)
+        ) == [("completed", total, [], True)]
+    assert remaining(s3, stale_running_keys + stale_queued_keys) == []
+    assert sql("SELECT status, deleted_keys FROM delete_operations WHERE operation_id = %s", (live,)) == [("running", 0)]
+    assert remaining(s3, live_keys) == live_keys
+
+def test_operation_claimed_by_another_recovery_is_not_run_twice(sql, s3, run, monkeypatch):
+    keys = put_objects(s3, 1)
+    operation_id = insert_operation(sql, keys, "running", DELETE_OPERATION_LEASE_SECONDS + 60)
+    runs = []
+    run_operation = deletion_service.run_operation
+    async def counted_run_operation(operation_id):
+        runs.append(operation_id)
+        await run_operation(operation_id)
+    monkeypatch.setattr(deletion_service, "run_operation", counted_run_operation)
+
+    async def recover_twice():
+        # Both recoveries see the operation as stale; only one may claim it.
+        return await asyncio.gather(deletion_service.recover_stale_operations(), deletion_service.recover_stale_operations())
+
+    assert run(recover_twice) == [1, 1]
+    run(recover)
+    assert [str(claimed) for claimed in runs] == [operation_id]
+    assert sql("SELECT status, deleted_keys FROM delete_operations WHERE operation_id = %s", (operation_id,)) == [("completed", 1)]
@@ -0,0 +1,46 @@
+def create_upload(client) -> str:
+    response = client.post(
+        "/files/resumable",
+        params={"description": "etag", "category": "Music", "filename": "clip.wav", "content_type": "audio/wav"},
+        headers={"Upload-Length": "20"}
+    )
+    assert response.status_code == 201, response.text
+    return response.json()["file_id"]
+
+def test_file_list_is_not_modified_until_the_data_version_changes(client, login, sql):
+    login()
+    first = client.get("/files/")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    not_modified = client.get("/files/", headers={"If-None-Match": etag})
+    assert (not_modified.status_code, not_modified.headers["ETag"], not_modified.content) == (304, etag, b"")
+    # The query string is part of the resource, so another page of the list has its own ETag.
+    assert client.get("/files/", params={"limit": 1}, headers={"If-None-Match": etag}).status_code == 200
+
+    file_id = create_upload(client)
+    changed = client.get("/files/", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert file_id in {audio_file["file_id"] for audio_file in changed.json()}
+
+    # Changes made outside the API bump the version through the triggers too.
+    etag = changed.headers["ETag"]
+    sql("UPDATE audio_files SET description = 'etag renamed' WHERE file_id = %s", (file_id,))
+    changed = client.get("/files/", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert client.get("/files/", headers={"If-None-Match": changed.headers["ETag"]}).status_code == 304
+
+def test_upload_status_and_me_follow_the_data_version(client, login, sql):
+    login()
+    file_id = create_upload(client)
+    status = client.get(f"/files/upload-status/{file_id}")
+    me = client.get("/auth/me")
+    assert client.get(f"/files/upload-status/{file_id}", headers={"If-None-Match": status.headers["ETag"]}).status_code == 304
+    assert client.get("/auth/me", headers={"If-None-Match": me.headers["ETag"]}).status_code == 304
+
+    sql("UPDATE users SET email = email WHERE username = 'user1'")  # Unchanged row: no new version.
+    assert client.get("/auth/me", headers={"If-None-Match": me.headers["ETag"]}).status_code == 304
+    sql("UPDATE users SET last_logged_in = now() WHERE username = 'user1'")
+    assert client.get("/auth/me", headers={"If-None-Match": me.headers["ETag"]}).status_code == 200
+    assert client.get(f"/files/upload-status/{file_id}", headers={"If-None-Match": status.headers["ETag"]}).status_code == 200
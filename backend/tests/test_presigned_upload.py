@@ -0,0 +1,116 @@
+import hashlib, datetime
+import httpx
+from fastapi_app.config import BUCKET_NAME
+from fastapi_app.database import AsyncSessionLocal
+from fastapi_app.services.presigned_upload_service import cleanup_expired_uploads
+
+def start_upload(client, data: bytes, checksum: str, description: str):
+    response = client.post("/files/presigned-upload", json={
+        "description": description, "category": "Music", "filename": "clip.wav",
+        "content_type": "audio/wav", "file_size": len(data), "checksum": checksum
+    })
+    assert response.status_code == 200, response.text
+    return response.json()["file_id"]
+
+def upload_parts(client, file_id: str, data: bytes):
+    urls = client.post(f"/files/presigned-upload/{file_id}/parts", json={"part_numbers": [1]}).json()["urls"]
+    response = httpx.put(urls["1"], content=data)
+    assert response.status_code == 200, response.text
+    return [{"part_number": 1, "etag": response.headers["ETag"]}]
+
+def object_key(sql, file_id: str) -> str:
+    (file_path,), = sql("SELECT file_path FROM audio_files WHERE file_id = %s", (file_id,))
+    return file_path.replace(f"https://{BUCKET_NAME}.s3.amazonaws.com/", "")
+
+def object_exists(s3, key: str) -> bool:
+    return s3.list_objects_v2(Bucket=BUCKET_NAME, Prefix=key)["KeyCount"] > 0
+
+def test_completed_upload_is_analysed_and_checksummed(client, login, sql, s3, make_wav, drain_jobs):
+    login()
+    data = make_wav(seed=11)
+    checksum = hashlib.md5(data).hexdigest()
+    file_id = start_upload(client, data, checksum, "presigned ok")
+    response = client.post(f"/files/presigned-upload/{file_id}/complete", json={"parts": upload_parts(client, file_id, data)})
+    assert response.status_code == 200, response.text
+    assert response.json()["upload_status"] == "processing"
+
+    drain_jobs()
+    assert sql("SELECT upload_status, checksum FROM audio_files WHERE file_id = %s", (file_id,)) == [("completed", checksum)]
+    assert object_exists(s3, object_key(sql, file_id))
+
+def test_checksum_mismatch_fails_upload_and_deletes_object(client, login, sql, s3, make_wav, drain_jobs):
+    login()
+    data = make_wav(seed=12)
+    # Declares the checksum of different bytes than it then uploads.
+    file_id = start_upload(client, data, hashlib.md5(b"something else").hexdigest(), "presigned mismatch")
+    key = object_key(sql, file_id)
+    response = client.post(f"/files/presigned-upload/{file_id}/complete", json={"parts": upload_parts(client, file_id, data)})
+    assert response.status_code == 200, response.text
+    assert object_exists(s3, key)
+
+    drain_jobs()
+    assert sql("SELECT upload_status, checksum FROM audio_files WHERE file_id = %s", (file_id,)) == [("error", None)]
+    assert not object_exists(s3, key)
+
+def test_size_mismatch_fails_upload_and_deletes_object(client, login, sql, s3, make_wav):
+    login()
+    data = make_wav(seed=13)
+    file_id = start_upload(client, data, hashlib.md5(data).hexdigest(), "presigned short")
+    key = object_key(sql, file_id)
+    response = client.post(f"/files/presigned-upload/{file_id}/complete", json={"parts": upload_parts(client, file_id, data[:-100])})
+    assert response.status_code == 400
+    assert "declared size" in response.json()["detail"]
+    assert sql("SELECT upload_status, s3_upload_id FROM audio_files WHERE file_id = %s", (file_id,)) == [("error", None)]
+    assert not object_exists(s3, key)
+
+def test_failed_complete_leaves_upload_open_for_retry(client, login, sql, make_wav, drain_jobs):
+    login()
+    data = make_wav(seed=14)
+    file_id = start_upload(client, data, hashlib.md5(data).hexdigest(), "presigned retry")
+    parts = upload_parts(client, file_id, data)
+    response = client.post(f"/files/presigned-upload/{file_id}/complete", json={"parts": [{"part_number": 1, "etag": '"bogus"'}]})
+    assert response.status_code == 400
+
+    response = client.post(f"/files/presigned-upload/{file_id}/complete", json={"parts": parts})
+    assert response.status_code == 200, response.text
+    drain_jobs()
+    assert sql("SELECT upload_status FROM audio_files WHERE file_id = %s", (file_id,)) == [("completed",)]
+
+def test_expired_uploads_are_aborted(client, login, sql, s3, make_wav, run):
+    login()
+    data = make_wav(seed=15)
+    expired = start_upload(client, data, hashlib.md5(data).hexdigest(), "presigned expired")
+    upload_parts(client, expired, data)
+    pending = start_upload(client, data, hashlib.md5(b"other").hexdigest(), "presigned pending")
+    (upload_id,), = sql("SELECT s3_upload_id FROM audio_files WHERE file_id = %s", (expired,))
+    sql(
+        "UPDATE audio_files SET upload_expires_at = %s WHERE file_id = %s",
+        (datetime.datetime.utcnow() - datetime.timedelta(minutes=1), expired)
+    )
+
+    async def cleanup():
+        async with AsyncSessionLocal() as db:
+            return await cleanup_expired_uploads(db)
+    assert run(cleanup) == 1
+
+    assert sql("SELECT 1 FROM audio_files WHERE file_id = %s", (expired,)) == []
+    assert sql("SELECT 1 FROM audio_files WHERE file_id = %s", (pending,)) == [(1,)]
+    open_uploads = s3.list_multipart_uploads(Bucket=BUCKET_NAME).get("Uploads", [])
+    assert upload_id not in {upload["UploadId"] for upload in open_uploads}
+    assert client.post(f"/files/presigned-upload/{expired}/parts", json={"part_numbers": [1]}).status_code == 404
+
+def test_deleting_a_pending_upload_aborts_it(client, login, sql, s3, make_wav):
+    login()
+    data = make_wav(seed=16)
+    single = start_upload(client, data, hashlib.md5(data).hexdigest(), "presigned deleted")
+    bulk = start_upload(client, data, hashlib.md5(b"bulk").hexdigest(), "presigned bulk deleted")
+    upload_ids = set()
+    for file_id in (single, bulk):
+        upload_parts(client, file_id, data)
+        (upload_id,), = sql("SELECT s3_upload_id FROM audio_files WHERE file_id = %s", (file_id,))
+        upload_ids.add(upload_id)
+
+    assert client.delete(f"/files/{single}").status_code == 200
+    assert client.request("DELETE", "/files/", json={"file_ids": [bulk]}).status_code in (200, 202)
+    open_uploads = s3.list_multipart_uploads(Bucket=BUCKET_NAME).get("Uploads", [])
+    assert upload_ids.isdisjoint(upload["UploadId"] for upload in open_uploads)
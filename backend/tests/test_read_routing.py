@@ -0,0 +1,61 @@
+from fastapi_app.database import READ_PRIMARY_COOKIE
+
+# The test replica is never written to, so anything the app reads from it predates the tests.
+
+def create_upload(client, content_type: str = "audio/wav"):
+    return client.post(
+        "/files/resumable",
+        params={"description": "routing", "category": "Music", "filename": "clip.wav", "content_type": content_type},
+        headers={"Upload-Length": "20"}
+    )
+
+def listed_ids(client) -> set:
+    response = client.get("/files/")
+    assert response.status_code == 200, response.text
+    return {audio_file["file_id"] for audio_file in response.json()}
+
+def test_writes_pin_reads_to_the_primary(client, login):
+    login()
+    assert READ_PRIMARY_COOKIE in client.cookies
+    client.cookies.delete(READ_PRIMARY_COOKIE)
+
+    response = create_upload(client)
+    assert response.status_code == 201
+    assert READ_PRIMARY_COOKIE in response.cookies
+    file_id = response.json()["file_id"]
+    assert file_id in listed_ids(client)
+
+    # Once the cookie lapses the listing comes from the replica, which has not caught up. The session
+    # is still checked on the primary.
+    client.cookies.delete(READ_PRIMARY_COOKIE)
+    assert listed_ids(client) == set()
+    # Lookups of one row fall back to the primary when the replica does not have it yet.
+    response = client.get(f"/files/upload-status/{file_id}")
+    assert (response.status_code, response.json()["file_id"]) == (200, file_id)
+
+def test_reads_and_failed_writes_do_not_set_the_cookie(client, login):
+    login()
+    client.cookies.delete(READ_PRIMARY_COOKIE)
+
+    assert READ_PRIMARY_COOKIE not in client.get("/files/").cookies
+    response = create_upload(client, content_type="text/plain")
+    assert response.status_code == 400
+    assert READ_PRIMARY_COOKIE not in response.cookies
+    assert READ_PRIMARY_COOKIE not in client.cookies
+
+def test_sessions_are_checked_on_the_primary(client, login, replica_sql):
+    token = login()
+    assert client.post("/auth/logout").status_code == 200
+    # The replica has not caught up with the logout yet.
+    replica_sql(
+        "INSERT INTO sessions (user_id, token, expires_at) "
+        "SELECT user_id, %s, now() + interval '1 day' FROM users WHERE username = 'user1'",
+        (token,)
+    )
+    try:
+        client.cookies.clear()
+        for path in ("/files/", "/auth/me"):
+            assert client.get(path, headers={"Cookie": f"session_token={token}"}).status_code == 401
+        assert client.get("/auth/auth-status", headers={"Cookie": f"session_token={token}"}).status_code == 401
+    finally:
+        replica_sql("DELETE FROM sessions WHERE token = %s", (token,))
@@ -0,0 +1,110 @@
+import asyncio
+import httpx
+from fastapi_app.main import app
+
+PATCH_HEADERS = {"Content-Type": "application/offset+octet-stream"}
+
+def create_upload(client, length: int) -> str:
+    response = client.post(
+        "/files/resumable",
+        params={"description": "resumable", "category": "Music", "filename": "clip.wav", "content_type": "audio/wav"},
+        headers={"Upload-Length": str(length)}
+    )
+    assert response.status_code == 201, response.text
+    return response.json()["file_id"]
+
+def partial_path(sql, file_id: str) -> str:
+    (file_path,), = sql("SELECT file_path FROM audio_files WHERE file_id = %s", (file_id,))
+    return file_path
+
+def test_concurrent_patch_is_refused_while_the_first_is_receiving(client, login, sql, run):
+    token = login()
+    file_id = create_upload(client, 20)
+
+    async def concurrent_patches():
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="https://testserver", cookies={"session_token": token}
+        ) as async_client:
+            receiving, release = asyncio.Event(), asyncio.Event()
+
+            async def slow_body():
+                yield b"a" * 5
+                receiving.set()
+                await release.wait()
+                yield b"a" * 5
+
+            first = asyncio.create_task(async_client.patch(
+                f"/files/resumable/{file_id}", content=slow_body(),
+                headers={**PATCH_HEADERS, "Upload-Offset": "0", "Content-Length": "10"}
+            ))
+            await asyncio.wait_for(receiving.wait(), 10)
+            # The first PATCH holds the lease, so both of these are refused without touching the file.
+            second = await async_client.patch(
+                f"/files/resumable/{file_id}", content=b"b" * 5, headers={**PATCH_HEADERS, "Upload-Offset": "0"}
+            )
+            deleted = await async_client.delete(f"/files/resumable/{file_id}")
+            release.set()
+            return await first, second, deleted
+
+    first, second, deleted = run(concurrent_patches)
+    assert (second.status_code, second.json()["detail"]) == (409, "Upload is already receiving data")
+    assert deleted.status_code == 409
+    assert first.status_code == 204, first.text
+    assert first.headers["Upload-Offset"] == "10"
+
+    with open(partial_path(sql, file_id), "rb") as partial:
+        assert partial.read() == b"a" * 10
+    assert sql("SELECT upload_offset, receiving_until FROM audio_files WHERE file_id = %s", (file_id,)) == [(10, None)]
+
+    # With the lease released the upload carries on from the recorded offset.
+    response = client.patch(f"/files/resumable/{file_id}", content=b"c" * 5, headers={**PATCH_HEADERS, "Upload-Offset": "10"})
+    assert response.status_code == 204
+    assert response.headers["Upload-Offset"] == "15"
+    assert client.delete(f"/files/resumable/{file_id}").status_code == 204
+
+def test_patch_for_another_node_is_redirected(client, login, sql):
+    login()
+    file_id = create_upload(client, 20)
+    sql("UPDATE audio_files SET upload_node = 'other-node' WHERE file_id = %s", (file_id,))
+
+    response = client.patch(f"/files/resumable/{file_id}", content=b"a" * 5, headers={**PATCH_HEADERS, "Upload-Offset": "0"})
+    assert response.status_code == 421
+    assert response.headers["Upload-Node"] == "other-node"
+    assert client.delete(f"/files/resumable/{file_id}").status_code == 421
+    # HEAD is answered from the database on any node.
+    response = client.head(f"/files/resumable/{file_id}")
+    assert (response.status_code, response.headers["Upload-Node"]) == (200, "other-node")
+
+def test_empty_patch_racing_the_completing_one_does_not_enqueue_twice(client, login, sql, run, monkeypatch):
+    from fastapi_app.controllers import resumable_controller
+    token = login()
+    file_id = create_upload(client, 10)
+
+    async def race():
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="https://testserver", cookies={"session_token": token}
+        ) as async_client:
+            racing = []
+            find_duplicate_upload = resumable_controller.find_duplicate_upload
+
+            # Runs once the completing PATCH has committed the final offset and released its lease.
+            async def find_duplicate_upload_with_race(*args):
+                if not racing:
+                    racing.append(asyncio.create_task(async_client.patch(
+                        f"/files/resumable/{file_id}", content=b"", headers={**PATCH_HEADERS, "Upload-Offset": "10"}
+                    )))
+                    await asyncio.sleep(0.5)
+                return await find_duplicate_upload(*args)
+            monkeypatch.setattr(resumable_controller, "find_duplicate_upload", find_duplicate_upload_with_race)
+
+            completing = await async_client.patch(
+                f"/files/resumable/{file_id}", content=b"a" * 10, headers={**PATCH_HEADERS, "Upload-Offset": "0"}
+            )
+            return completing, await racing[0]
+
+    completing, empty = run(race)
+    assert completing.status_code == 204
+    assert empty.status_code in (204, 409)
+    assert sql("SELECT count(*) FROM upload_jobs WHERE file_id = %s", (file_id,)) == [(1,)]
+    assert sql("SELECT upload_status FROM audio_files WHERE file_id = %s", (file_id,)) == [("processing",)]
+    sql("DELETE FROM audio_files WHERE file_id = %s", (file_id,))
@@ -0,0 +1,43 @@
+import time
+from fastapi_app.services import session_cache
+
+def get_me(client, token: str):
+    client.cookies.clear()
+    return client.get("/auth/me", headers={"Cookie": f"session_token={token}"})
+
+def wait_until(condition, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return condition()
+
+def test_logout_invalidates_cached_session(client, login):
+    token = login()
+    assert get_me(client, token).status_code == 200
+    assert session_cache.get(token) is not None
+
+    client.cookies.set("session_token", token)
+    assert client.post("/auth/logout").status_code == 200
+    assert session_cache.get(token) is None
+    assert get_me(client, token).status_code == 401
+
+def test_invalidation_from_another_process_is_applied(client, login, sql):
+    token = login()
+    assert get_me(client, token).status_code == 200
+    # Another process ends the session. Until its notification arrives this one still trusts the cache.
+    sql("DELETE FROM sessions WHERE token = %s", (token,))
+    assert get_me(client, token).status_code == 200
+
+    sql("SELECT pg_notify(%s, %s)", (session_cache.CHANNEL, f'{{"token": "{session_cache._key(token)}"}}'))
+    assert wait_until(lambda: session_cache.get(token) is None)
+    assert get_me(client, token).status_code == 401
+
+def test_new_login_invalidates_the_previous_session(client, login):
+    first = login()
+    assert get_me(client, first).status_code == 200
+    assert session_cache.get(first) is not None
+
+    second = login()
+    assert session_cache.get(first) is None
+    assert get_me(client, first).status_code == 401
+    assert get_me(client, second).status_code == 200
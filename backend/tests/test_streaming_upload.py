@@ -0,0 +1,59 @@
+import asyncio, uuid
+from types import SimpleNamespace
+import pytest
+from fastapi_app.config import BUCKET_NAME
+from fastapi_app.controllers import file_controller
+
+@pytest.fixture(autouse=True)
+def stream_to_s3(monkeypatch):
+    monkeypatch.setattr(file_controller, "UPLOAD_STREAM_TO_S3", True)
+
+def object_exists(s3, file_path: str) -> bool:
+    key = file_path.replace(f"https://{BUCKET_NAME}.s3.amazonaws.com/", "")
+    return s3.list_objects_v2(Bucket=BUCKET_NAME, Prefix=key)["KeyCount"] > 0
+
+def test_streamed_upload_is_analysed(client, login, sql, s3, make_wav, drain_jobs):
+    login()
+    response = client.post(
+        "/files/upload", params={"description": "streamed", "category": "Music"},
+        files={"file": ("clip.wav", make_wav(seed=31), "audio/wav")}
+    )
+    assert response.status_code == 200, response.text
+    file_id, file_path = response.json()["file_id"], response.json()["file_path"]
+    assert object_exists(s3, file_path)
+
+    drain_jobs()
+    assert sql("SELECT upload_status, file_path FROM audio_files WHERE file_id = %s", (file_id,)) == [("completed", file_path)]
+
+def test_deleting_before_analysis_deletes_the_object(client, login, sql, s3, make_wav):
+    login()
+    response = client.post(
+        "/files/upload-batch",
+        data={"descriptions": ["streamed batch one", "streamed batch two"], "categories": ["Music", "Music"]},
+        files=[("files", ("one.wav", make_wav(seed=32), "audio/wav")), ("files", ("two.wav", make_wav(seed=33), "audio/wav"))]
+    )
+    assert response.status_code == 200, response.text
+    single, bulk = (result["file"] for result in response.json()["results"])
+    for audio_file in (single, bulk):
+        assert object_exists(s3, audio_file["file_path"])
+
+    assert client.delete(f"/files/{single['file_id']}").status_code == 200
+    assert client.request("DELETE", "/files/", json={"file_ids": [bulk["file_id"]]}).status_code in (200, 202)
+    for audio_file in (single, bulk):
+        assert not object_exists(s3, audio_file["file_path"])
+    assert sql("SELECT 1 FROM upload_jobs WHERE file_id IN (%s, %s)", (single["file_id"], bulk["file_id"])) == []
+
+def test_cancelled_stream_is_aborted_and_not_turned_into_an_error(s3, run, monkeypatch):
+    async def cancelled(file, writer):
+        await writer.write(b"a" * 10)
+        raise asyncio.CancelledError()
+    monkeypatch.setattr(file_controller, "stream_file_to_s3_and_checksum", cancelled)
+    user = SimpleNamespace(user_id=uuid.uuid4())
+    upload = SimpleNamespace(filename="clip.wav")
+
+    async def stream():
+        with pytest.raises(asyncio.CancelledError):
+            await file_controller.stream_audio_file_to_s3("cancelled", "Music", upload, None, user)
+    run(stream)
+    open_uploads = s3.list_multipart_uploads(Bucket=BUCKET_NAME, Prefix=f"{user.user_id}/").get("Uploads", [])
+    assert open_uploads == []
@@ -0,0 +1,96 @@
+import asyncio
+import httpx
+from fastapi_app import upload_admission
+from fastapi_app.main import app
+
+PATCH_HEADERS = {"Content-Type": "application/offset+octet-stream", "Upload-Offset": "0"}
+
+def create_upload(client, length: int) -> str:
+    response = client.post(
+        "/files/resumable",
+        params={"description": "admission", "category": "Music", "filename": "clip.wav", "content_type": "audio/wav"},
+        headers={"Upload-Length": str(length)}
+    )
+    assert response.status_code == 201, response.text
+    return response.json()["file_id"]
+
+# Sends a PATCH whose body is only read if the request is admitted, reporting whether it was read.
+async def patch(async_client, file_id: str, body: bytes, headers: dict):
+    read = []
+    async def chunks():
+        read.append(True)
+        yield body
+    response = await async_client.patch(f"/files/resumable/{file_id}", content=chunks(), headers={**PATCH_HEADERS, **headers})
+    return response, bool(read)
+
+def async_client_for(token: str) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="https://testserver", cookies={"session_token": token}
+    )
+
+def test_upload_without_session_or_length_is_refused_unread(client, login, run):
+    token = login()
+    file_id = create_upload(client, 20)
+
+    async def requests():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="https://testserver") as anonymous:
+            unauthenticated = await patch(anonymous, file_id, b"a" * 5, {"Content-Length": "5"})
+        # Any cookie value would otherwise get past the check and an allowance of its own.
+        async with async_client_for("made-up-token") as forged:
+            invalid = await patch(forged, file_id, b"a" * 5, {"Content-Length": "5"})
+        async with async_client_for(token) as async_client:
+            # A streamed body without Content-Length goes out chunked.
+            no_length = await patch(async_client, file_id, b"a" * 5, {})
+        return unauthenticated, invalid, no_length
+
+    (unauthenticated, unauthenticated_read), (invalid, invalid_read), (no_length, no_length_read) = run(requests)
+    assert unauthenticated.status_code == 401 and not unauthenticated_read
+    assert invalid.status_code == 401 and not invalid_read
+    assert no_length.status_code == 411 and not no_length_read
+    assert "Retry-After" not in no_length.headers
+
+def test_upload_larger_than_the_per_user_limit_is_refused_unread(client, login, run, monkeypatch):
+    token = login()
+    file_id = create_upload(client, 20)
+    monkeypatch.setattr(upload_admission, "UPLOAD_MAX_INFLIGHT_BYTES_PER_USER", 10)
+
+    async def requests():
+        async with async_client_for(token) as async_client:
+            return await patch(async_client, file_id, b"a" * 11, {"Content-Length": "11"})
+
+    response, read = run(requests)
+    assert response.status_code == 413 and not read
+    assert "Retry-After" not in response.headers
+
+def test_uploads_over_the_per_user_concurrency_are_told_to_retry(client, login, run, monkeypatch):
+    token = login()
+    first_id, second_id = create_upload(client, 20), create_upload(client, 20)
+    monkeypatch.setattr(upload_admission, "UPLOAD_MAX_CONCURRENT_PER_USER", 1)
+
+    async def requests():
+        async with async_client_for(token) as async_client:
+            receiving, release = asyncio.Event(), asyncio.Event()
+
+            async def slow_body():
+                yield b"a" * 5
+                receiving.set()
+                await release.wait()
+                yield b"a" * 5
+
+            first = asyncio.create_task(async_client.patch(
+                f"/files/resumable/{first_id}", content=slow_body(), headers={**PATCH_HEADERS, "Content-Length": "10"}
+            ))
+            await asyncio.wait_for(receiving.wait(), 10)
+            refused = await patch(async_client, second_id, b"b" * 5, {"Content-Length": "5"})
+            release.set()
+            first = await first
+            admitted = await patch(async_client, second_id, b"b" * 5, {"Content-Length": "5"})
+            return first, refused, admitted
+
+    first, (refused, refused_read), (admitted, _) = run(requests)
+    assert first.status_code == 204
+    assert refused.status_code == 429 and not refused_read
+    assert refused.headers["Retry-After"] == str(upload_admission.UPLOAD_RETRY_AFTER_SECONDS)
+    # The slot is released with the first response.
+    assert admitted.status_code == 204
+    assert not upload_admission._per_user
@@ -0,0 +1,82 @@
+import os, time
+from fastapi_app.config import UPLOAD_DIR, UPLOAD_ORPHAN_MIN_AGE_SECONDS
+from fastapi_app.services import upload_queue, upload_events
+
+def upload(client, data: bytes, description: str) -> str:
+    response = client.post(
+        "/files/upload", params={"description": description, "category": "Music"},
+        files={"file": ("clip.wav", data, "audio/wav")}
+    )
+    assert response.status_code == 200, response.text
+    assert response.json()["upload_status"] == "processing"
+    return response.json()["file_id"]
+
+def job_for(sql, file_id: str):
+    (row,) = sql("SELECT status, attempts, file_location FROM upload_jobs WHERE file_id = %s", (file_id,))
+    return row
+
+def test_job_is_retried_when_recording_completion_fails(client, login, sql, make_wav, drain_jobs, monkeypatch):
+    login()
+    file_id = upload(client, make_wav(seed=21), "retried upload")
+    file_location = job_for(sql, file_id)[2]
+
+    # Fails the transaction that marks the record completed, after the object reached S3.
+    publish = upload_events.publish
+    async def publish_failing_once(db, upload_id, *args, **kwargs):
+        if str(upload_id) != file_id:
+            return await publish(db, upload_id, *args, **kwargs)
+        monkeypatch.setattr(upload_events, "publish", publish)
+        raise ConnectionError("connection lost before commit")
+    monkeypatch.setattr(upload_events, "publish", publish_failing_once)
+    drain_jobs()
+
+    status, attempts, _ = job_for(sql, file_id)
+    assert (status, attempts) == ("queued", 1)
+    assert sql("SELECT upload_status FROM audio_files WHERE file_id = %s", (file_id,)) == [("processing",)]
+    # The retry needs the temp file, so it is only removed once completion is committed.
+    assert os.path.exists(file_location)
+
+    sql("UPDATE upload_jobs SET run_after = now() WHERE file_id = %s", (file_id,))
+    drain_jobs()
+    assert job_for(sql, file_id)[:2] == ("done", 2)
+    assert sql("SELECT upload_status FROM audio_files WHERE file_id = %s", (file_id,)) == [("completed",)]
+    assert not os.path.exists(file_location)
+
+def test_sweep_removes_only_old_unreferenced_files(client, login, sql, run):
+    login()
+    response = client.post(
+        "/files/resumable",
+        params={"description": "sweep", "category": "Music", "filename": "clip.wav", "content_type": "audio/wav"},
+        headers={"Upload-Length": "20"}
+    )
+    (partial,), = sql("SELECT file_path FROM audio_files WHERE file_id = %s", (response.json()["file_id"],))
+    orphan, recent = os.path.join(UPLOAD_DIR, "orphan.wav"), os.path.join(UPLOAD_DIR, "recent.wav")
+    for path in (orphan, recent):
+        open(path, "wb").close()
+    old = time.time() - UPLOAD_ORPHAN_MIN_AGE_SECONDS - 60
+    for path in (orphan, partial):
+        os.utime(path, (old, old))
+
+    assert run(upload_queue.sweep_orphaned_files) == 1
+    assert not os.path.exists(orphan)
+    assert os.path.exists(recent) and os.path.exists(partial)
+    os.remove(recent)
+
+def test_stale_job_on_its_last_attempt_is_failed_not_requeued(client, login, sql, make_wav, run, drain_jobs):
+    login()
+    exhausted = upload(client, make_wav(seed=22), "worker killed every time")
+    retried = upload(client, make_wav(seed=23), "worker killed once")
+    # Both were claimed by a worker that died without recording anything.
+    sql(
+        "UPDATE upload_jobs SET status = 'processing', locked_at = (now() AT TIME ZONE 'utc') - interval '1 day', "
+        "attempts = CASE WHEN file_id = %s THEN max_attempts ELSE 1 END WHERE file_id IN (%s, %s)",
+        (exhausted, exhausted, retried)
+    )
+
+    assert run(upload_queue.recover_stale_jobs) == 2
+    assert job_for(sql, exhausted)[0] == "failed"
+    assert sql("SELECT upload_status FROM audio_files WHERE file_id = %s", (exhausted,)) == [("error",)]
+    assert job_for(sql, retried)[:2] == ("queued", 1)
+
+    drain_jobs()
+    assert sql("SELECT upload_status FROM audio_files WHERE file_id = %s", (retried,)) == [("completed",)]
@@ -43,6 +43,7 @@ export default function AdminDashboard() {
   const [users, setUsers] = useState<User[]>([]);
   const [loading, setLoading] = useState<boolean>(false);
   const [error, setError] = useState<string | null>(null);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
 
   // Form state for creating/updating a user
   const [formData, setFormData] = useState({
@@ -77,18 +78,20 @@ export default function AdminDashboard() {
     return emailRegex.test(email);
   };
 
-  // Fetch users from admin endpoint
-  const fetchUsers = async () => {
+  // Fetch a page of users from admin endpoint. Without a cursor the list starts over.
+  const fetchUsers = async (cursor?: string) => {
     setLoading(true);
     try {
-      const res = await fetch(`${BACKEND_BASE_URL}/admin/users`, {
+      const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : "";
+      const res = await fetch(`${BACKEND_BASE_URL}/admin/users${query}`, {
         credentials: "include",
       });
       if (!res.ok) {
         throw new Error("Failed to fetch users");
       }
       const data = await res.json();
-      setUsers(data);
+      setUsers(cursor ? [...users, ...data] : data);
+      setNextCursor(res.headers.get("X-Next-Cursor"));
     } catch (err: unknown) {
       if (err instanceof Error) {
         setError(err.message);
@@ -330,6 +333,12 @@ export default function AdminDashboard() {
         </TableBody>
       </Table>
 
+      {nextCursor && (
+        <div className="flex justify-center mt-4">
+          <Button onClick={() => fetchUsers(nextCursor)}>Load more</Button>
+        </div>
+      )}
+
       <div className="mt-8">
         <Button onClick={openCreateDialog}>Create New User</Button>
       </div>
@@ -37,17 +37,27 @@ const FilesPage = () => {
   const [error, setError] = useState<string>("");
   const [searchTerm, setSearchTerm] = useState<string>("");
   const [filterCategory, setFilterCategory] = useState<string>("All");
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [progress, setProgress] = useState<Record<string, number>>({});
 
-  // Fetch all files for the current user.
-  const fetchFiles = async () => {
+  // Fetch a page of files for the current user, searching descriptions when a search term is set.
+  // Without a cursor the list starts over.
+  const fetchFiles = async (cursor?: string) => {
     try {
-      const res = await fetch(`${BACKEND_BASE_URL}/files`, {
+      const params = new URLSearchParams();
+      const query = searchTerm.trim();
+      if (query) params.set("q", query);
+      if (filterCategory !== "All") params.set("category", filterCategory);
+      if (cursor) params.set("cursor", cursor);
+      const path = query ? "search" : "";
+      const res = await fetch(`${BACKEND_BASE_URL}/files/${path}?${params.toString()}`, {
         method: "GET",
         credentials: "include",
       });
       if (res.ok) {
         const data = await res.json();
-        setFiles(data);
+        setFiles(cursor ? [...files, ...data] : data);
+        setNextCursor(res.headers.get("X-Next-Cursor"));
       } else {
         const errorData = await res.json();
         setError(errorData.detail || "Failed to fetch files.");
@@ -121,19 +131,32 @@ const FilesPage = () => {
     await fetchFiles();
   };
 
+  // Upload status changes and S3 progress are pushed by the server instead of polled.
   useEffect(() => {
-    fetchFiles();
+    const source = new EventSource(`${BACKEND_BASE_URL}/files/upload-events`, {
+      withCredentials: true,
+    });
+    source.addEventListener("upload_status", (e) => {
+      const data = JSON.parse((e as MessageEvent).data);
+      setFiles((current) =>
+        current.map((file) =>
+          file.file_id === data.file_id
+            ? { ...file, upload_status: data.upload_status }
+            : file
+        )
+      );
+      if (data.progress !== undefined) {
+        setProgress((current) => ({ ...current, [data.file_id]: data.progress }));
+      }
+    });
+    return () => source.close();
   }, []);
 
-  // Filter files based on search term and selected category.
-  const filteredFiles = files.filter((file) => {
-    const matchesSearch = file.description
-      .toLowerCase()
-      .includes(searchTerm.toLowerCase());
-    const matchesCategory =
-      filterCategory === "All" || file.category === filterCategory;
-    return matchesSearch && matchesCategory;
-  });
+  // Search and filtering run on the server; wait for typing to pause before querying.
+  useEffect(() => {
+    const timer = setTimeout(() => fetchFiles(), 300);
+    return () => clearTimeout(timer);
+  }, [searchTerm, filterCategory]);
 
   return (
     <div className="container mx-auto p-4">
@@ -176,7 +199,7 @@ const FilesPage = () => {
           &#x21bb;
         </Button>
       </div>
-      {filteredFiles.length === 0 ? (
+      {files.length === 0 ? (
         <p>No files uploaded yet.</p>
       ) : (
         <Table>
@@ -190,14 +213,19 @@ const FilesPage = () => {
             </TableRow>
           </TableHeader>
           <TableBody>
-            {filteredFiles.map((file) => (
+            {files.map((file) => (
               <TableRow key={file.file_id}>
                 <TableCell>{file.description}</TableCell>
                 <TableCell>{file.category}</TableCell>
                 <TableCell>
                   {new Date(file.upload_timestamp).toLocaleString()}
                 </TableCell>
-                <TableCell>{file.upload_status}</TableCell>
+                <TableCell>
+                  {file.upload_status}
+                  {file.upload_status === "processing" &&
+                    progress[file.file_id] !== undefined &&
+                    ` (${progress[file.file_id]}%)`}
+                </TableCell>
                 <TableCell className="space-x-2">
                   <Button
                     onClick={() => handlePlay(file.file_id)}
@@ -218,6 +246,11 @@ const FilesPage = () => {
           </TableBody>
         </Table>
       )}
+      {nextCursor && (
+        <div className="flex justify-center mt-4">
+          <Button onClick={() => fetchFiles(nextCursor)}>Load more</Button>
+        </div>
+      )}
     </div>
   );
 };